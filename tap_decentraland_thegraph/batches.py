@@ -0,0 +1,196 @@
+"""Singer BATCH output: records written to gzip-compressed JSONL or Parquet files.
+
+When `batch_output_path` is set, records are written to files of up to
+`batch_output_records` records per stream in that directory instead of RECORD
+messages, and each file is announced once complete with a BATCH message:
+
+    {"type": "BATCH", "stream": "nfts_wearables",
+     "encoding": {"format": "jsonl", "compression": "gzip"},
+     "manifest": [
+         "file:///data/batches/nfts_wearables-20240101T000000-1a2b3c4d-00001.jsonl.gz"
+     ]}
+
+which targets built on singer-sdk 0.12 and later load directly. With
+`batch_output_format` set to `parquet` the files are typed columnar Parquet
+instead, see `parquet`.
+
+A STATE message may only cover records that are durably written, so it is
+held back while any batch is open. When a batch fills up every open batch is
+closed, fsynced and announced, and then the latest state is written. The
+same happens at the end of the run.
+"""
+
+import datetime
+import gzip
+import logging
+import os
+import sys
+import threading
+import uuid
+from pathlib import Path
+from typing import Dict, List, Optional, Union
+
+import singer
+
+from tap_decentraland_thegraph import codec, parquet
+
+# Compression level of batch files, zlib's default trade-off of speed and size
+GZIP_LEVEL = 6
+# Encoded records buffered before they are handed to the compressor
+LINES_PER_WRITE = 1000
+
+
+def fsync_directory(path: str) -> None:
+    """Persist the entries of a directory, such as a file renamed into it."""
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+class BatchFile:
+    """A batch file being written, under a temporary name until it is closed."""
+
+    encoding = {"format": "jsonl", "compression": "gzip"}
+    extension = "jsonl.gz"
+
+    def __init__(self, path: str):
+        self.path = path
+        self.records = 0
+        self._tmp_path = f"{path}.tmp"
+        self._raw = open(self._tmp_path, "wb")
+        self._gzip = gzip.GzipFile(
+            fileobj=self._raw, mode="wb", compresslevel=GZIP_LEVEL
+        )
+        self._lines: List[bytes] = []
+
+    def write(self, record: dict) -> None:
+        self._lines.append(codec.dumps_line(record))
+        self.records += 1
+        if len(self._lines) >= LINES_PER_WRITE:
+            self._write_lines()
+
+    def _write_lines(self) -> None:
+        self._gzip.write(b"".join(self._lines))
+        self._lines = []
+
+    def close(self) -> None:
+        """Finish the file, fsync it and move it to its final name."""
+        self._write_lines()
+        self._gzip.close()
+        self._raw.flush()
+        os.fsync(self._raw.fileno())
+        self._raw.close()
+        os.replace(self._tmp_path, self.path)
+
+
+class BatchWriter:
+    """Open batch files of each stream, and the STATE held back until they close."""
+
+    def __init__(
+        self,
+        root: str,
+        batch_records: int = 100000,
+        output_format: str = "jsonl",
+        decimal_precision: int = 38,
+        logger: Optional[logging.Logger] = None,
+    ):
+        if output_format not in ("jsonl", "parquet"):
+            raise ValueError(
+                f"Unknown batch_output_format {output_format!r}, "
+                "expected `jsonl` or `parquet`"
+            )
+        if output_format == "parquet" and parquet.pyarrow is None:
+            raise RuntimeError(
+                "batch_output_format `parquet` requires pyarrow, "
+                "install tap-decentraland-thegraph[parquet]"
+            )
+        self.root = os.path.abspath(root)
+        self.batch_records = max(batch_records, 1)
+        self.output_format = output_format
+        self.decimal_precision = decimal_precision
+        self.logger = logger or logging.getLogger(__name__)
+        # Files of different runs into the same directory never collide
+        self.run_id = (
+            f"{datetime.datetime.utcnow():%Y%m%dT%H%M%S}-{uuid.uuid4().hex[:8]}"
+        )
+        self.files: Dict[str, Union[BatchFile, parquet.ParquetBatchFile]] = {}
+        self.sequence: Dict[str, int] = {}
+        # Parquet columns of each stream, compiled from the schema of its first record
+        self.layouts: Dict[str, parquet.Layout] = {}
+        self.pending_state: Optional[dict] = None
+        self._lock = threading.RLock()
+
+    def write(self, stream: str, record: dict, schema: dict) -> None:
+        with self._lock:
+            batch = self.files.get(stream)
+            if batch is None:
+                batch = self.files[stream] = self.open(stream, schema)
+            batch.write(record)
+            if batch.records >= self.batch_records:
+                self.flush()
+
+    def open(
+        self, stream: str, schema: dict
+    ) -> Union[BatchFile, parquet.ParquetBatchFile]:
+        self.sequence[stream] = self.sequence.get(stream, 0) + 1
+        name = f"{stream}-{self.run_id}-{self.sequence[stream]:05d}"
+        os.makedirs(self.root, exist_ok=True)
+        if self.output_format == "parquet":
+            if stream not in self.layouts:
+                self.layouts[stream] = parquet.Layout(schema, self.decimal_precision)
+            path = os.path.join(
+                self.root, f"{name}.{parquet.ParquetBatchFile.extension}"
+            )
+            return parquet.ParquetBatchFile(
+                path, stream, self.layouts[stream], self.logger
+            )
+        return BatchFile(os.path.join(self.root, f"{name}.{BatchFile.extension}"))
+
+    def write_state(self, state: dict) -> None:
+        """Write a STATE message once the records it covers are in closed batches.
+
+        `state` is the tap's live state, so what is written is its value then.
+        """
+        with self._lock:
+            if self.files:
+                self.pending_state = state
+            else:
+                singer.write_message(singer.StateMessage(value=state))
+
+    def flush(self) -> None:
+        """Close and announce every open batch, then write the state held back."""
+        with self._lock:
+            for batch in self.files.values():
+                batch.close()
+            if self.files:
+                fsync_directory(self.root)
+            for stream, batch in self.files.items():
+                message = {
+                    "type": "BATCH",
+                    "stream": stream,
+                    "encoding": batch.encoding,
+                    "manifest": [Path(batch.path).as_uri()],
+                }
+                sys.stdout.write(codec.dumps(message) + "\n")
+            sys.stdout.flush()
+            self.files = {}
+            if self.pending_state is not None:
+                singer.write_message(singer.StateMessage(value=self.pending_state))
+                self.pending_state = None
+
+
+_writers: Dict[str, BatchWriter] = {}
+_writers_lock = threading.Lock()
+
+
+def get_writer(root: str, batch_records: int = 100000, **kwargs) -> BatchWriter:
+    """Return the process-wide writer for `root`, creating it on first use.
+
+    Keyword arguments are passed on to `BatchWriter`.
+    """
+    with _writers_lock:
+        if root not in _writers:
+            _writers[root] = BatchWriter(root, batch_records, **kwargs)
+        return _writers[root]
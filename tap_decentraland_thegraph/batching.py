@@ -0,0 +1,213 @@
+"""Aliased GraphQL query batching for streams that share a subgraph endpoint.
+
+Streams synced concurrently hand their page requests to a `QueryBatcher`.
+Requests for the same endpoint that arrive within `wait_seconds` of each other are
+merged into one document with field aliases, and each aliased result is
+handed back to its stream as if it had been requested on its own. A request
+only waits for others while another thread syncs a stream of its endpoint.
+"""
+
+import contextlib
+import json
+import threading
+from collections import Counter
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+from tap_decentraland_thegraph import codec, queries
+
+
+class PendingQuery:
+    """A stream page request waiting to be sent as part of a batch."""
+
+    def __init__(self, prepared_request: requests.PreparedRequest):
+        payload = json.loads(prepared_request.body)
+        self.prepared_request = prepared_request
+        self.endpoint = endpoint_of(prepared_request.url)
+        self.query = payload["query"]
+        self.variables = payload.get("variables") or {}
+        self.response = None
+        self.error: Optional[BaseException] = None
+        # Set when the request has to be sent on its own after all
+        self.unbatched = False
+
+
+class Batch:
+    """Requests for one endpoint that will be sent as a single document."""
+
+    def __init__(self):
+        self.items: List[PendingQuery] = []
+        self.sent = threading.Event()
+
+
+class QueryBatcher:
+    """Merge concurrent page requests per endpoint into aliased GraphQL documents."""
+
+    def __init__(self, max_queries: int = 8, wait_seconds: float = 0.05):
+        self.max_queries = max_queries
+        self.wait_seconds = wait_seconds
+        self._open: Dict[str, Batch] = {}
+        # Threads syncing a stream, per endpoint
+        self._active: Dict[str, Counter] = {}
+        self._cond = threading.Condition()
+
+    @contextlib.contextmanager
+    def active(self, endpoint: str) -> Iterator[None]:
+        """Count the current thread as syncing a stream of `endpoint`."""
+        thread = threading.get_ident()
+        with self._cond:
+            self._active.setdefault(endpoint, Counter())[thread] += 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._active[endpoint][thread] -= 1
+                if not self._active[endpoint][thread]:
+                    del self._active[endpoint][thread]
+                # A leader waiting for this thread can stop waiting
+                self._cond.notify_all()
+
+    def others_active(self, endpoint: str) -> bool:
+        """Return True if another thread syncs a stream of `endpoint`.
+
+        Called with `_cond` held.
+        """
+        thread = threading.get_ident()
+        return any(other != thread for other in self._active.get(endpoint, ()))
+
+    def execute(
+        self,
+        prepared_request: requests.PreparedRequest,
+        send: Callable,
+        send_batch: Callable,
+    ):
+        """Send `prepared_request` as part of a batch and return its own response.
+
+        The first request of a batch waits up to `wait_seconds` for others to
+        join, then sends the merged document with `send_batch`. Requests that
+        end up alone, or whose batch failed with GraphQL errors, are sent with
+        their own `send` instead.
+        """
+        item = PendingQuery(prepared_request)
+        url = item.endpoint
+        with self._cond:
+            batch = self._open.get(url)
+            leader = batch is None
+            # Without another stream syncing, no request could join
+            alone = leader and not self.others_active(url)
+            if not alone:
+                if leader:
+                    batch = self._open[url] = Batch()
+                batch.items.append(item)
+                if len(batch.items) >= self.max_queries:
+                    # Full, close it and wake up the leader
+                    del self._open[url]
+                    self._cond.notify_all()
+        if alone:
+            return send(prepared_request)
+
+        if leader:
+            with self._cond:
+                self._cond.wait_for(
+                    lambda: self._open.get(url) is not batch
+                    or not self.others_active(url),
+                    self.wait_seconds,
+                )
+                if self._open.get(url) is batch:
+                    del self._open[url]
+            self.dispatch(batch.items, send_batch)
+            batch.sent.set()
+        else:
+            batch.sent.wait()
+
+        if item.error is not None:
+            raise item.error
+        if item.unbatched:
+            return send(prepared_request)
+        return item.response
+
+    def dispatch(self, batch: List[PendingQuery], send_batch: Callable) -> None:
+        """Send a closed batch and route each aliased result to its request."""
+        if len(batch) == 1:
+            batch[0].unbatched = True
+            return
+
+        query, variables, fields = queries.merge_queries(
+            [(item.query, item.variables) for item in batch]
+        )
+        combined = batch[0].prepared_request.copy()
+        combined.prepare_url(batch[0].endpoint, None)
+        combined.prepare_body(
+            data=None, files=None, json={"query": query, "variables": variables}
+        )
+        # Its body is split between the streams, so it is read as a whole
+        combined.stream = False
+        try:
+            response = send_batch(combined)
+        except Exception as err:
+            # Each stream retries its own request through its backoff decorator
+            for item in batch:
+                item.error = err
+            return
+        try:
+            resp_json = codec.loads(response.content) if response.ok else {}
+        except ValueError:
+            resp_json = {}
+
+        if resp_json.get("errors") or not resp_json.get("data"):
+            # Let every stream see (and report) its own error
+            for item in batch:
+                item.unbatched = True
+            return
+
+        for item, (alias, field) in zip(batch, fields):
+            item.response = routed_response(
+                response,
+                item.prepared_request,
+                {"data": {field: resp_json["data"][alias]}},
+            )
+            item.response.batch_size = len(batch)
+
+
+def endpoint_of(url: str) -> str:
+    """Return the URL a request to `url` goes to, without the query string.
+
+    The query string holds each stream's own page variables.
+    """
+    prepared = requests.PreparedRequest()
+    prepared.prepare_url(url, None)
+    return prepared.url.split("?", 1)[0]
+
+
+def routed_response(
+    response: requests.Response, request: requests.PreparedRequest, body: dict
+) -> requests.Response:
+    """Return a copy of the batch `response` answering `request` with `body`."""
+    routed = requests.Response()
+    routed.status_code = response.status_code
+    routed.reason = response.reason
+    routed.headers = CaseInsensitiveDict(response.headers)
+    routed.encoding = response.encoding
+    routed.url = response.url
+    routed.elapsed = response.elapsed
+    routed.request = request
+    routed._content = codec.dumps(body).encode()
+    routed._content_consumed = True
+    return routed
+
+
+_batchers: Dict[Tuple[int, float], QueryBatcher] = {}
+_batchers_lock = threading.Lock()
+
+
+def get_batcher(max_queries: int = 8, wait_seconds: float = 0.05) -> QueryBatcher:
+    """Return the process-wide batcher for these settings, creating it on first use."""
+    key = (max_queries, wait_seconds)
+    with _batchers_lock:
+        if key not in _batchers:
+            _batchers[key] = QueryBatcher(
+                max_queries=max_queries, wait_seconds=wait_seconds
+            )
+        return _batchers[key]
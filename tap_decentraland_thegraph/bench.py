@@ -0,0 +1,343 @@
+"""Benchmarks for the tap's hot paths, printed as JSON.
+
+Run with `tap-decentraland-thegraph-bench` (or `python -m
+tap_decentraland_thegraph.bench`). Pages are synthesized by the mock
+graph-node from each stream's own query, so they have the shape and value
+types graph-node returns. The end-to-end sync runs the mock in a subprocess,
+so its CPU time is not counted as the tap's.
+"""
+
+import argparse
+import contextlib
+import copy
+import gzip
+import io
+import json
+import subprocess
+import sys
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List, Optional
+from urllib.parse import urlparse
+
+import requests
+import singer
+from singer_sdk.helpers._util import utc_now
+from urllib3 import HTTPResponse
+
+try:
+    import resource
+except ImportError:  # Unix only, peak memory is not reported elsewhere
+    resource = None
+
+from tap_decentraland_thegraph import codec, parquet, streaming
+from tap_decentraland_thegraph.tap import TapDecentralandTheGraph
+from tap_decentraland_thegraph.mock_graph_node import (
+    MockGraphNode,
+    entity_id,
+    sample_rows,
+)
+
+# The streams with the heaviest post-processing or the most rows
+DEFAULT_STREAMS = [
+    "nfts_wearables",
+    "items_polygon_unique",
+    "poaps_metadata",
+    "historical_snapshot_estates",
+]
+CODEC_STREAMS = ["nfts_wearables", "sales_ethereum"]
+# Contexts for child streams, whose rows depend on their parent's
+CONTEXTS = {
+    "historical_snapshot_estates": {
+        "estateId": entity_id(0),
+        "blockNumber": "10000000",
+    },
+    "historical_snapshot_estates_bids": {
+        "estateId": entity_id(0),
+        "blockNumber": "10000000",
+    },
+}
+
+
+def sample_page(stream, count: int = 1000) -> bytes:
+    """Return a response body with `count` rows for `stream`."""
+    if getattr(stream, "query", None) is None:
+        # The POAP REST API
+        return json.dumps(
+            MockGraphNode(rows=count).paginated_events({"limit": [str(count)]})
+        ).encode()
+    return json.dumps(
+        {"data": {stream.object_returned: sample_rows(stream.query, count)}}
+    ).encode()
+
+
+def page_response(page: bytes, streamed: bool = False) -> requests.Response:
+    """Wrap a body in a response, left unread on a raw stream if `streamed`."""
+    response = requests.Response()
+    response.status_code = 200
+    if streamed:
+        response.raw = HTTPResponse(body=io.BytesIO(page), preload_content=False)
+    else:
+        response._content = page
+        response._content_consumed = True
+    return response
+
+
+def cpu_per_record(func, records: int, repeat: int = 5) -> float:
+    """Return the best CPU time of `func` over `repeat` runs, in µs per record."""
+    best = None
+    for _ in range(repeat):
+        start = time.process_time()
+        func()
+        elapsed = time.process_time() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return round(best / records * 1e6, 3)
+
+
+def measure(
+    run: Callable[[Any], Any], setup: Callable[[], Any], records: int, repeat: int = 5
+) -> Dict[str, float]:
+    """Time `run(setup())`, best of `repeat`, then trace its allocations once.
+
+    `setup` builds the input outside of the measurement, since the code under
+    test usually consumes or mutates it.
+    """
+    best_wall = best_cpu = None
+    for _ in range(repeat):
+        data = setup()
+        wall, cpu = time.perf_counter(), time.process_time()
+        run(data)
+        wall, cpu = time.perf_counter() - wall, time.process_time() - cpu
+        best_wall = wall if best_wall is None else min(best_wall, wall)
+        best_cpu = cpu if best_cpu is None else min(best_cpu, cpu)
+
+    data = setup()
+    tracemalloc.start()
+    try:
+        run(data)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {
+        "records_per_sec": round(records / best_wall) if best_wall else None,
+        "cpu_us_per_record": round(best_cpu / records * 1e6, 3),
+        "peak_bytes_per_record": round(peak / records),
+    }
+
+
+def bench_stream(stream, count: int = 1000, repeat: int = 5) -> Dict[str, Any]:
+    """Per-record cost of parsing, post-processing, deduplicating and emitting a page.
+
+    Streams with `post_process_batch` are measured through it, like `get_records`
+    runs them.
+    """
+    context = CONTEXTS.get(stream.name)
+    page = sample_page(stream, count)
+    rows = list(stream.parse_response(page_response(page)))
+    if stream.post_process_batch is not None:
+        def post_process(batch: List[dict]) -> List[dict]:
+            return stream.post_process_batch(batch, context)
+    else:
+        def post_process(batch: List[dict]) -> List[dict]:
+            return [stream.post_process(row, context) for row in batch]
+    processed = post_process(copy.deepcopy(rows))
+    records = len(rows)
+
+    result = {"stream": stream.name, "records": records, "page_bytes": len(page)}
+    result["parse_response"] = measure(
+        lambda response: list(stream.parse_response(response)),
+        lambda: page_response(page),
+        records, repeat,
+    )
+    if streaming.ijson is not None and hasattr(stream, "object_returned"):
+        result["parse_response_streamed"] = measure(
+            lambda response: list(stream.parse_response(response)),
+            lambda: page_response(page, streamed=True),
+            records, repeat,
+        )
+    result["post_process"] = measure(
+        post_process, lambda: copy.deepcopy(rows), records, repeat
+    )
+    if getattr(stream, "dedupe", False):
+        def dedupe(batch: List[dict]) -> None:
+            stream.boundary_keys = None
+            for row in batch:
+                stream.is_duplicate(row)
+
+        result["dedupe"] = measure(dedupe, lambda: processed, records, repeat)
+
+    def get_records(batch: List[dict]) -> None:
+        stream.request_records = lambda context: iter(batch)
+        if hasattr(stream, "boundary_keys"):
+            stream.boundary_keys = None
+        try:
+            for _ in stream.get_records(context):
+                pass
+        finally:
+            del stream.request_records
+
+    result["get_records"] = measure(
+        get_records, lambda: copy.deepcopy(rows), records, repeat
+    )
+
+    def record_messages(batch: List[dict]) -> None:
+        for row in batch:
+            for message in stream._generate_record_messages(row):
+                codec.format_message(message)
+
+    result["record_messages"] = measure(
+        record_messages, lambda: copy.deepcopy(processed), records, repeat
+    )
+    return result
+
+
+def bench_codec(stream, count: int = 1000) -> Dict[str, Any]:
+    """CPU cost per record of decoding a page and encoding its RECORD messages."""
+    page = sample_page(stream, count)
+    messages = [
+        singer.RecordMessage(stream=stream.name, record=row, time_extracted=utc_now())
+        for row in json.loads(page)["data"][stream.object_returned]
+    ]
+    return {
+        "stream": stream.name,
+        "codec": "orjson" if codec.orjson is not None else "json",
+        "page_bytes": len(page),
+        "decode_stdlib_us": cpu_per_record(lambda: json.loads(page), count),
+        "decode_codec_us": cpu_per_record(lambda: codec.loads(page), count),
+        "encode_singer_us": cpu_per_record(
+            lambda: [singer.format_message(m) for m in messages], count
+        ),
+        "encode_codec_us": cpu_per_record(
+            lambda: [codec.format_message(m) for m in messages], count
+        ),
+    }
+
+
+class MessageCounter(io.TextIOBase):
+    """Stand-in for stdout that counts the Singer messages written to it.
+
+    The files of BATCH messages are collected, for their records to be
+    counted once the sync is over.
+    """
+
+    def __init__(self):
+        self.records = 0
+        self.messages = 0
+        self.bytes = 0
+        self.batch_files: List[str] = []
+
+    def write(self, text: str) -> int:
+        self.bytes += len(text)
+        for line in text.splitlines():
+            self.messages += 1
+            # Both codecs put the type first
+            if '"RECORD"' in line[:20]:
+                self.records += 1
+            elif '"BATCH"' in line[:20]:
+                self.batch_files.extend(
+                    urlparse(uri).path for uri in json.loads(line)["manifest"]
+                )
+        return len(text)
+
+    def count_batch_records(self) -> None:
+        for path in self.batch_files:
+            if path.endswith(".parquet"):
+                self.records += parquet.pyarrow.parquet.read_metadata(path).num_rows
+                continue
+            with gzip.open(path, "rb") as batch:
+                self.records += sum(1 for _ in batch)
+
+
+def bench_sync(rows: int = 2000, extra_config: Optional[dict] = None) -> Dict[str, Any]:
+    """Sync every stream against a mock graph-node serving `rows` rows per entity."""
+    node = subprocess.Popen(
+        [
+            sys.executable,
+            "-m",
+            "tap_decentraland_thegraph.mock_graph_node",
+            "--port",
+            "0",
+            "--rows",
+            str(rows),
+        ],
+        stdout=subprocess.PIPE,
+        text=True,
+    )
+    try:
+        config = json.loads(node.stdout.readline())
+        config.update(extra_config or {})
+        tap = TapDecentralandTheGraph(config=config)
+        output = MessageCounter()
+        wall, cpu = time.perf_counter(), time.process_time()
+        with contextlib.redirect_stdout(output):
+            tap.sync_all()
+        wall, cpu = time.perf_counter() - wall, time.process_time() - cpu
+    finally:
+        node.terminate()
+        node.wait()
+    output.count_batch_records()
+    return {
+        "rows_per_entity": rows,
+        "config": extra_config or {},
+        "records": output.records,
+        "messages": output.messages,
+        "batch_files": len(output.batch_files),
+        "output_bytes": output.bytes,
+        "wall_seconds": round(wall, 3),
+        "records_per_sec": round(output.records / wall) if wall else None,
+        "cpu_us_per_record": (
+            round(cpu / output.records * 1e6, 3) if output.records else None
+        ),
+        "max_rss_kib": (
+            resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            if resource is not None
+            else None
+        ),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Benchmark tap-decentraland-thegraph's hot paths"
+    )
+    parser.add_argument("--streams", default=",".join(DEFAULT_STREAMS),
+                        help="comma separated stream names, or `all`")
+    parser.add_argument(
+        "--records", type=int, default=1000, help="rows per synthesized page"
+    )
+    parser.add_argument(
+        "--repeat", type=int, default=5, help="runs per measurement, the best is kept"
+    )
+    parser.add_argument("--sync-rows", type=int, default=2000,
+                        help="rows per entity of the end-to-end sync, 0 skips it")
+    parser.add_argument("--sync-config", type=json.loads, default=None,
+                        help="JSON object of tap settings for the end-to-end sync")
+    parser.add_argument(
+        "--output", help="write the results to this file instead of stdout"
+    )
+    args = parser.parse_args()
+
+    tap = TapDecentralandTheGraph(config={})
+    names = list(tap.streams) if args.streams == "all" else args.streams.split(",")
+    results = {
+        "python": sys.version.split()[0],
+        "codec": [
+            bench_codec(tap.streams[name], args.records) for name in CODEC_STREAMS
+        ],
+        "streams": [
+            bench_stream(tap.streams[name], args.records, args.repeat) for name in names
+        ],
+    }
+    if args.sync_rows:
+        results["sync"] = bench_sync(args.sync_rows, args.sync_config)
+
+    text = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as output:
+            output.write(text + "\n")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
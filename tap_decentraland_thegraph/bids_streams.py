@@ -1,13 +1,17 @@
 """Stream type classes for tap-decentraland-thegraph."""
 
-from pathlib import Path
-from typing import Any, Dict, Optional, Union, List, Iterable
+from typing import Optional
 
 from singer_sdk import typing as th  # JSON Schema typing helpers
 
 from tap_decentraland_thegraph.client import DecentralandTheGraphStream
-
-
+from tap_decentraland_thegraph.transforms import (
+    Apply,
+    BodyShapes,
+    FromContext,
+    JoinParcels,
+    RowId,
+)
 
 class WearablesBidsStream(DecentralandTheGraphStream):
     name = "bids_wearables"
@@ -55,13 +59,7 @@ class WearablesBidsStream(DecentralandTheGraphStream):
         }
     """
 
-    def post_process(self, row: dict, context: Optional[dict] = None) -> dict:
-        """As needed, append or transform raw data to match expected structure."""
-        bodyShapes = row['nft']['wearable']['bodyShapes']
-        row['nft']['wearable']['bodyShapeMale'] = 'BaseMale' in bodyShapes
-        row['nft']['wearable']['bodyShapeFemale'] = 'BaseFemale' in bodyShapes
-        del row['nft']['wearable']['bodyShapes']
-        return row
+    transforms = [BodyShapes("nft.wearable")]
 
     
     schema = th.PropertiesList(
@@ -132,11 +130,7 @@ class ParcelsBidsStream(DecentralandTheGraphStream):
         }
     """
 
-    def post_process(self, row: dict, context: Optional[dict] = None) -> dict:
-        """Convert x/y to integers"""
-        row['nft']['parcel']['x'] = int(row['nft']['parcel']['x'])
-        row['nft']['parcel']['y'] = int(row['nft']['parcel']['y'])
-        return row
+    transforms = [Apply(int, "nft.parcel.x", "nft.parcel.y")]
     
     schema = th.PropertiesList(
         th.Property("id", th.StringType, required=True),
@@ -230,6 +224,7 @@ class EstatesBidsHistoricalStream(DecentralandTheGraphStream):
     object_returned = 'estates'
     dedupe = False
     onlyonerow = True
+    batch_lookups = True
     
     query = """
     query ($estateId: ID!, $blockNumber: Int!)
@@ -268,17 +263,11 @@ class EstatesBidsHistoricalStream(DecentralandTheGraphStream):
 
         return self.latest_timestamp
 
-    def post_process(self, row: dict, context: Optional[dict] = None) -> dict:
-        """Convert parcels into psv and adds block number"""
-        parcels = row['parcels']
-        if parcels:
-            converted = "|".join([f'{p["x"]},{p["y"]}' for p in parcels])
-        else:
-            converted = ''
-        row['parcels'] = converted
-        row['blockNumber'] = context['blockNumber']
-        row['rowId'] = "|".join([row['id'],row['blockNumber']])
-        return row
+    transforms = [
+        JoinParcels("parcels"),
+        FromContext("blockNumber"),
+        RowId("id", "blockNumber"),
+    ]
     
     schema = th.PropertiesList(
         th.Property("rowId", th.StringType, required=True),
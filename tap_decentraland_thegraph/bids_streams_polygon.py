@@ -1,11 +1,9 @@
 """Stream type classes for tap-decentraland-thegraph."""
 
-from pathlib import Path
-from typing import Any, Dict, Optional, Union, List, Iterable
-
 from singer_sdk import typing as th  # JSON Schema typing helpers
 
 from tap_decentraland_thegraph.client import DecentralandTheGraphPolygonStream
+from tap_decentraland_thegraph.transforms import BodyShapes
 
 
 class WearablesBidsPolygonStream(DecentralandTheGraphPolygonStream):
@@ -66,26 +64,10 @@ class WearablesBidsPolygonStream(DecentralandTheGraphPolygonStream):
         }
     """
 
-    def post_process(self, row: dict, context: Optional[dict] = None) -> dict:
-        """As needed, append or transform raw data to match expected structure."""
-        if 'wearable' in row['nft']['metadata'] and row['nft']['metadata']['wearable'] is not None:
-            if 'bodyShapes' in row['nft']['metadata']['wearable'] and row['nft']['metadata']['wearable']['bodyShapes'] is not None:
-                bodyShapes = row['nft']['metadata']['wearable']['bodyShapes']
-                row['nft']['metadata']['wearable']['bodyShapeMale'] = 'BaseMale' in bodyShapes
-                row['nft']['metadata']['wearable']['bodyShapeFemale'] = 'BaseFemale' in bodyShapes
-                del row['nft']['metadata']['wearable']['bodyShapes']
-        else:
-            row['nft']['metadata']['wearable'] = {}
-        
-        if 'emote' in row['nft']['metadata'] and row['nft']['metadata']['emote'] is not None:
-            if 'bodyShapes' in row['nft']['metadata']['emote'] and row['nft']['metadata']['emote']['bodyShapes'] is not None:
-                bodyShapes = row['nft']['metadata']['emote']['bodyShapes']
-                row['nft']['metadata']['emote']['bodyShapeMale'] = 'BaseMale' in bodyShapes
-                row['nft']['metadata']['emote']['bodyShapeFemale'] = 'BaseFemale' in bodyShapes
-                del row['nft']['metadata']['emote']['bodyShapes']
-        else:
-            row['nft']['metadata']['emote'] = {}
-        return row
+    transforms = [
+        BodyShapes("nft.metadata.wearable", optional=True, fill_missing=True),
+        BodyShapes("nft.metadata.emote", optional=True, fill_missing=True),
+    ]
 
     
     schema = th.PropertiesList(
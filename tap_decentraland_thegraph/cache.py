@@ -0,0 +1,99 @@
+"""Persistent cache of block-pinned GraphQL results.
+
+An entity read at a fixed block never changes, so lookups such as the
+historical estate snapshots can be answered from disk on reruns. Entries are
+keyed by a hash of the endpoint, the normalized query and its variables, so
+streams sending the same lookup share entries. The cache is a single SQLite
+file bounded to `max_bytes`, evicting the least recently used entries first.
+"""
+
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Optional
+
+class SnapshotCache:
+    """Size-bounded LRU cache of JSON values in a SQLite file."""
+
+    def __init__(self, path: str, max_bytes: int):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(
+            path, check_same_thread=False, isolation_level=None
+        )
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS entries "
+            "(key TEXT PRIMARY KEY, value BLOB NOT NULL, size INTEGER NOT NULL, "
+            "accessed REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed)"
+        )
+        self._size = self._conn.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM entries"
+        ).fetchone()[0]
+
+    @staticmethod
+    def key(url: str, query: str, variables: Dict[str, Any]) -> str:
+        normalized = " ".join(query.split())
+        payload = json.dumps([url, normalized, variables], sort_keys=True)
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value FROM entries WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._conn.execute(
+                "UPDATE entries SET accessed = ? WHERE key = ?", (time.time(), key)
+            )
+        return json.loads(row[0])
+
+    def put(self, key: str, value: Any) -> None:
+        blob = json.dumps(value).encode()
+        with self._lock:
+            previous = self._conn.execute(
+                "SELECT size FROM entries WHERE key = ?", (key,)
+            ).fetchone()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO entries (key, value, size, accessed) "
+                "VALUES (?, ?, ?, ?)",
+                (key, blob, len(blob), time.time()),
+            )
+            self._size += len(blob) - (previous[0] if previous else 0)
+            if self._size > self.max_bytes:
+                self._evict()
+
+    def _evict(self) -> None:
+        # Drop the least recently used entries until back under 90% of the bound
+        target = self.max_bytes * 0.9
+        rows = self._conn.execute("SELECT key, size FROM entries ORDER BY accessed")
+        evicted = []
+        for key, size in rows:
+            if self._size <= target:
+                break
+            evicted.append((key,))
+            self._size -= size
+        self._conn.executemany("DELETE FROM entries WHERE key = ?", evicted)
+
+
+_caches: Dict[str, SnapshotCache] = {}
+_caches_lock = threading.Lock()
+
+
+def get_cache(path: str, max_bytes: int) -> SnapshotCache:
+    """Return the process-wide cache for `path`, opening it on first use."""
+    with _caches_lock:
+        if path not in _caches:
+            _caches[path] = SnapshotCache(path, max_bytes)
+        return _caches[path]
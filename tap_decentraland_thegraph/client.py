@@ -1,37 +1,662 @@
 """GraphQL client handling, including DecentralandTheGraphStream base class."""
 
+import copy
+import datetime
+import functools
+import hashlib
+import itertools
+import json
+import operator
+import queue
 import requests
-from pathlib import Path
-from typing import Any, Dict, Optional, Union, List, Iterable, cast, Callable
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Optional, List, Iterable, Tuple, cast, Callable
 
 import backoff
+import singer
 
 from singer_sdk import typing as th  # JSON Schema typing helpers
 
 from singer_sdk.streams import GraphQLStream
 from singer_sdk.streams import RESTStream
-from singer_sdk.exceptions import FatalAPIError, RetriableAPIError
+from singer_sdk.exceptions import RetriableAPIError
+from singer_sdk.helpers._state import finalize_state_progress_markers
 
+from tap_decentraland_thegraph import (
+    batches,
+    batching,
+    cache,
+    codec,
+    metrics,
+    paging,
+    queries,
+    sessions,
+    streaming,
+    validation,
+)
+from tap_decentraland_thegraph.transforms import Transform, compile_transforms
 
 
+RESULTS_PER_PAGE = 1000
+# Upper bound of the last backfill window, the largest value an Int! variable takes
+MAX_TIMESTAMP = 2**31 - 1
+# Pages each backfill window fetches ahead of the stream before it waits
+BACKFILL_QUEUE_PAGES = 4
+
+# Streams synced concurrently share stdout and the tap state
+MESSAGE_LOCK = threading.RLock()
+PAGE_SIZE_LOCK = threading.Lock()
+# Block each endpoint is read at when `pin_block` is set
+RUN_BLOCKS: Dict[str, int] = {}
+RUN_BLOCK_LOCK = threading.Lock()
+METRICS_LOCK = threading.Lock()
+# Replication keys holding unix timestamps, whose distance to now is the stream's lag
+TIMESTAMP_REPLICATION_KEYS = {"updatedAt", "timestamp", "created", "createdAt"}
+# Invalid records logged per stream, the rest are only counted
+MAX_LOGGED_INVALID_RECORDS = 10
+
+
+
+class SerializedOutputMixin:
+    """Hold `MESSAGE_LOCK` while writing Singer messages or updating state.
+
+    RECORD messages are encoded with the fast JSON codec when available, or
+    written to batch files when `batch_output_path` is set, in which case
+    STATE messages wait for the batches they cover.
+    """
+
+    _batch_writer: Any = False
+    # Schemas of the stream's mapped aliases, for Parquet batch files
+    _batch_schemas: Optional[Dict[str, dict]] = None
+
+    @property
+    def batch_writer(self) -> Optional[batches.BatchWriter]:
+        if self._batch_writer is False:
+            path = self.config.get("batch_output_path")
+            self._batch_writer = batches.get_writer(
+                path,
+                self.config.get("batch_output_records", 100000),
+                output_format=self.config.get("batch_output_format", "jsonl"),
+                decimal_precision=self.config.get("batch_output_decimal_precision", 38),
+                logger=self.logger,
+            ) if path else None
+        return self._batch_writer
+
+    def _write_schema_message(self) -> None:
+        with MESSAGE_LOCK:
+            super()._write_schema_message()
+
+    def _write_record_message(self, record: dict) -> None:
+        with MESSAGE_LOCK:
+            batch_writer = self.batch_writer
+            if batch_writer is not None and self._batch_schemas is None:
+                self._batch_schemas = {
+                    stream_map.stream_alias: stream_map.transformed_schema
+                    for stream_map in self.stream_maps
+                }
+            for record_message in self._generate_record_messages(record):
+                if batch_writer is not None:
+                    batch_writer.write(
+                        record_message.stream,
+                        record_message.record,
+                        self._batch_schemas[record_message.stream],
+                    )
+                else:
+                    codec.write_message(record_message)
+
+    def _write_state_message(self) -> None:
+        with MESSAGE_LOCK:
+            if self.batch_writer is not None:
+                self.batch_writer.write_state(self.tap_state)
+                return
+            super()._write_state_message()
+
+    def _write_starting_replication_value(self, context: Optional[dict]) -> None:
+        with MESSAGE_LOCK:
+            super()._write_starting_replication_value(context)
+
+    def _write_replication_key_signpost(
+        self, context: Optional[dict], value: Any
+    ) -> None:
+        with MESSAGE_LOCK:
+            super()._write_replication_key_signpost(context, value)
+
+    def _increment_stream_state(self, *args, **kwargs) -> None:
+        with MESSAGE_LOCK:
+            super()._increment_stream_state(*args, **kwargs)
+
+    def get_context_state(self, context: Optional[dict]) -> dict:
+        # Creates the stream's or partition's entry of the tap state when missing
+        with MESSAGE_LOCK:
+            return super().get_context_state(context)
+
+    def finalize_state_progress_markers(self, state: Optional[dict] = None) -> None:
+        with MESSAGE_LOCK:
+            super().finalize_state_progress_markers(state)
+
+    def finalize_synced_state(self, context: Optional[dict]) -> None:
+        """Finalize the states `_sync_records` finalizes after `get_records` is done.
+
+        The SDK does it with its module function, without `MESSAGE_LOCK`.
+        Finalized here first, under the lock, that call finds nothing to change.
+        """
+        with MESSAGE_LOCK:
+            if context == self._get_state_partition_context(context):
+                finalize_state_progress_markers(self.get_context_state(context))
+            if not context:
+                finalize_state_progress_markers(self.stream_state)
+
+
+class RecordConformanceMixin:
+    """Conform records with a conformer compiled from the stream's schema and selection.
+
+    Records are also validated against the schema, all of them or a sample,
+    as set by `record_validation`. Invalid records are logged and counted.
+    """
+
+    _conformer: Optional[Callable[[dict], dict]] = None
+    _record_validator: Any = False
+    invalid_records = 0
+
+    @property
+    def record_validator(self) -> Optional[validation.RecordValidator]:
+        if self._record_validator is False:
+            mode = self.config.get("record_validation", "none")
+            if mode == "all":
+                self._record_validator = validation.RecordValidator(self.schema)
+            elif mode == "sample":
+                sample_every = self.config.get("record_validation_sample_every", 1000)
+                self._record_validator = validation.RecordValidator(
+                    self.schema, sample_every
+                )
+            else:
+                self._record_validator = None
+        return self._record_validator
+
+    def _generate_record_messages(self, record: dict) -> Iterable[singer.RecordMessage]:
+        if self._conformer is None:
+            self._conformer = validation.compile_conformer(
+                self.name, self.schema, self.mask, self.logger
+            )
+        record = self._conformer(record)
+        validator = self.record_validator
+        if validator is not None:
+            problem = validator(record)
+            if problem is not None:
+                self.record_invalid(record, problem)
+
+        # Formatted like pendulum's `utc_now()`, at a fraction of the cost
+        time_extracted = datetime.datetime.now(datetime.timezone.utc)
+        for stream_map in self.stream_maps:
+            mapped_record = stream_map.transform(record)
+            # Emit record if not filtered
+            if mapped_record is not None:
+                yield singer.RecordMessage(
+                    stream=stream_map.stream_alias,
+                    record=mapped_record,
+                    version=None,
+                    time_extracted=time_extracted,
+                )
+
+    def record_invalid(self, record: dict, problem: str) -> None:
+        self.stream_metrics.add("records_invalid", 1)
+        self.invalid_records += 1
+        if self.invalid_records <= MAX_LOGGED_INVALID_RECORDS:
+            keys = {key: record.get(key) for key in self.primary_keys or []}
+            self.logger.warn(
+                f'(stream: {self.name}) Record {keys} does not match the schema: '
+                f'{problem}'
+            )
+
+
+class StreamMetricsMixin:
+    """Measure requests, parsing and post-processing, per page and per stream.
+
+    Page metrics are written when `parse_response` finishes a page, totals
+    by the tap once every stream is synced.
+    """
+
+    _stream_metrics = None
+
+    @property
+    def stream_metrics(self) -> metrics.StreamMetrics:
+        with METRICS_LOCK:
+            if self._stream_metrics is None:
+                self._stream_metrics = metrics.StreamMetrics()
+        return self._stream_metrics
+
+    def metered_request(self, func: Callable) -> Callable:
+        """Wrap one request attempt, counting it as a retry when it fails."""
+        @functools.wraps(func)
+        def request(prepared_request, context: Optional[dict]):
+            start = time.perf_counter()
+            try:
+                return func(prepared_request, context)
+            except Exception:
+                self.stream_metrics.add("request_retries", 1)
+                raise
+            finally:
+                self.stream_metrics.observe_request(time.perf_counter() - start)
+        return request
+
+    def record_backoff(self, details: dict) -> None:
+        """Backoff handler, counts the time slept before the next attempt."""
+        self.stream_metrics.add("backoff_duration", details["wait"])
+
+    def backoff_handler(self, details: dict) -> None:
+        self.record_backoff(details)
+        super().backoff_handler(details)
+
+    def cursor_lag(self) -> Optional[float]:
+        """Return how many seconds the stream's bookmark is behind now.
+
+        Only streams replicated by a unix timestamp have one.
+        """
+        if self.replication_key not in TIMESTAMP_REPLICATION_KEYS:
+            return None
+        with MESSAGE_LOCK:
+            state = self.stream_state
+            value = state.get("progress_markers", {}).get(
+                "replication_key_value", state.get("replication_key_value")
+            )
+        try:
+            return max(0.0, time.time() - int(value))
+        except (TypeError, ValueError):
+            return None
+
+    def get_records(self, context: Optional[dict]) -> Iterable[Dict[str, Any]]:
+        for record in self.post_processed_records(context):
+            self.stream_metrics.add("records_emitted", 1)
+            yield record
+        self.stream_metrics.merge()
+        self.finalize_synced_state(context)
+
+    def write_page_metrics(self, nbytes: int) -> None:
+        """Write the metrics of the `nbytes` page the current thread just finished."""
+        self.stream_metrics.add("bytes_received", nbytes)
+        page = self.stream_metrics.end_page()
+        tags = {"stream": self.name, "page": self.stream_metrics.pages}
+        for name, value in page.items():
+            self._write_metric_log(metrics.metric(name, value, tags), extra_tags=None)
+
+    def write_total_metrics(self) -> None:
+        """Write the stream's totals, if it did anything."""
+        self.stream_metrics.merge()
+        totals = self.stream_metrics.totals
+        if not totals["request_count"] and not totals["records_emitted"]:
+            return
+        tags = {"stream": self.name, "pages": self.stream_metrics.pages}
+        for name, value in totals.items():
+            self._write_metric_log(metrics.metric(name, value, tags), extra_tags=None)
+
+
+class PostProcessBatchMixin:
+    """Post-process a page of rows at once, for streams defining `post_process_batch`.
+
+    `post_process_batch(rows, context)` gets the parsed rows of a page and
+    returns the processed ones, leaving out those it filters. Streams without
+    it go through `post_process` one row at a time. Streams declaring
+    `transforms` get them compiled into their `post_process_batch` at init.
+    """
+
+    post_process_batch: Optional[Callable[[List[dict], Optional[dict]], List[dict]]] = (
+        None
+    )
+    transforms: Optional[List[Transform]] = None
+    # Pages `parse_response` finished, which tells where the rows of a page end
+    pages_parsed = 0
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        if self.transforms:
+            self.post_process_batch = compile_transforms(
+                self.transforms,
+                self.name,
+                # Parquet decimal columns widen to fit long BigInts, none are nulled
+                exact_integers=bool(self.config.get("batch_output_path"))
+                and self.config.get("batch_output_format") == "parquet",
+            )
+
+    def post_process(self, row: dict, context: Optional[dict] = None) -> Optional[dict]:
+        """Post-process a single row with `post_process_batch`, if any."""
+        if self.post_process_batch is None:
+            return row
+        batch = self.post_process_batch([row], context)
+        return batch[0] if batch else None
+
+    def post_processed_records(self, context: Optional[dict]) -> Iterable[dict]:
+        """Yield the rows of `request_records` once post-processed."""
+        rows = self.request_records(context)
+        if self.post_process_batch is None:
+            for row in rows:
+                start = time.perf_counter()
+                row = self.post_process(row, context)
+                self.stream_metrics.add(
+                    "post_process_duration", time.perf_counter() - start
+                )
+                if row is not None:
+                    yield row
+            return
+
+        # A batch ends with the page its rows were parsed from. Full pages of
+        # `page_size` rows end without reading ahead, shorter ones (shrunk on
+        # retry, REST pages) once the first row of the next page is read. Rows
+        # from a SharedSource or backfill windows were fetched ahead already,
+        # and are batched by `page_size` alone.
+        page_size = getattr(self, "page_size", RESULTS_PER_PAGE)
+        rows = iter(rows)
+        next_row = None
+        while True:
+            batch = []
+            page = self.pages_parsed
+            if next_row is not None:
+                batch.append(next_row)
+                next_row = None
+            for row in itertools.islice(rows, page_size - len(batch)):
+                if batch and self.pages_parsed != page:
+                    next_row = row
+                    break
+                batch.append(row)
+                page = self.pages_parsed
+            if not batch:
+                return
+            start = time.perf_counter()
+            batch = self.post_process_batch(batch, context)
+            self.stream_metrics.add(
+                "post_process_duration", time.perf_counter() - start
+            )
+            yield from batch
+
+
+class QueryBatchingMixin:
+    """Merge concurrent page requests per endpoint when `batch_queries` is set.
+
+    Requests answered by a share of a batched request are logged and
+    validated by each stream they answer, as their own requests would be.
+    """
+
+    @property
+    def query_batcher(self) -> Optional[batching.QueryBatcher]:
+        if not self.config.get("batch_queries"):
+            return None
+        return batching.get_batcher(
+            max_queries=self.config.get("batch_max_queries", 8),
+            wait_seconds=self.config.get("batch_wait_ms", 50) / 1000,
+        )
+
+    def _sync_records(self, context: Optional[dict] = None) -> None:
+        batcher = self.query_batcher
+        # Streams fed by a SharedSource send no page requests of their own
+        if batcher is None or getattr(self, "shared_rows", None) is not None:
+            super()._sync_records(context)
+            return
+        with batcher.active(batching.endpoint_of(self.get_url(context))):
+            super()._sync_records(context)
+
+    def _request(self, prepared_request, context: Optional[dict]):
+        send = super()._request
+        batcher = self.query_batcher
+        if batcher is None:
+            return send(prepared_request, context)
+
+        response = batcher.execute(
+            prepared_request,
+            send=lambda request: send(request, context),
+            send_batch=lambda request: self.requests_session.send(
+                request, timeout=self.timeout
+            ),
+        )
+        if getattr(response, "batch_size", 1) > 1:
+            if self._LOG_REQUEST_METRICS:
+                extra_tags = {}
+                if self._LOG_REQUEST_METRIC_URLS:
+                    extra_tags["url"] = cast(str, prepared_request.path_url)
+                self._write_request_duration_log(
+                    endpoint=self.path,
+                    response=response,
+                    context=context,
+                    extra_tags=extra_tags,
+                )
+            self.validate_response(response)
+        return response
+
+
+class SharedSessionMixin:
+    """Use the endpoint's shared session, which parses page bodies as they
+    download when `stream_responses` is set."""
+
+    # Set on streams whose `parse_response` reads pages with `streaming.PageRows`
+    streamed_pages = False
+
+    @property
+    def requests_session(self) -> requests.Session:
+        return sessions.get_registry().get(
+            self.url_base,
+            pool_size=self.config.get("http_pool_size", 20),
+            http2=self.config.get("http2", False),
+        )
+
+    def prepare_request(
+        self, context: Optional[dict], next_page_token: Optional[Any]
+    ) -> requests.PreparedRequest:
+        prepared_request = super().prepare_request(context, next_page_token)
+        # Only pages go to `parse_response`, other requests are read as a whole
+        prepared_request.stream = (
+            self.streamed_pages
+            and bool(self.config.get("stream_responses"))
+            and streaming.ijson is not None
+        )
+        return prepared_request
+
+    def _request(self, prepared_request, context: Optional[dict]):
+        response = super()._request(prepared_request, context)
+        if streaming.is_streamable(response):
+            # Read the page within the retried (and timed) request, so a body cut
+            # short is requested again before any of its rows is emitted
+            response.page_rows = streaming.PageRows(response, self.object_returned)
+            try:
+                response.page_rows.read()
+            except requests.exceptions.RequestException as err:
+                raise RetriableAPIError(f"Reading the page failed: {err}") from err
+        return response
+
+
+class BlockPinMixin:
+    """Read every entity at one block per endpoint when `pin_block` is set.
+
+    The block is the endpoint's `_meta` head when it is first asked for, so a
+    run sees one consistent snapshot and has a fixed upper bound.
+    """
+
+    @property
+    def run_block(self) -> Optional[int]:
+        if not self.config.get("pin_block"):
+            return None
+        with RUN_BLOCK_LOCK:
+            if self.url_base not in RUN_BLOCKS:
+                resp_json = self.request_graphql(
+                    None, "query { _meta { block { number } } }", {}
+                )
+                RUN_BLOCKS[self.url_base] = resp_json["data"]["_meta"]["block"][
+                    "number"
+                ]
+                self.logger.info(
+                    f"Pinning {self.url_base} to block {RUN_BLOCKS[self.url_base]}"
+                )
+        return RUN_BLOCKS[self.url_base]
+
+    def request_graphql(
+        self, context: Optional[dict], query: str, variables: dict
+    ) -> dict:
+        """Send `query` with retries and return the decoded response body."""
+        return codec.loads(self.send_graphql(context, query, variables).content)
+
+    def send_graphql(self, context: Optional[dict], query: str, variables: dict):
+        """Send `query` with retries and return the response."""
+        prepared_request = self.requests_session.prepare_request(
+            requests.Request(
+                method=self.rest_method,
+                url=self.get_url(context),
+                headers=self.http_headers,
+                json={"query": query, "variables": variables},
+            )
+        )
+        decorated_request = self.request_decorator(self._request)
+        return decorated_request(prepared_request, context)
+
+    def pinned_request_data(self, query: str, variables: dict) -> dict:
+        """Return the request body for `query`, read at the run block if pinned."""
+        run_block = self.run_block
+        if run_block is not None:
+            pinned_query = queries.block_pinned_query(query)
+            if pinned_query != query:
+                query = pinned_query
+                variables = {**variables, "runBlock": run_block}
+        return {"query": query, "variables": variables}
+
+    def prepare_request_payload(
+        self, context: Optional[dict], next_page_token: Optional[Any]
+    ) -> Optional[dict]:
+        request_data = super().prepare_request_payload(context, next_page_token)
+        return self.pinned_request_data(
+            request_data["query"], request_data.get("variables") or {}
+        )
+
+
+class PageSizeMixin:
+    """Send `first` as a variable, tuned per stream when `adaptive_page_size` is set.
+
+    Responses carry the `page_size` they were requested with and the
+    `page_seconds` they took, a page is the last one when it is shorter.
+    """
+
+    page_size_controller = None
+
+    @property
+    def page_size(self) -> int:
+        if not self.config.get("adaptive_page_size"):
+            return RESULTS_PER_PAGE
+        with PAGE_SIZE_LOCK:
+            if self.page_size_controller is None:
+                self.page_size_controller = paging.PageSizeController(
+                    minimum=self.config.get("min_page_size", 100),
+                    maximum=self.config.get("max_page_size", RESULTS_PER_PAGE),
+                    target_seconds=self.config.get("page_target_seconds", 10),
+                )
+        return self.page_size_controller.size
+
+    def paged_request_data(self, query: str, variables: dict) -> dict:
+        """Return the request body for `query`, with `$first` if it pages."""
+        paged_query = queries.page_size_query(query)
+        if paged_query != query:
+            variables = {**variables, "first": self.page_size}
+        return {"query": paged_query, "variables": variables}
+
+    def prepare_request_payload(
+        self, context: Optional[dict], next_page_token: Optional[Any]
+    ) -> Optional[dict]:
+        request_data = super().prepare_request_payload(context, next_page_token)
+        return self.paged_request_data(
+            request_data["query"], request_data.get("variables") or {}
+        )
+
+    def _request(self, prepared_request, context: Optional[dict]):
+        if not self.config.get("adaptive_page_size"):
+            return super()._request(prepared_request, context)
+        payload = json.loads(prepared_request.body)
+        variables = payload.get("variables") or {}
+        if "first" not in variables:
+            return super()._request(prepared_request, context)
+
+        # Retries resend the same request, let them pick up a smaller size
+        size = self.page_size
+        if variables["first"] != size:
+            variables["first"] = size
+            prepared_request = sessions.copy_request(prepared_request)
+            prepared_request.prepare_body(data=None, files=None, json=payload)
+        start = time.perf_counter()
+        try:
+            response = super()._request(prepared_request, context)
+        except (RetriableAPIError, requests.exceptions.ReadTimeout):
+            self.page_size_controller.timed_out(size)
+            self.logger.warn(
+                f'(stream: {self.name}) Page of {size} failed, '
+                f'page size is now {self.page_size_controller.size}'
+            )
+            raise
+        response.page_size = size
+        response.page_seconds = time.perf_counter() - start
+        return response
+
+    def observe_page(self, response, rows: int, nbytes: int) -> None:
+        """Feed a parsed page back to the page size controller."""
+        if self.page_size_controller is None or not hasattr(response, "page_seconds"):
+            return
+        self.page_size_controller.observe(
+            response.page_size, rows, response.page_seconds, nbytes
+        )
 
 
-class DecentralandTheGraphStream(GraphQLStream):
+def key_digest(key: Any) -> str:
+    """Return a short, stable digest of a primary key value."""
+    return hashlib.blake2b(repr(key).encode(), digest_size=8).hexdigest()
+
+
+def page_size_of(response) -> int:
+    """Return the `first` a response was requested with."""
+    return getattr(response, "page_size", RESULTS_PER_PAGE)
+
+
+class DecentralandTheGraphStream(
+    SerializedOutputMixin,
+    RecordConformanceMixin,
+    StreamMetricsMixin,
+    PostProcessBatchMixin,
+    BlockPinMixin,
+    PageSizeMixin,
+    SharedSessionMixin,
+    QueryBatchingMixin,
+    GraphQLStream,
+):
     """DecentralandTheGraph stream class."""
 
+    streamed_pages = True
     is_timestamp_replication_key = True
+    # Page on (replication_key, id) so rows sharing a timestamp are never refetched
+    composite_cursor = True
     latest_timestamp = None
+    last_id = None
     results_count = None
     total_results_count = 0
-    results_keys = set()
     dedupe = True
+    # Primary keys emitted at the latest replication key value, see `is_duplicate`
+    boundary_value = None
+    boundary_keys = None
+    _primary_key_getter = None
+    # The same for records already written, the only ones `save_boundary` stores
+    emitted_boundary_value = None
+    emitted_boundary_keys = None
+    _pending_boundary_key = None
+    # Digests of the keys the previous run emitted at the bookmark value
+    resumed_value = None
+    resumed_digests = None
     onlyonerow = False
+    # Streams with the same shared_source on one endpoint can be fed by a single scan
+    shared_source = None
+    shared_rows = None
+    # Child streams that can resolve many parent contexts in one aliased request
+    batch_lookups = False
+    prefetched = None
+    pending_child_contexts = None
 
     @property
     def url_base(self) -> str:
         """Return the API URL root, configurable via tap settings."""
         return self.config["api_url"]
-    
+
     def get_starting_timestamp(
         self, context: Optional[dict]
     ) -> Optional[int]:
@@ -46,48 +671,383 @@ class DecentralandTheGraphStream(GraphQLStream):
 
         return None
 
+    @property
+    def cursor_variable(self) -> Optional[str]:
+        """Return the query variable bound to `<replication_key>_gte`."""
+        return queries.cursor_variable(self.query, self.replication_key)
+
+    @property
+    def uses_composite_cursor(self) -> bool:
+        """Return True if pages are requested after a (replication_key, id) cursor."""
+        return self.composite_cursor and self.cursor_variable is not None
+
+    def prepare_request_payload(
+        self, context: Optional[dict], next_page_token: Optional[Any]
+    ) -> Optional[dict]:
+        request_data = super().prepare_request_payload(context, next_page_token)
+        if self.uses_composite_cursor:
+            request_data["query"] = queries.composite_cursor_query(
+                request_data["query"], self.replication_key
+            )
+        return request_data
+
+    def get_url_params(self, partition, next_page_token: Optional[Any] = None) -> dict:
+        if self.uses_composite_cursor:
+            latest_timestamp, last_id = next_page_token or (
+                self.get_starting_timestamp(partition),
+                "",
+            )
+            self.logger.info(
+                f'(stream: {self.name}) Next page:{latest_timestamp}|{last_id}'
+            )
+
+            return {
+                self.cursor_variable: int(latest_timestamp),
+                "lastId": last_id,
+            }
 
-    def get_url_params(self, partition, next_page_token: Optional[th.IntegerType] = None) -> dict:
         next_page_token = next_page_token or self.get_starting_timestamp(partition)
         self.logger.info(f'(stream: {self.name}) Next page:{next_page_token}')
 
         return {
-            "updatedAt": int(next_page_token),
+            self.cursor_variable or "updatedAt": int(next_page_token),
         }
 
 
     def get_next_page_token(self, response, previous_token):
         if self.results_count == 0:
             return None
-        if previous_token and self.latest_timestamp == previous_token:
+        if self.uses_composite_cursor:
+            # A short page means there is nothing after the cursor
+            if self.results_count < page_size_of(response):
+                return None
+        elif previous_token and self.latest_timestamp == previous_token:
             return None
 
         if self.total_results_count >= self.config["incremental_limit"]:
             self.logger.warn('Incremental limit for this run reached, please run again to continue loading data, and/or increase your limit')
             return None
 
+        if self.uses_composite_cursor:
+            return (self.latest_timestamp, self.last_id)
         return self.latest_timestamp
-        
 
-    
+
+    def request_records(self, context: Optional[dict]) -> Iterable[dict]:
+        """Request records, backfilling time windows in parallel when configured."""
+        if self.shared_rows is not None:
+            # Rows are fetched once for several streams by a SharedSource
+            yield from iter(self.shared_rows.get, None)
+        elif (
+            self.prefetched and context and self.lookup_key(context) in self.prefetched
+        ):
+            yield from copy.deepcopy(self.prefetched[self.lookup_key(context)])
+        elif self.batch_lookups and context and self.snapshot_cache is not None:
+            key = self.lookup_key(context)
+            rows = self.fetch_lookups({key: context}).get(key)
+            yield from rows if rows is not None else super().request_records(context)
+        elif (
+            self.config.get("backfill_workers", 1) > 1
+            and self.uses_composite_cursor
+            and not self.has_bookmark(context)
+        ):
+            yield from self.request_records_in_windows(context)
+        else:
+            yield from super().request_records(context)
+
+    def has_bookmark(self, context: Optional[dict]) -> bool:
+        """Return True if a previous run left a replication key value to resume from."""
+        with MESSAGE_LOCK:
+            state = self.get_context_state(context)
+            value = state.get("progress_markers", {}).get(
+                "replication_key_value", state.get("replication_key_value")
+            )
+        return value is not None
+
+    def request_records_in_windows(self, context: Optional[dict]) -> Iterable[dict]:
+        """Fetch [start, now] as `_gte`/`_lt` windows on a bounded worker pool.
+
+        Only initial syncs, without a bookmark, are split into windows. Windows
+        are yielded in order, so rows still come out sorted by
+        (replication_key, id) and bookmarks stay valid. Each worker fetches at
+        most `BACKFILL_QUEUE_PAGES` pages ahead of the stream, and the
+        incremental limit is checked after every page.
+        """
+        workers = self.config.get("backfill_workers", 1)
+        window_seconds = self.config.get("backfill_window_seconds", 2592000)
+        limit = self.config["incremental_limit"]
+
+        # The first page tells where data actually starts, `start_updated_at`
+        # defaults to 1 and would otherwise produce decades of empty windows
+        cursor = (self.get_starting_timestamp(context), "")
+        rows, more = self.request_window_page(context, cursor, MAX_TIMESTAMP)
+        self.total_results_count += len(rows)
+        yield from rows
+        if not more:
+            return
+        if self.total_results_count >= limit:
+            self.logger.warn('Incremental limit for this run reached, please run again to continue loading data, and/or increase your limit')
+            return
+
+        cursor = (rows[-1][self.replication_key], rows[-1]["id"])
+        bounds = list(range(int(cursor[0]) + 1, int(time.time()), window_seconds))
+        bounds.append(MAX_TIMESTAMP)
+        windows = iter(
+            [(cursor, bounds[0])]
+            + [((start, ""), end) for start, end in zip(bounds, bounds[1:])]
+        )
+        self.logger.info(
+            f'(stream: {self.name}) Backfilling {len(bounds)} windows '
+            f'with {workers} workers'
+        )
+
+        # Create the session before the workers share it
+        self.requests_session
+        stop = threading.Event()
+        pending = deque()
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            def submit(window: tuple) -> None:
+                pages = queue.Queue(maxsize=BACKFILL_QUEUE_PAGES)
+                executor.submit(self.request_window, context, *window, pages, stop)
+                pending.append(pages)
+
+            for window in itertools.islice(windows, workers):
+                submit(window)
+            try:
+                while pending:
+                    for page in iter(pending[0].get, None):
+                        if isinstance(page, BaseException):
+                            raise page
+                        self.total_results_count += len(page)
+                        yield from page
+                        if self.total_results_count >= limit:
+                            self.logger.warn(
+                                'Incremental limit for this run reached, please run '
+                                'again to continue loading data, and/or increase '
+                                'your limit'
+                            )
+                            return
+                    pending.popleft()
+                    window = next(windows, None)
+                    if window:
+                        submit(window)
+            finally:
+                # Workers waiting for room in a queue give up
+                stop.set()
+
+    def request_window(
+        self,
+        context: Optional[dict],
+        cursor: tuple,
+        window_end: int,
+        pages: queue.Queue,
+        stop: threading.Event,
+    ) -> None:
+        """Page through one backfill window, putting its pages on `pages`.
+
+        The window ends with None, or with the exception that stopped it.
+        """
+        def put(item) -> bool:
+            while not stop.is_set():
+                try:
+                    pages.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+
+        window_start = cursor[0]
+        count = 0
+        try:
+            while True:
+                page, more = self.request_window_page(context, cursor, window_end)
+                count += len(page)
+                if not put(page):
+                    return
+                if not more:
+                    break
+                cursor = (page[-1][self.replication_key], page[-1]["id"])
+        except BaseException as err:
+            put(err)
+            return
+        self.logger.info(
+            f'(stream: {self.name}) Window {window_start}-{window_end}: {count} rows'
+        )
+        put(None)
+
+    def request_window_page(
+        self,
+        context: Optional[dict],
+        cursor: tuple,
+        window_end: int,
+        query: Optional[str] = None,
+    ) -> Tuple[List[dict], bool]:
+        """Request the page after `cursor` below `window_end`.
+
+        Unlike `parse_response` this keeps no pagination state on the stream, so
+        several windows can be requested at once. `query` replaces the stream's
+        own query, it must bind the same cursor variable. Returns the rows and
+        whether a next page may follow.
+        """
+        latest_timestamp, last_id = cursor
+        response = self.send_graphql(
+            context,
+            **self.pinned_request_data(
+                **self.paged_request_data(
+                    queries.composite_cursor_query(
+                        query or self.query, self.replication_key, bounded=True
+                    ),
+                    {
+                        self.cursor_variable: int(latest_timestamp),
+                        "lastId": last_id,
+                        "windowEnd": window_end,
+                    },
+                )
+            ),
+        )
+        start = time.perf_counter()
+        resp_json = codec.loads(response.content)
+        self.stream_metrics.add("parse_duration", time.perf_counter() - start)
+        try:
+            rows = resp_json["data"][self.object_returned]
+        except Exception as err:
+            self.logger.warn(f"(stream: {self.name}) Problem with response: {resp_json}")
+            raise err
+        self.observe_page(response, len(rows), len(response.content))
+        self.write_page_metrics(len(response.content))
+        return rows, len(rows) >= page_size_of(response)
+
+    def _sync_children(self, child_context: dict) -> None:
+        """Buffer child contexts when a child resolves them in batches."""
+        batch_size = self.config.get("lookup_batch_size", 100)
+        if batch_size <= 1 or not any(
+            child.batch_lookups for child in self.child_streams
+        ):
+            super()._sync_children(child_context)
+            return
+
+        if self.pending_child_contexts is None:
+            self.pending_child_contexts = []
+        self.pending_child_contexts.append(child_context)
+        if len(self.pending_child_contexts) >= batch_size:
+            self.flush_child_contexts()
+
+    def flush_child_contexts(self) -> None:
+        """Prefetch the buffered child contexts, then sync the children for each."""
+        contexts = self.pending_child_contexts
+        self.pending_child_contexts = []
+        if not contexts:
+            return
+        for child in self.child_streams:
+            if child.batch_lookups and child.selected:
+                child.prefetch_lookups(contexts)
+        for context in contexts:
+            super()._sync_children(context)
+        for child in self.child_streams:
+            child.prefetched = None
+
+    def _write_state_message(self) -> None:
+        # Children of buffered records must be out before the bookmark moves past them
+        self.flush_child_contexts()
+        self.save_boundary()
+        super()._write_state_message()
+
+    def lookup_key(self, context: dict) -> tuple:
+        return tuple(sorted(self.get_url_params(context, None).items()))
+
+    @property
+    def snapshot_cache(self) -> Optional[cache.SnapshotCache]:
+        """Return the on-disk cache if configured and the stream's query is pinned."""
+        path = self.config.get("snapshot_cache_path")
+        if not path or not queries.is_block_pinned(self.query):
+            return None
+        return cache.get_cache(
+            path, self.config.get("snapshot_cache_max_mb", 512) * 2**20
+        )
+
+    def prefetch_lookups(self, contexts: List[dict]) -> None:
+        """Resolve child contexts ahead of their sync, coalescing identical ones."""
+        unique = {}
+        for context in contexts:
+            unique.setdefault(self.lookup_key(context), context)
+        self.prefetched = self.fetch_lookups(unique)
+        self.logger.info(
+            f"(stream: {self.name}) Prefetched {len(self.prefetched)} lookups "
+            f"for {len(contexts)} contexts"
+        )
+
+    def fetch_lookups(self, contexts: Dict[tuple, dict]) -> Dict[tuple, List[dict]]:
+        """Resolve lookups with aliased queries, one request per batch.
+
+        Block-pinned lookups are answered from the snapshot cache when possible,
+        and what is fetched is stored there. If a batch fails with GraphQL errors
+        its contexts are left out, for the regular one-request-per-context path.
+        """
+        snapshot_cache = self.snapshot_cache
+        results = {}
+        cache_keys = {}
+        if snapshot_cache is not None:
+            for key in contexts:
+                cache_keys[key] = snapshot_cache.key(
+                    self.url_base, self.query, dict(key)
+                )
+                rows = snapshot_cache.get(cache_keys[key])
+                if rows is not None:
+                    results[key] = rows
+
+        keys = [key for key in contexts if key not in results]
+        batch_size = self.config.get("lookup_batch_size", 100)
+        for i in range(0, len(keys), batch_size):
+            batch = keys[i:i + batch_size]
+            query, variables, fields = queries.merge_queries(
+                [(self.query, dict(key)) for key in batch]
+            )
+            resp_json = self.request_graphql(None, query, variables)
+            if resp_json.get("errors") or not resp_json.get("data"):
+                self.logger.warn(
+                    f"(stream: {self.name}) Batched lookup failed, falling back to "
+                    f"single requests: {resp_json.get('errors')}"
+                )
+                continue
+            for key, (alias, _) in zip(batch, fields):
+                results[key] = resp_json["data"][alias]
+                if snapshot_cache is not None:
+                    snapshot_cache.put(cache_keys[key], results[key])
+        if snapshot_cache is not None and cache_keys:
+            self.logger.info(
+                f"(stream: {self.name}) Snapshot cache: "
+                f"{len(contexts) - len(keys)} hits, {len(keys)} misses"
+            )
+        return results
+
+
     def parse_response(self, response) -> Iterable[dict]:
         """Parse the response and return an iterator of result rows."""
-        resp_json = response.json()
+        page = streaming.page_rows(response, self.object_returned)
+        self.results_count = 0
         try:
-            results = resp_json["data"][self.object_returned]
-            self.results_count = len(results)
-            self.total_results_count += self.results_count
-            for row in results:
+            for row in self.stream_metrics.timed(page):
+                self.results_count += 1
+                self.total_results_count += 1
 
-                if self.onlyonerow == False:
+                if self.uses_composite_cursor:
+                    # Rows come sorted by (replication_key, id), the last is the cursor
+                    self.latest_timestamp = row[self.replication_key]
+                    self.last_id = row["id"]
+                elif self.onlyonerow == False:
                     #Update timestamp
                     if self.latest_timestamp is None or row[self.replication_key] > self.latest_timestamp:
                         self.latest_timestamp = row[self.replication_key]
-                
+
                 yield row
         except Exception as err:
-            self.logger.warn(f"(stream: {self.name}) Problem with response: {resp_json}")
+            self.logger.warn(
+                f"(stream: {self.name}) Problem with response: {page.body}"
+            )
             raise err
+        self.observe_page(response, self.results_count, page.nbytes)
+        self.write_page_metrics(page.nbytes)
+        self.pages_parsed += 1
 
     def get_records(self, context: Optional[dict]) -> Iterable[Dict[str, Any]]:
         """Return a generator of row-type dictionary objects.
@@ -95,21 +1055,128 @@ class DecentralandTheGraphStream(GraphQLStream):
         Each row emitted should be a dictionary of property names to their values.
         Modified to detect dupes
         """
-        for row in self.request_records(context):
-            row = self.post_process(row, context)
-            row_key = "|".join([v for k,v in row.items() if k in self.primary_keys])
-            if row_key in self.results_keys and self.dedupe:
+        if self.persists_boundary and self.resumed_digests is None:
+            self.resume_boundary()
+        resumed_skipped = 0
+        for row in self.post_processed_records(context):
+            if self.resumed_digests and self.emitted_by_previous_run(row):
+                resumed_skipped += 1
+                continue
+            if self.dedupe and self.is_duplicate(row):
                 # Because thegraph doesn't allow for reliable pagination, sometimes you could get
                 # duplicate rows from the same second.
-                self.logger.warn(f"(stream: {self.name}) skipping duplicate {row_key}")
+                self.logger.warn(
+                    f"(stream: {self.name}) skipping duplicate "
+                    f"{self.primary_key_getter(row)}"
+                )
+                self.stream_metrics.add("duplicates_skipped", 1)
                 continue
-
-            #Add key as processed to avoid dupes
-            if self.dedupe:
-                self.results_keys.add(row_key)
+            self.stream_metrics.add("records_emitted", 1)
+            if self.persists_boundary:
+                # The SDK may write STATE between this yield and writing the record
+                self._pending_boundary_key = (
+                    self.boundary_value,
+                    self.primary_key_getter(row),
+                )
             yield row
-    
-    
+        self.stream_metrics.merge()
+        if resumed_skipped:
+            self.logger.info(
+                f"(stream: {self.name}) Skipped {resumed_skipped} rows already "
+                "emitted by the previous run"
+            )
+        self.finalize_synced_state(context)
+
+    @property
+    def primary_key_getter(self) -> Callable[[dict], Any]:
+        if self._primary_key_getter is None:
+            self._primary_key_getter = operator.itemgetter(*self.primary_keys)
+        return self._primary_key_getter
+
+    def is_duplicate(self, row: dict) -> bool:
+        """Return True if `row` was already emitted, remembering it otherwise.
+
+        Rows of sorted streams can only repeat at the same replication key
+        value, so only the keys of the latest value are kept.
+        """
+        value = row.get(self.replication_key) if self.replication_key else None
+        if self.boundary_keys is None or (
+            self.is_sorted and value != self.boundary_value
+        ):
+            self.boundary_value = value
+            self.boundary_keys = set()
+        key = self.primary_key_getter(row)
+        if key in self.boundary_keys:
+            return True
+        self.boundary_keys.add(key)
+        return False
+
+    def _write_record_message(self, record: dict) -> None:
+        super()._write_record_message(record)
+        if self._pending_boundary_key is not None:
+            value, key = self._pending_boundary_key
+            self._pending_boundary_key = None
+            if (
+                self.emitted_boundary_keys is None
+                or value != self.emitted_boundary_value
+            ):
+                self.emitted_boundary_value = value
+                self.emitted_boundary_keys = set()
+            self.emitted_boundary_keys.add(key)
+
+    @property
+    def persists_boundary(self) -> bool:
+        """Return True if the keys emitted at the bookmark are kept in state."""
+        return bool(
+            self.dedupe
+            and self.is_sorted
+            and self.replication_key
+            and not self.partitions
+        )
+
+    def resume_boundary(self) -> None:
+        """Load the digests `save_boundary` stored for the current bookmark."""
+        state = self.stream_state
+        digests = state.get("boundary_keys")
+        if digests and state.get("boundary_value") == state.get(
+            "replication_key_value"
+        ):
+            self.resumed_value = state["boundary_value"]
+            self.resumed_digests = set(digests)
+        else:
+            self.resumed_digests = set()
+
+    def emitted_by_previous_run(self, row: dict) -> bool:
+        """Return True if the previous run emitted `row` at its bookmark value.
+
+        Incremental syncs resume with `<replication_key>_gte`, so every row at
+        the bookmark is fetched again.
+        """
+        if row.get(self.replication_key) != self.resumed_value:
+            return False
+        return key_digest(self.primary_key_getter(row)) in self.resumed_digests
+
+    def save_boundary(self) -> None:
+        """Store digests of the keys written at the bookmark value in the stream state.
+
+        Only records already written count, rows yielded but not written yet
+        must be fetched again. At most `max_boundary_keys` digests are kept,
+        rows left out are simply emitted again by the next run.
+        """
+        if not self.persists_boundary or self.emitted_boundary_keys is None:
+            return
+        digests = set()
+        if self.resumed_digests and self.emitted_boundary_value == self.resumed_value:
+            digests.update(self.resumed_digests)
+        digests.update(key_digest(key) for key in self.emitted_boundary_keys)
+        with MESSAGE_LOCK:
+            state = self.stream_state
+            state["boundary_value"] = self.emitted_boundary_value
+            state["boundary_keys"] = sorted(digests)[
+                : self.config.get("max_boundary_keys", 1000)
+            ]
+
+
     def request_decorator(self, func: Callable) -> Callable:
         decorator: Callable = backoff.on_exception(
             backoff.expo,
@@ -119,11 +1186,11 @@ class DecentralandTheGraphStream(GraphQLStream):
             ),
             max_tries=10,
             factor=3,
-        )(func)
+            on_backoff=self.record_backoff,
+        )(self.metered_request(func))
         return decorator
 
 
-
 class DecentralandTheGraphPolygonStream(DecentralandTheGraphStream):
     """DecentralandTheGraphPolygonStream stream class."""
 
@@ -133,15 +1200,37 @@ class DecentralandTheGraphPolygonStream(DecentralandTheGraphStream):
         return self.config["polygon_collections_url"]
 
 
-
-RESULTS_PER_PAGE = 1000
-
-class DecentralandTheGraphCompleteObjectStream(GraphQLStream):
+class DecentralandTheGraphCompleteObjectStream(
+    SerializedOutputMixin,
+    RecordConformanceMixin,
+    StreamMetricsMixin,
+    PostProcessBatchMixin,
+    BlockPinMixin,
+    PageSizeMixin,
+    SharedSessionMixin,
+    QueryBatchingMixin,
+    GraphQLStream,
+):
     """DecentralandTheGraphCompleteObjectStream stream class."""
+    streamed_pages = True
     total_results_count = 0
     results_count = 0
-    
+    # Page with `orderBy: id, where: {id_gt: $lastId}` instead of `skip`
+    keyset_pagination = False
+    last_id = None
+
+    def request_decorator(self, func: Callable) -> Callable:
+        return super().request_decorator(self.metered_request(func))
+
     def get_url_params(self, partition, next_page_token: Optional[th.IntegerType] = None) -> dict:
+        if self.keyset_pagination:
+            next_page_token = next_page_token or ""
+            self.logger.info(f'(stream: {self.name}) Next page:{next_page_token}')
+
+            return {
+                "lastId": next_page_token,
+            }
+
         next_page_token = next_page_token or 0
         self.logger.info(f'(stream: {self.name}) Next page:{next_page_token}')
 
@@ -151,37 +1240,49 @@ class DecentralandTheGraphCompleteObjectStream(GraphQLStream):
 
 
     def get_next_page_token(self, response, previous_token):
-        if self.results_count == 0 or self.results_count < RESULTS_PER_PAGE:
+        page_size = page_size_of(response)
+        if self.results_count == 0 or self.results_count < page_size:
             return None
 
         if self.total_results_count >= self.config["incremental_limit"]:
             self.logger.warn('Limit for this run reached')
             return None
 
+        if self.keyset_pagination:
+            # Each keyset page costs the same, so the skip cap doesn't apply
+            return self.last_id
+
         if previous_token is None:
-            return RESULTS_PER_PAGE
+            return page_size
         else:
             if previous_token >= 5000:
                 self.logger.warn('Skip can\'t be higher than 5000 on The Graph')
                 return None
-            return previous_token + RESULTS_PER_PAGE
-        
+            return previous_token + page_size
+
+
 
-    
     def parse_response(self, response) -> Iterable[dict]:
         """Parse the response and return an iterator of result rows."""
-        resp_json = response.json()
+        page = streaming.page_rows(response, self.object_returned)
+        self.results_count = 0
         try:
-            results = resp_json["data"][self.object_returned]
-            self.results_count = len(results)
-            self.total_results_count += self.results_count
-            for row in results:
+            for row in self.stream_metrics.timed(page):
+                self.results_count += 1
+                self.total_results_count += 1
+                if self.keyset_pagination:
+                    self.last_id = row["id"]
                 yield row
         except Exception as err:
-            self.logger.warn(f"(stream: {self.name}) Problem with response: {resp_json}")
+            self.logger.warn(
+                f"(stream: {self.name}) Problem with response: {page.body}"
+            )
             raise err
-    
-    
+        self.observe_page(response, self.results_count, page.nbytes)
+        self.write_page_metrics(page.nbytes)
+        self.pages_parsed += 1
+
+
     @backoff.on_exception(
         backoff.expo,
         (requests.exceptions.RequestException),
@@ -221,8 +1322,20 @@ class DecentralandTheGraphCompleteObjectStream(GraphQLStream):
         return response
 
 
-class BaseAPIStream(RESTStream):
-    
+class BaseAPIStream(
+    SerializedOutputMixin,
+    RecordConformanceMixin,
+    StreamMetricsMixin,
+    PostProcessBatchMixin,
+    SharedSessionMixin,
+    RESTStream,
+):
+
+    def parse_response(self, response: requests.Response) -> Iterable[dict]:
+        yield from self.stream_metrics.timed(super().parse_response(response))
+        self.write_page_metrics(len(response.content))
+        self.pages_parsed += 1
+
     def request_decorator(self, func: Callable) -> Callable:
         decorator: Callable = backoff.on_exception(
             backoff.expo,
@@ -232,8 +1345,6 @@ class BaseAPIStream(RESTStream):
             ),
             max_tries=10,
             factor=3,
-        )(func)
+            on_backoff=self.record_backoff,
+        )(self.metered_request(func))
         return decorator
-
-
-
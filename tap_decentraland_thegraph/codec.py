@@ -0,0 +1,69 @@
+"""JSON codec for GraphQL responses and Singer RECORD messages.
+
+Uses `orjson` when it is installed (the `fast-json` extra) and the standard
+library otherwise. RECORD messages fall back to singer's own formatter for
+anything orjson does not encode the same way, such as `Decimal` values, and
+other documents to the standard library, e.g. for integers past 64 bits.
+"""
+
+import json
+import sys
+from typing import Any, Union
+
+import singer
+
+try:
+    import orjson
+except ImportError:  # Optional dependency, install the `fast-json` extra
+    orjson = None
+
+
+def loads(data: Union[bytes, str]) -> Any:
+    """Decode a JSON document."""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def _unsupported(value: Any) -> Any:
+    raise TypeError(f"Type is not JSON serializable: {type(value).__name__}")
+
+
+def dumps(value: Any) -> str:
+    """Encode `value` as compact JSON text."""
+    if orjson is not None:
+        try:
+            return orjson.dumps(value).decode()
+        except TypeError:
+            pass
+    return json.dumps(value, separators=(",", ":"))
+
+
+def dumps_line(value: Any) -> bytes:
+    """Encode `value` as a line of JSON Lines."""
+    if orjson is not None:
+        try:
+            return orjson.dumps(value, option=orjson.OPT_APPEND_NEWLINE)
+        except TypeError:
+            pass
+    return (json.dumps(value, separators=(",", ":")) + "\n").encode()
+
+
+def format_message(message: singer.Message) -> str:
+    """Serialize a Singer message with the same meaning as `singer.format_message`."""
+    if orjson is not None:
+        try:
+            # Datetimes go through `default`, which makes singer format them
+            return orjson.dumps(
+                message.asdict(),
+                default=_unsupported,
+                option=orjson.OPT_PASSTHROUGH_DATETIME,
+            ).decode()
+        except TypeError:
+            pass
+    return singer.format_message(message)
+
+
+def write_message(message: singer.Message) -> None:
+    sys.stdout.write(format_message(message) + "\n")
+    sys.stdout.flush()
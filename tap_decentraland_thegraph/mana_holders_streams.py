@@ -1,9 +1,5 @@
 """Stream type classes for tap-decentraland-thegraph."""
 
-import requests, backoff
-from pathlib import Path
-from typing import Any, Dict, Optional, Union, List, Iterable, cast
-
 from singer_sdk import typing as th  # JSON Schema typing helpers
 
 from tap_decentraland_thegraph.client import DecentralandTheGraphCompleteObjectStream
@@ -19,15 +15,18 @@ class ETHManaStream(DecentralandTheGraphCompleteObjectStream):
 
     primary_keys = ["id"]
     object_returned = 'accounts'
+    keyset_pagination = True
     
     query = """
-    query ($offset: Int!)
+    query ($lastId: ID!)
     {
         accounts(
             first: 1000,
-            skip: $offset,
-            orderBy:mana,
-            orderDirection:desc
+            orderBy: id,
+            orderDirection: asc,
+            where: {
+                id_gt: $lastId
+            }
         ) {
             id
             mana
@@ -52,15 +51,18 @@ class PolygonManaStream(DecentralandTheGraphCompleteObjectStream):
 
     primary_keys = ["id"]
     object_returned = 'accounts'
+    keyset_pagination = True
     
     query = """
-    query ($offset: Int!)
+    query ($lastId: ID!)
     {
         accounts(
             first: 1000,
-            offset: $offset,
-            orderBy:mana,
-            orderDirection:desc
+            orderBy: id,
+            orderDirection: asc,
+            where: {
+                id_gt: $lastId
+            }
         ) {
             id
             mana
@@ -0,0 +1,120 @@
+"""Per-stream performance metrics, written as Singer METRIC log lines.
+
+Each stream adds up, per page, the time its requests took and how often they
+were retried, the bytes and parse time of the response, the time spent in
+`post_process` and the records it emitted, skipped as duplicates or found
+invalid. Pages are accumulated per thread, since backfill windows of one
+stream are fetched concurrently, and roll up into the stream's totals when
+they end.
+"""
+
+import bisect
+import threading
+import time
+from typing import Dict, Iterable, Iterator, List, Optional
+
+# Singer metric type of each measurement
+METRICS = {
+    "request_duration": "timer",
+    "request_count": "counter",
+    "request_retries": "counter",
+    "backoff_duration": "timer",
+    "bytes_received": "counter",
+    "parse_duration": "timer",
+    "post_process_duration": "timer",
+    "records_emitted": "counter",
+    "duplicates_skipped": "counter",
+    "records_invalid": "counter",
+}
+# Upper bounds of the request latency histogram, in seconds
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+
+class StreamMetrics:
+    """Page and total measurements of one stream."""
+
+    def __init__(self):
+        self.pages = 0
+        self.totals: Dict[str, float] = dict.fromkeys(METRICS, 0)
+        # Requests per latency bucket, the last one unbounded
+        self.latency_counts: List[int] = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.latency_sum = 0.0
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    @property
+    def page(self) -> Dict[str, float]:
+        """Return the measurements of the current thread's page."""
+        page = getattr(self._local, "page", None)
+        if page is None:
+            page = self._local.page = dict.fromkeys(METRICS, 0)
+        return page
+
+    def add(self, name: str, value: float) -> None:
+        self.page[name] += value
+
+    def observe_request(self, seconds: float) -> None:
+        """Add one request attempt taking `seconds`."""
+        self.add("request_count", 1)
+        self.add("request_duration", seconds)
+        with self._lock:
+            self.latency_counts[bisect.bisect_left(LATENCY_BUCKETS, seconds)] += 1
+            self.latency_sum += seconds
+
+    def end_page(self) -> Dict[str, float]:
+        """Add the current thread's page to the totals and return it."""
+        page = self.page
+        self.merge()
+        with self._lock:
+            self.pages += 1
+        return page
+
+    def merge(self) -> None:
+        """Add what the current thread measured outside of a page to the totals."""
+        page = getattr(self._local, "page", None)
+        self._local.page = None
+        if page is None:
+            return
+        with self._lock:
+            for name, value in page.items():
+                self.totals[name] += value
+
+    def snapshot(self) -> dict:
+        """Return the totals so far, with the latency histogram."""
+        with self._lock:
+            return {
+                "pages": self.pages,
+                "totals": dict(self.totals),
+                "latency_counts": list(self.latency_counts),
+                "latency_sum": self.latency_sum,
+            }
+
+    def timed(self, rows: Iterable, name: str = "parse_duration") -> Iterator:
+        """Yield from `rows`, adding the time spent producing them to `name`.
+
+        The time consumers spend on each row between two steps is left out.
+        """
+        rows = iter(rows)
+        elapsed = 0.0
+        try:
+            while True:
+                start = time.perf_counter()
+                row = next(rows, StopIteration)
+                elapsed += time.perf_counter() - start
+                if row is StopIteration:
+                    return
+                yield row
+        finally:
+            self.add(name, elapsed)
+
+
+def metric(name: str, value: float, tags: Optional[dict] = None) -> dict:
+    """Return a Singer metric point."""
+    if METRICS[name] == "timer":
+        value = round(value, 6)
+    return {
+        "type": METRICS[name],
+        "metric": name,
+        "value": value,
+        "tags": dict(tags or {}),
+    }
@@ -0,0 +1,672 @@
+"""Local stand-in for graph-node, for offline and load tests of the tap.
+
+Serves the subset of GraphQL the tap sends: aliased top-level entity fields
+with `first`, `skip`, `orderBy`, `orderDirection`, `where` (equality, `_gt`,
+`_gte`, `_lt`, `_lte`, `_in`, `_not`, `_not_in`, `or`, `and`) and
+`block: {number}`, plus `_meta { block { number } }`. It also answers the POAP
+`/paginated-events` REST endpoint.
+
+Entity rows are generated on demand from their index, so datasets of any size
+cost no memory. Row `i` of every entity has id `0x<i in hex>`, was created at
+block `BASE_BLOCK + i` and shares its timestamps with its neighbours in groups
+of `ROWS_PER_TIMESTAMP`, so cursor tiebreaks get exercised. Field values are
+derived from the field name, matching the types graph-node returns.
+
+    python -m tap_decentraland_thegraph.mock_graph_node --rows 100000
+
+starts a server and prints a tap config pointing every URL at it.
+"""
+
+import argparse
+import gzip
+import json
+import random
+import re
+import sys
+import threading
+import time
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+BASE_TIMESTAMP = 1600000000
+BASE_BLOCK = 10000000
+ROWS_PER_TIMESTAMP = 3
+SECONDS_PER_TIMESTAMP = 60
+CATEGORIES = ["wearable", "ens", "parcel", "estate"]
+MAX_FIRST = 1000
+MAX_SKIP = 5000
+
+ENTITIES = {
+    "accounts", "bids", "collections", "estates", "events", "items",
+    "mints", "nfts", "orders", "rentals", "sales",
+}
+TIMESTAMP_FIELDS = {"updatedAt", "createdAt", "timestamp", "created"}
+# Fields whose value never decreases with the row index, so rows sorted by
+# any of them are simply in index order
+ORDERED_FIELDS = TIMESTAMP_FIELDS | {"id", "blockNumber"}
+BIG_INT_FIELDS = {
+    "available", "creationFee", "earned", "endsAt", "feesCollectorCut", "mana",
+    "maxSupply", "price", "pricePerDay", "rentalDays", "royaltiesCut",
+    "searchIssuedId", "searchPrimarySalePrice", "spent", "startedAt", "tokenId",
+    "totalSupply", "volume", "x", "y",
+}
+INT_FIELDS = {
+    "itemsCount",
+    "purchases",
+    "sales",
+    "size",
+    "totalCurations",
+    "uniqueCollectorsTotal",
+}
+BOOLEAN_FIELDS = {"hasGeometry", "hasSound", "loop", "ownerHasClaimedAsset"}
+OBJECT_LIST_FIELDS = {"parcels"}
+
+
+class GraphQLError(Exception):
+    pass
+
+
+def entity_id(i: int) -> str:
+    return "0x%040x" % i
+
+
+def timestamp_of(i: int) -> int:
+    return BASE_TIMESTAMP + (i // ROWS_PER_TIMESTAMP) * SECONDS_PER_TIMESTAMP
+
+
+def field_value(field: str, i: int) -> Any:
+    """Return the value of scalar `field` of row `i`, typed like graph-node."""
+    if field == "id":
+        return entity_id(i)
+    if field in TIMESTAMP_FIELDS:
+        return str(timestamp_of(i))
+    if field == "blockNumber":
+        return str(BASE_BLOCK + i)
+    if field == "category":
+        return CATEGORIES[i % len(CATEGORIES)]
+    if field == "status":
+        return "open" if i % 5 == 4 else "sold"
+    if field in ("x", "y"):
+        return str(i % 301 - 150)
+    if field in BIG_INT_FIELDS:
+        return str(i * 1000000007 % 10**21)
+    if field in INT_FIELDS:
+        return i % 100
+    if (
+        field in BOOLEAN_FIELDS
+        or field.startswith("is")
+        or field.startswith("searchIs")
+    ):
+        return i % 2 == 0
+    if field == "bodyShapes":
+        return [["BaseMale"], ["BaseFemale"], ["BaseMale", "BaseFemale"]][i % 3]
+    if field in ("minters", "managers"):
+        return [entity_id(i), entity_id(i + 1)]
+    return f"{field}-{i}"
+
+
+def numeric(field: str) -> bool:
+    return (
+        field in TIMESTAMP_FIELDS
+        or field in BIG_INT_FIELDS
+        or field in INT_FIELDS
+        or field == "blockNumber"
+    )
+
+
+def project(tree: dict, i: int) -> dict:
+    """Build row `i` with the fields of a parsed selection set."""
+    row = {}
+    for name, (field, _, sub) in tree.items():
+        if sub is None:
+            row[name] = field_value(field, i)
+        elif field in OBJECT_LIST_FIELDS:
+            row[name] = [project(sub, i * 2 + j) for j in range(2)]
+        else:
+            row[name] = project(sub, i)
+    return row
+
+
+def sample_rows(query: str, count: int) -> List[dict]:
+    """Return rows 0 to `count` - 1 shaped like the first entity `query` selects."""
+    tree = Parser(query).document()
+    _, _, selection = next(iter(tree.values()))
+    return [project(selection, i) for i in range(count)]
+
+
+# -- Parsing ------------------------------------------------------------------
+
+TOKEN_RE = re.compile(
+    r'\s+|,|#[^\n]*|(\.\.\.|[{}()\[\]:!=$]|"(?:[^"\\]|\\.)*"|-?\d+(?:\.\d+)?|\w+)'
+)
+
+
+def tokenize(text: str) -> List[str]:
+    tokens = []
+    pos = 0
+    while pos < len(text):
+        match = TOKEN_RE.match(text, pos)
+        if match is None:
+            raise GraphQLError(f"Unexpected character at {pos}: {text[pos]!r}")
+        if match.group(1):
+            tokens.append(match.group(1))
+        pos = match.end()
+    return tokens
+
+
+class Parser:
+    """Recursive descent parser for the query documents the tap sends."""
+
+    def __init__(self, text: str, variables: Optional[dict] = None):
+        self.tokens = tokenize(text)
+        self.pos = 0
+        self.variables = variables
+
+    def peek(self) -> Optional[str]:
+        return self.tokens[self.pos] if self.pos < len(self.tokens) else None
+
+    def take(self, expected: Optional[str] = None) -> str:
+        token = self.peek()
+        if token is None or (expected is not None and token != expected):
+            raise GraphQLError(f"Expected {expected or 'a token'}, got {token}")
+        self.pos += 1
+        return token
+
+    def document(self) -> dict:
+        if self.peek() == "query":
+            self.take()
+            if self.peek() not in ("(", "{"):
+                self.take()  # Operation name
+            if self.peek() == "(":
+                # Variable types are not checked
+                depth = 0
+                while True:
+                    token = self.take()
+                    depth += token == "("
+                    depth -= token == ")"
+                    if not depth:
+                        break
+        return self.selection_set()
+
+    def selection_set(self) -> dict:
+        """Return `{response key: (field, arguments, sub-selection or None)}`."""
+        self.take("{")
+        tree = {}
+        while self.peek() != "}":
+            name = self.take()
+            field = name
+            if self.peek() == ":":
+                self.take()
+                field = self.take()
+            arguments = self.arguments() if self.peek() == "(" else {}
+            sub = self.selection_set() if self.peek() == "{" else None
+            tree[name] = (field, arguments, sub)
+        self.take("}")
+        return tree
+
+    def arguments(self) -> dict:
+        self.take("(")
+        arguments = {}
+        while self.peek() != ")":
+            name = self.take()
+            self.take(":")
+            arguments[name] = self.value()
+        self.take(")")
+        return arguments
+
+    def value(self) -> Any:
+        token = self.take()
+        if token == "$":
+            name = self.take()
+            if self.variables is None:
+                # Only the shape of the query is wanted
+                return None
+            if name not in self.variables:
+                raise GraphQLError(f"Variable `{name}` was not provided")
+            return self.variables[name]
+        if token == "[":
+            values = []
+            while self.peek() != "]":
+                values.append(self.value())
+            self.take("]")
+            return values
+        if token == "{":
+            fields = {}
+            while self.peek() != "}":
+                name = self.take()
+                self.take(":")
+                fields[name] = self.value()
+            self.take("}")
+            return fields
+        if token.startswith('"'):
+            return json.loads(token)
+        if re.fullmatch(r"-?\d+", token):
+            return int(token)
+        if re.fullmatch(r"-?\d+\.\d+", token):
+            return float(token)
+        return {"true": True, "false": False, "null": None}.get(token, token)
+
+
+# -- Filtering ----------------------------------------------------------------
+
+OPERATORS = ("_not_in", "_in", "_not", "_gte", "_gt", "_lte", "_lt")
+
+
+def split_filter(key: str) -> Tuple[str, str]:
+    for operator in OPERATORS:
+        if key.endswith(operator) and len(key) > len(operator):
+            return key[: -len(operator)], operator
+    return key, ""
+
+
+def coerce(field: str, value: Any) -> Any:
+    if value is None:
+        return None
+    if numeric(field):
+        return int(value)
+    return value
+
+
+def matches(where: dict, i: int) -> bool:
+    for key, expected in where.items():
+        if key == "or":
+            if not any(matches(branch, i) for branch in expected):
+                return False
+            continue
+        if key == "and":
+            if not all(matches(branch, i) for branch in expected):
+                return False
+            continue
+        field, operator = split_filter(key)
+        actual = coerce(field, field_value(field, i))
+        if operator in ("_in", "_not_in"):
+            found = actual in [coerce(field, value) for value in expected]
+            if found != (operator == "_in"):
+                return False
+            continue
+        expected = coerce(field, expected)
+        if not {
+            "": lambda: actual == expected,
+            "_not": lambda: actual != expected,
+            "_gt": lambda: actual > expected,
+            "_gte": lambda: actual >= expected,
+            "_lt": lambda: actual < expected,
+            "_lte": lambda: actual <= expected,
+        }[operator]():
+            return False
+    return True
+
+
+def first_index(field: str, value: Any, count: int, strict: bool) -> int:
+    """Return the first row index whose `field` is >= (or >, if `strict`) `value`."""
+    value = coerce(field, value)
+    low, high = 0, count
+    while low < high:
+        middle = (low + high) // 2
+        actual = coerce(field, field_value(field, middle))
+        if actual > value or (actual == value and not strict):
+            high = middle
+        else:
+            low = middle + 1
+    return low
+
+
+def index_range(where: dict, count: int) -> Tuple[int, int]:
+    """Narrow the rows to scan using the filters on ordered fields."""
+    low, high = 0, count
+    for key, value in where.items():
+        if key == "or":
+            ranges = [index_range(branch, count) for branch in value]
+            low = max(low, min(start for start, _ in ranges))
+            high = min(high, max(end for _, end in ranges))
+            continue
+        if key == "and":
+            for branch in value:
+                start, end = index_range(branch, count)
+                low, high = max(low, start), min(high, end)
+            continue
+        field, operator = split_filter(key)
+        if field not in ORDERED_FIELDS or value is None:
+            continue
+        if operator in ("", "_gte"):
+            low = max(low, first_index(field, value, count, strict=False))
+        if operator == "_gt":
+            low = max(low, first_index(field, value, count, strict=True))
+        if operator in ("", "_lte"):
+            high = min(high, first_index(field, value, count, strict=True))
+        if operator == "_lt":
+            high = min(high, first_index(field, value, count, strict=False))
+    return low, high
+
+
+# -- Server -------------------------------------------------------------------
+
+
+class QuietServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # Clients dropping keep-alive connections is normal
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+
+class MockGraphNode:
+    """A threaded HTTP server answering the tap's GraphQL and POAP requests.
+
+    `rows` is the size of every entity, `entity_rows` overrides it per entity.
+    Each request waits `latency` seconds plus `latency_per_row` per returned
+    row. A share `error_rate` of requests fail with HTTP 503, a share
+    `graphql_error_rate` answer with GraphQL errors and a share
+    `truncate_rate` of responses drop the connection halfway through the body.
+    """
+
+    def __init__(
+        self,
+        rows: int = 1000,
+        entity_rows: Optional[Dict[str, int]] = None,
+        latency: float = 0.0,
+        latency_per_row: float = 0.0,
+        error_rate: float = 0.0,
+        graphql_error_rate: float = 0.0,
+        truncate_rate: float = 0.0,
+        seed: int = 0,
+        host: str = "127.0.0.1",
+        port: int = 0,
+    ):
+        self.rows = rows
+        self.entity_rows = entity_rows or {}
+        self.latency = latency
+        self.latency_per_row = latency_per_row
+        self.error_rate = error_rate
+        self.graphql_error_rate = graphql_error_rate
+        self.truncate_rate = truncate_rate
+        self.random = random.Random(seed)
+        self.requests = 0
+        self.rows_served = 0
+        self._lock = threading.Lock()
+        self.address = (host, port)
+        self.server: Optional[QuietServer] = None
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        if self.server is None:
+            raise RuntimeError("The mock graph-node is not started")
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def head_block(self) -> int:
+        return BASE_BLOCK + max([self.rows, *self.entity_rows.values()]) - 1
+
+    def count(self, entity: str) -> int:
+        return self.entity_rows.get(entity, self.rows)
+
+    def config(self, **extra) -> dict:
+        """Return a tap config with every URL setting pointing at this server."""
+        from tap_decentraland_thegraph.tap import TapDecentralandTheGraph
+
+        config = {
+            name: f"{self.url}/{name}"
+            for name in TapDecentralandTheGraph.config_jsonschema["properties"]
+            if name.endswith("_url")
+        }
+        config.update(extra)
+        return config
+
+    def start(self) -> "MockGraphNode":
+        self.server = QuietServer(self.address, self._handler())
+        self._thread = threading.Thread(
+            target=self.server.serve_forever, name="mock-graph-node", daemon=True
+        )
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self) -> "MockGraphNode":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+    def roll(self, rate: float) -> bool:
+        with self._lock:
+            return rate > 0 and self.random.random() < rate
+
+    # GraphQL
+
+    def execute(self, query: str, variables: dict) -> Tuple[dict, int]:
+        """Run a query document, returning the response body and its row count."""
+        if self.roll(self.graphql_error_rate):
+            return {"errors": [{"message": "Injected error"}]}, 0
+        try:
+            tree = Parser(query, variables or {}).document()
+            data = {}
+            served = 0
+            for name, (field, arguments, sub) in tree.items():
+                if field == "_meta":
+                    data[name] = self.meta(sub)
+                    continue
+                if field not in ENTITIES:
+                    raise GraphQLError(f"Type `Query` has no field `{field}`")
+                data[name] = self.query_entity(field, arguments, sub or {})
+                served += len(data[name])
+        except GraphQLError as err:
+            return {"errors": [{"message": str(err)}]}, 0
+        return {"data": data}, served
+
+    def meta(self, sub: Optional[dict]) -> dict:
+        meta = {
+            "block": {"number": self.head_block, "hash": "0x%064x" % self.head_block},
+            "deployment": "mock",
+        }
+        return project_meta(meta, sub)
+
+    def query_entity(self, entity: str, arguments: dict, tree: dict) -> List[dict]:
+        first = arguments.get("first", 100)
+        skip = arguments.get("skip", 0)
+        if not 0 <= first <= MAX_FIRST:
+            raise GraphQLError(
+                f"The `first` argument must be between 0 and {MAX_FIRST}, "
+                f"but is {first}"
+            )
+        if not 0 <= skip <= MAX_SKIP:
+            raise GraphQLError(
+                f"The `skip` argument must be between 0 and {MAX_SKIP}, but is {skip}"
+            )
+
+        count = self.count(entity)
+        block = (arguments.get("block") or {}).get("number")
+        if block is not None:
+            if block > self.head_block:
+                raise GraphQLError(f"block #{block} not yet indexed")
+            # Rows created after the block do not exist yet
+            count = min(count, block - BASE_BLOCK + 1)
+
+        where = arguments.get("where") or {}
+        low, high = index_range(where, count)
+        indexes = range(low, high)
+        if arguments.get("orderDirection") == "desc":
+            indexes = reversed(indexes)
+
+        rows = []
+        skipped = 0
+        for i in indexes:
+            if len(rows) >= first:
+                break
+            if not matches(where, i):
+                continue
+            if skipped < skip:
+                skipped += 1
+                continue
+            rows.append(project(tree, i))
+        return rows
+
+    # POAP REST API
+
+    def paginated_events(self, params: dict) -> dict:
+        limit = int(params.get("limit", ["100"])[0])
+        from_date = datetime.strptime(
+            params.get("from_date", ["2000-01-01T00:00:00z"])[0][:10], "%Y-%m-%d"
+        )
+        start = max(0, (from_date - datetime(2000, 1, 1)).days)
+        count = self.count("poaps")
+        items = []
+        for i in range(start, min(count, start + limit)):
+            day = datetime(2000, 1, 1) + timedelta(days=i)
+            items.append({
+                "id": i,
+                "fancy_id": f"event-{i}",
+                "name": f"Event {i}",
+                "event_url": f"https://example.com/{i}",
+                "image_url": f"https://example.com/{i}.png",
+                "country": "",
+                "city": "",
+                "description": f"Description {i}",
+                "year": day.year,
+                "start_date": day.strftime("%d-%b-%Y"),
+                "end_date": day.strftime("%d-%b-%Y"),
+                "expiry_date": day.strftime("%d-%b-%Y"),
+                "from_admin": False,
+                "virtual_event": i % 2 == 0,
+                "event_template_id": i % 7,
+                "event_host_id": i % 11,
+                "private_event": False,
+            })
+        return {"items": items, "total": count, "offset": start, "limit": limit}
+
+    def _handler(self):
+        node = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            # Headers and body are separate writes, don't let them wait for an ACK
+            disable_nagle_algorithm = True
+
+            def respond(self, status: int, body: dict, rows: int = 0) -> None:
+                delay = node.latency + node.latency_per_row * rows
+                if delay:
+                    time.sleep(delay)
+                content = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                if "gzip" in self.headers.get("Accept-Encoding", ""):
+                    content = gzip.compress(content, compresslevel=1)
+                    self.send_header("Content-Encoding", "gzip")
+                self.send_header("Content-Length", str(len(content)))
+                self.end_headers()
+                if status == 200 and node.roll(node.truncate_rate):
+                    self.wfile.write(content[:len(content) // 2])
+                    self.close_connection = True
+                    return
+                self.wfile.write(content)
+
+            def fail(self) -> bool:
+                with node._lock:
+                    node.requests += 1
+                if node.roll(node.error_rate):
+                    self.respond(503, {"error": "Injected failure"})
+                    return True
+                return False
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                if self.fail():
+                    return
+                try:
+                    payload = json.loads(body)
+                except ValueError:
+                    self.respond(400, {"errors": [{"message": "Invalid JSON body"}]})
+                    return
+                result, rows = node.execute(
+                    payload.get("query", ""), payload.get("variables") or {}
+                )
+                with node._lock:
+                    node.rows_served += rows
+                self.respond(200, result, rows)
+
+            def do_GET(self):
+                if self.fail():
+                    return
+                parts = urlsplit(self.path)
+                if not parts.path.endswith("/paginated-events"):
+                    self.respond(404, {"error": "Not found"})
+                    return
+                result = node.paginated_events(parse_qs(parts.query))
+                self.respond(200, result, len(result["items"]))
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+
+def project_meta(value: Any, sub: Optional[dict]) -> Any:
+    if sub is None or not isinstance(value, dict):
+        return value
+    return {
+        name: project_meta(value.get(field), inner)
+        for name, (field, _, inner) in sub.items()
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Serve a mock graph-node for tap-decentraland-thegraph"
+    )
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--rows", type=int, default=10000, help="rows per entity")
+    parser.add_argument(
+        "--latency", type=float, default=0.0, help="seconds added to every request"
+    )
+    parser.add_argument(
+        "--latency-per-row",
+        type=float,
+        default=0.0,
+        help="seconds added per returned row",
+    )
+    parser.add_argument(
+        "--error-rate",
+        type=float,
+        default=0.0,
+        help="share of requests failing with HTTP 503",
+    )
+    parser.add_argument(
+        "--graphql-error-rate",
+        type=float,
+        default=0.0,
+        help="share of requests answered with GraphQL errors",
+    )
+    parser.add_argument(
+        "--truncate-rate", type=float, default=0.0, help="share of responses cut short"
+    )
+    args = parser.parse_args()
+
+    node = MockGraphNode(
+        rows=args.rows,
+        latency=args.latency,
+        latency_per_row=args.latency_per_row,
+        error_rate=args.error_rate,
+        graphql_error_rate=args.graphql_error_rate,
+        truncate_rate=args.truncate_rate,
+        host=args.host,
+        port=args.port,
+    )
+    node.start()
+    # One line, so a parent process can read it before the server exits
+    print(json.dumps(node.config()), flush=True)
+    try:
+        node._thread.join()
+    except KeyboardInterrupt:
+        node.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,9 @@
 """Stream type classes for tap-decentraland-thegraph."""
 
-from pathlib import Path
-from typing import Any, Dict, Optional, Union, List, Iterable
-
 from singer_sdk import typing as th  # JSON Schema typing helpers
 
 from tap_decentraland_thegraph.client import DecentralandTheGraphPolygonStream
+from tap_decentraland_thegraph.transforms import RowId
 
 
 class MintsPolygonStream(DecentralandTheGraphPolygonStream):
@@ -54,10 +52,7 @@ class MintsPolygonStream(DecentralandTheGraphPolygonStream):
 
     """
 
-    def post_process(self, row: dict, context: Optional[dict] = None) -> dict:
-        """Generate row id"""
-        row['rowId'] = "|".join([row['id'],row['timestamp']])
-        return row
+    transforms = [RowId("id", "timestamp")]
 
     schema = th.PropertiesList(
         th.Property("rowId", th.StringType, required=True),
@@ -1,11 +1,41 @@
 """Stream type classes for tap-decentraland-thegraph."""
 
-from pathlib import Path
-from typing import Any, Dict, Optional, Union, List, Iterable
-
 from singer_sdk import typing as th  # JSON Schema typing helpers
 
 from tap_decentraland_thegraph.client import DecentralandTheGraphStream
+from tap_decentraland_thegraph.transforms import (
+    Apply,
+    BodyShapes,
+    Call,
+    EscapeBackslashes,
+    IntOrNone,
+    JoinParcels,
+    RowId,
+)
+
+def flatten_item_metadata(row: dict) -> None:
+    """Move the wearable or emote metadata of an item up into the row."""
+    metadata = row['metadata']
+    for kind in ('wearable', 'emote'):
+        asset = metadata.get(kind)
+        if asset is None:
+            continue
+        bodyShapes = asset['bodyShapes']
+
+        row['category'] = asset['category']
+        row['description'] = asset['description']
+        row['name'] = asset['name']
+        row['is_male_shape'] = 'BaseMale' in bodyShapes
+        row['is_female_shape'] = 'BaseFemale' in bodyShapes
+        if kind == 'emote':
+            row['hasGeometry'] = asset['hasGeometry']
+            row['hasSound'] = asset['hasSound']
+            row['loop'] = asset['loop']
+        else:
+            row['hasGeometry'] = False
+            row['hasSound'] = False
+            row['loop'] = False
+        del metadata[kind]
 
 
 class WearablesStream(DecentralandTheGraphStream):
@@ -16,6 +46,7 @@ class WearablesStream(DecentralandTheGraphStream):
     replication_method = "INCREMENTAL"
     is_sorted = True
     object_returned = 'nfts'
+    shared_source = 'nfts'
 
     query = """
     query ($updatedAt: Int!)
@@ -53,16 +84,10 @@ class WearablesStream(DecentralandTheGraphStream):
 
     """
 
-    def post_process(self, row: dict, context: Optional[dict] = None) -> dict:
-        """Convert body shape variables"""
-        bodyShapes = row['wearable']['bodyShapes']
-        row['wearable']['bodyShapeMale'] = 'BaseMale' in bodyShapes
-        row['wearable']['bodyShapeFemale'] = 'BaseFemale' in bodyShapes
-        del row['wearable']['bodyShapes']
-
-        """Generate row id"""
-        row['rowId'] = "|".join([row['id'], row['updatedAt']])
-        return row
+    transforms = [
+        BodyShapes("wearable"),
+        RowId("id", "updatedAt"),
+    ]
 
     schema = th.PropertiesList(
         th.Property("id", th.StringType, required=True),
@@ -97,6 +122,7 @@ class NamesStream(DecentralandTheGraphStream):
     replication_method = "INCREMENTAL"
     is_sorted = True
     object_returned = 'nfts'
+    shared_source = 'nfts'
 
     query = """
     query ($updatedAt: Int!)
@@ -131,10 +157,7 @@ class NamesStream(DecentralandTheGraphStream):
 
     """
 
-    def post_process(self, row: dict, context: Optional[dict] = None) -> dict:
-        """Generate row id"""
-        row['rowId'] = "|".join([row['id'], row['updatedAt']])
-        return row
+    transforms = [RowId("id", "updatedAt")]
 
     schema = th.PropertiesList(
         th.Property("id", th.StringType, required=True),
@@ -165,6 +188,7 @@ class ParcelsStream(DecentralandTheGraphStream):
     replication_method = "INCREMENTAL"
     is_sorted = True
     object_returned = 'nfts'
+    shared_source = 'nfts'
 
     query = """
     query ($updatedAt: Int!)
@@ -200,16 +224,11 @@ class ParcelsStream(DecentralandTheGraphStream):
 
     """
 
-    def post_process(self, row: dict, context: Optional[dict] = None) -> dict:
-        """Generate row id"""
-        row['rowId'] = "|".join([row['id'], row['updatedAt']])
-
-        """Convert to int"""
-        row['parcel']['x'] = int(row['parcel']['x'])
-        row['parcel']['y'] = int(row['parcel']['y'])
-        if 'name' in row and isinstance(row['name'], str):
-            row['name'] = row['name'].replace('\\', '\\\\')  # Escape backslashes
-        return row
+    transforms = [
+        RowId("id", "updatedAt"),
+        Apply(int, "parcel.x", "parcel.y"),
+        EscapeBackslashes("name"),
+    ]
 
     schema = th.PropertiesList(
         th.Property("id", th.StringType, required=True),
@@ -241,6 +260,7 @@ class EstatesStream(DecentralandTheGraphStream):
     replication_method = "INCREMENTAL"
     is_sorted = True
     object_returned = 'nfts'
+    shared_source = 'nfts'
 
     query = """
     query ($updatedAt: Int!)
@@ -276,20 +296,11 @@ class EstatesStream(DecentralandTheGraphStream):
 
     """
 
-    def post_process(self, row: dict, context: Optional[dict] = None) -> dict:
-        """Generate row id"""
-        row['rowId'] = "|".join([row['id'], row['updatedAt']])
-
-        """Convert to int"""
-        parcels = row['estate']['parcels']
-        if parcels:
-            converted = "|".join([f'{p["x"]},{p["y"]}' for p in parcels])
-        else:
-            converted = ''
-        row['estate']['parcels'] = converted
-        if 'name' in row and isinstance(row['name'], str):
-            row['name'] = row['name'].replace('\\', '\\\\')  # Escape backslashes
-        return row
+    transforms = [
+        RowId("id", "updatedAt"),
+        JoinParcels("estate.parcels"),
+        EscapeBackslashes("name"),
+    ]
 
     schema = th.PropertiesList(
         th.Property("id", th.StringType, required=True),
@@ -323,6 +334,7 @@ class ItemsStream(DecentralandTheGraphStream):
     replication_method = "INCREMENTAL"
     is_sorted = True
     object_returned = 'items'
+    shared_source = 'items'
 
     query = """
     query ($updatedAt: Int!)
@@ -362,17 +374,10 @@ class ItemsStream(DecentralandTheGraphStream):
 
     """
 
-    def post_process(self, row: dict, context: Optional[dict] = None) -> dict:
-        """Generate row id"""
-        row['rowId'] = "|".join([row['id'], row['updatedAt']])
-
-        # Convert ints
-        row['totalSupply'] = int(row['totalSupply'])
-        row['maxSupply'] = int(row['maxSupply'])
-        row['available'] = int(row['available'])
-        row['price'] = int(row['price'])
-
-        return row
+    transforms = [
+        RowId("id", "updatedAt"),
+        Apply(int, "totalSupply", "maxSupply", "available", "price"),
+    ]
 
     schema = th.PropertiesList(
         th.Property("id", th.StringType, required=True),
@@ -448,10 +453,7 @@ class CollectionsEthereumStream(DecentralandTheGraphStream):
 
     """
 
-    def post_process(self, row: dict, context: Optional[dict] = None) -> dict:
-        """Generate row id"""
-        row['rowId'] = "|".join([row['id'], row['updatedAt']])
-        return row
+    transforms = [RowId("id", "updatedAt")]
 
     schema = th.PropertiesList(
         th.Property("id", th.StringType, required=True),
@@ -482,6 +484,7 @@ class ItemsUniqueStream(DecentralandTheGraphStream):
     replication_method = "INCREMENTAL"
     is_sorted = True
     object_returned = 'items'
+    shared_source = 'items'
 
     @property
     def url_base(self) -> str:
@@ -547,44 +550,11 @@ class ItemsUniqueStream(DecentralandTheGraphStream):
 
     """
 
-    def post_process(self, row: dict, context: Optional[dict] = None) -> dict:
-        # Convert ints
-        row['totalSupply'] = int(row['totalSupply'])
-        row['maxSupply'] = int(row['maxSupply'])
-        row['available'] = int(row['available'])
-
-        if len(row['price']) > 32:
-            row['price'] = None
-        else:
-            row['price'] = int(row['price'])
-
-        if 'wearable' in row['metadata'] and row['metadata']['wearable'] is not None:
-            bodyShapes = row['metadata']['wearable']['bodyShapes']
-
-            row['category'] = row['metadata']['wearable']['category']
-            row['description'] = row['metadata']['wearable']['description']
-            row['name'] = row['metadata']['wearable']['name']
-            row['is_male_shape'] = 'BaseMale' in bodyShapes
-            row['is_female_shape'] = 'BaseFemale' in bodyShapes
-            row['hasGeometry'] = False
-            row['hasSound'] = False
-            row['loop'] = False
-            del row['metadata']['wearable']
-
-        if 'emote' in row['metadata'] and row['metadata']['emote'] is not None:
-            bodyShapes = row['metadata']['emote']['bodyShapes']
-
-            row['category'] = row['metadata']['emote']['category']
-            row['description'] = row['metadata']['emote']['description']
-            row['name'] = row['metadata']['emote']['name']
-            row['is_male_shape'] = 'BaseMale' in bodyShapes
-            row['is_female_shape'] = 'BaseFemale' in bodyShapes
-            row['hasGeometry'] = row['metadata']['emote']['hasGeometry']
-            row['hasSound'] = row['metadata']['emote']['hasSound']
-            row['loop'] = row['metadata']['emote']['loop']
-            del row['metadata']['emote']
-
-        return row
+    transforms = [
+        Apply(int, "totalSupply", "maxSupply", "available"),
+        IntOrNone("price"),
+        Call(flatten_item_metadata),
+    ]
 
     schema = th.PropertiesList(
         th.Property("id", th.StringType, required=True),
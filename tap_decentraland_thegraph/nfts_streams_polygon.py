@@ -1,14 +1,16 @@
 """Stream type classes for tap-decentraland-thegraph."""
 
-import requests
-import backoff
-from pathlib import Path
-from typing import Any, Dict, Optional, Union, List, Iterable
-
 from singer_sdk import typing as th  # JSON Schema typing helpers
 
 from tap_decentraland_thegraph.client import DecentralandTheGraphPolygonStream
-
+from tap_decentraland_thegraph.nfts_streams import flatten_item_metadata
+from tap_decentraland_thegraph.transforms import (
+    Apply,
+    BodyShapes,
+    Call,
+    IntOrNone,
+    RowId,
+)
 
 class WearablesPolygonStream(DecentralandTheGraphPolygonStream):
     name = "nfts_wearables_polygon"
@@ -68,29 +70,11 @@ class WearablesPolygonStream(DecentralandTheGraphPolygonStream):
 
     """
 
-    def post_process(self, row: dict, context: Optional[dict] = None) -> dict:
-        """Convert body shape variables"""
-        if 'wearable' in row['metadata'] and row['metadata']['wearable'] is not None:
-            if 'bodyShapes' in row['metadata']['wearable'] and row['metadata']['wearable']['bodyShapes'] is not None:
-                bodyShapes = row['metadata']['wearable']['bodyShapes']
-                row['metadata']['wearable']['bodyShapeMale'] = 'BaseMale' in bodyShapes
-                row['metadata']['wearable']['bodyShapeFemale'] = 'BaseFemale' in bodyShapes
-                del row['metadata']['wearable']['bodyShapes']
-        else:
-            row['metadata']['wearable'] = {}
-
-        if 'emote' in row['metadata'] and row['metadata']['emote'] is not None:
-            if 'bodyShapes' in row['metadata']['emote'] and row['metadata']['emote']['bodyShapes'] is not None:
-                bodyShapes = row['metadata']['emote']['bodyShapes']
-                row['metadata']['emote']['bodyShapeMale'] = 'BaseMale' in bodyShapes
-                row['metadata']['emote']['bodyShapeFemale'] = 'BaseFemale' in bodyShapes
-                del row['metadata']['emote']['bodyShapes']
-        else:
-            row['metadata']['emote'] = {}
-
-        """Generate row id"""
-        row['rowId'] = "|".join([row['id'], row['updatedAt']])
-        return row
+    transforms = [
+        BodyShapes("metadata.wearable", optional=True, fill_missing=True),
+        BodyShapes("metadata.emote", optional=True, fill_missing=True),
+        RowId("id", "updatedAt"),
+    ]
 
     schema = th.PropertiesList(
         th.Property("id", th.StringType, required=True),
@@ -173,11 +157,7 @@ class CollectionsPolygonStream(DecentralandTheGraphPolygonStream):
     }
     """
 
-    def post_process(self, row: dict, context: Optional[dict] = None) -> dict:
-        """Generate row id"""
-        row['rowId'] = "|".join([row['id'], row['updatedAt']])
-
-        return row
+    transforms = [RowId("id", "updatedAt")]
 
     schema = th.PropertiesList(
         th.Property("id", th.StringType, required=True),
@@ -209,6 +189,7 @@ class ItemsPolygonStream(DecentralandTheGraphPolygonStream):
     replication_method = "INCREMENTAL"
     is_sorted = True
     object_returned = 'items'
+    shared_source = 'items'
 
     query = """
     query ($updatedAt: Int!)
@@ -248,23 +229,12 @@ class ItemsPolygonStream(DecentralandTheGraphPolygonStream):
 
     """
 
-    def post_process(self, row: dict, context: Optional[dict] = None) -> dict:
-        """Generate row id"""
-        row['rowId'] = "|".join([row['id'], row['updatedAt']])
-
-        # Convert ints
-        row['totalSupply'] = int(row['totalSupply'])
-        row['maxSupply'] = int(row['maxSupply'])
-        row['available'] = int(row['available'])
-
-        # If Price is a long number null the value
-        # so it doesn't crash when inserting
-        if len(row['price']) > 32:
-            row['price'] = None
-        else:
-            row['price'] = int(row['price'])
-
-        return row
+    transforms = [
+        RowId("id", "updatedAt"),
+        Apply(int, "totalSupply", "maxSupply", "available"),
+        # Long prices are nulled so they don't crash when inserting
+        IntOrNone("price"),
+    ]
 
     schema = th.PropertiesList(
         th.Property("id", th.StringType, required=True),
@@ -300,6 +270,7 @@ class ItemsPolygonUniqueStream(DecentralandTheGraphPolygonStream):
     replication_method = "INCREMENTAL"
     is_sorted = True
     object_returned = 'items'
+    shared_source = 'items'
 
     query = """
         query ($updatedAt: Int!) 
@@ -360,44 +331,11 @@ class ItemsPolygonUniqueStream(DecentralandTheGraphPolygonStream):
 
     """
 
-    def post_process(self, row: dict, context: Optional[dict] = None) -> dict:
-        # Convert ints
-        row['totalSupply'] = int(row['totalSupply'])
-        row['maxSupply'] = int(row['maxSupply'])
-        row['available'] = int(row['available'])
-
-        if len(row['price']) > 32:
-            row['price'] = None
-        else:
-            row['price'] = int(row['price'])
-
-        if 'wearable' in row['metadata'] and row['metadata']['wearable'] is not None:
-            bodyShapes = row['metadata']['wearable']['bodyShapes']
-
-            row['category'] = row['metadata']['wearable']['category']
-            row['description'] = row['metadata']['wearable']['description']
-            row['name'] = row['metadata']['wearable']['name']
-            row['is_male_shape'] = 'BaseMale' in bodyShapes
-            row['is_female_shape'] = 'BaseFemale' in bodyShapes
-            row['hasGeometry'] = False
-            row['hasSound'] = False
-            row['loop'] = False
-            del row['metadata']['wearable']
-
-        if 'emote' in row['metadata'] and row['metadata']['emote'] is not None:
-            bodyShapes = row['metadata']['emote']['bodyShapes']
-
-            row['category'] = row['metadata']['emote']['category']
-            row['description'] = row['metadata']['emote']['description']
-            row['name'] = row['metadata']['emote']['name']
-            row['is_male_shape'] = 'BaseMale' in bodyShapes
-            row['is_female_shape'] = 'BaseFemale' in bodyShapes
-            row['hasGeometry'] = row['metadata']['emote']['hasGeometry']
-            row['hasSound'] = row['metadata']['emote']['hasSound']
-            row['loop'] = row['metadata']['emote']['loop']
-            del row['metadata']['emote']
-
-        return row
+    transforms = [
+        Apply(int, "totalSupply", "maxSupply", "available"),
+        IntOrNone("price"),
+        Call(flatten_item_metadata),
+    ]
 
     schema = th.PropertiesList(
         th.Property("id", th.StringType, required=True),
@@ -1,13 +1,17 @@
 """Stream type classes for tap-decentraland-thegraph."""
 
-from pathlib import Path
-from typing import Any, Dict, Optional, Union, List, Iterable
+from typing import Optional
 
 from singer_sdk import typing as th  # JSON Schema typing helpers
 
 from tap_decentraland_thegraph.client import DecentralandTheGraphStream
-
-
+from tap_decentraland_thegraph.transforms import (
+    Apply,
+    BodyShapes,
+    FromContext,
+    JoinParcels,
+    RowId,
+)
 
 class WearablesOrdersStream(DecentralandTheGraphStream):
     name = "orders_wearables"
@@ -56,17 +60,7 @@ class WearablesOrdersStream(DecentralandTheGraphStream):
         }
     """
 
-    def post_process(self, row: dict, context: Optional[dict] = None) -> dict:
-        """As needed, append or transform raw data to match expected structure."""
-        if 'nft' in row:
-            if 'metadata' in row['nft']:
-                if 'wearable' in row['nft']['metadata']:
-                    if 'bodyShapes' in row['nft']['metadata']['wearable']:
-                        bodyShapes = row['nft']['metadata']['wearable']['bodyShapes']
-                        row['nft']['metadata']['wearable']['bodyShapeMale'] = 'BaseMale' in bodyShapes
-                        row['nft']['metadata']['wearable']['bodyShapeFemale'] = 'BaseFemale' in bodyShapes
-                        del row['nft']['metadata']['wearable']['bodyShapes']
-        return row
+    transforms = [BodyShapes("nft.wearable", optional=True)]
 
     
     schema = th.PropertiesList(
@@ -139,11 +133,7 @@ class ParcelsOrdersStream(DecentralandTheGraphStream):
         }
     """
 
-    def post_process(self, row: dict, context: Optional[dict] = None) -> dict:
-        """Convert x/y to integers"""
-        row['nft']['parcel']['x'] = int(row['nft']['parcel']['x'])
-        row['nft']['parcel']['y'] = int(row['nft']['parcel']['y'])
-        return row
+    transforms = [Apply(int, "nft.parcel.x", "nft.parcel.y")]
     
     schema = th.PropertiesList(
         th.Property("id", th.StringType, required=True),
@@ -240,6 +230,7 @@ class EstatesHistoricalStream(DecentralandTheGraphStream):
     object_returned = 'estates'
     dedupe = False
     onlyonerow = True
+    batch_lookups = True
     
     query = """
     query ($estateId: ID!, $blockNumber: Int!)
@@ -278,17 +269,11 @@ class EstatesHistoricalStream(DecentralandTheGraphStream):
 
         return self.latest_timestamp
 
-    def post_process(self, row: dict, context: Optional[dict] = None) -> dict:
-        """Convert parcels into psv and adds block number"""
-        parcels = row['parcels']
-        if parcels:
-            converted = "|".join([f'{p["x"]},{p["y"]}' for p in parcels])
-        else:
-            converted = ''
-        row['parcels'] = converted
-        row['blockNumber'] = context['blockNumber']
-        row['rowId'] = "|".join([row['id'],row['blockNumber']])
-        return row
+    transforms = [
+        JoinParcels("parcels"),
+        FromContext("blockNumber"),
+        RowId("id", "blockNumber"),
+    ]
     
     schema = th.PropertiesList(
         th.Property("rowId", th.StringType, required=True),
@@ -1,11 +1,9 @@
 """Stream type classes for tap-decentraland-thegraph."""
 
-from pathlib import Path
-from typing import Any, Dict, Optional, Union, List, Iterable
-
 from singer_sdk import typing as th  # JSON Schema typing helpers
 
 from tap_decentraland_thegraph.client import DecentralandTheGraphPolygonStream
+from tap_decentraland_thegraph.transforms import Apply, BodyShapes
 
 
 class WearablesOrdersPolygonStream(DecentralandTheGraphPolygonStream):
@@ -67,26 +65,10 @@ class WearablesOrdersPolygonStream(DecentralandTheGraphPolygonStream):
         }
     """
 
-    def post_process(self, row: dict, context: Optional[dict] = None) -> dict:
-        """As needed, append or transform raw data to match expected structure."""
-        if 'wearable' in row['nft']['metadata'] and row['nft']['metadata']['wearable'] is not None:
-            if 'bodyShapes' in row['nft']['metadata']['wearable'] and row['nft']['metadata']['wearable']['bodyShapes'] is not None:
-                bodyShapes = row['nft']['metadata']['wearable']['bodyShapes']
-                row['nft']['metadata']['wearable']['bodyShapeMale'] = 'BaseMale' in bodyShapes
-                row['nft']['metadata']['wearable']['bodyShapeFemale'] = 'BaseFemale' in bodyShapes
-                del row['nft']['metadata']['wearable']['bodyShapes']
-        else:
-            row['nft']['metadata']['wearable'] = {}
-        
-        if 'emote' in row['nft']['metadata'] and row['nft']['metadata']['emote'] is not None:
-            if 'bodyShapes' in row['nft']['metadata']['emote'] and row['nft']['metadata']['emote']['bodyShapes'] is not None:
-                bodyShapes = row['nft']['metadata']['emote']['bodyShapes']
-                row['nft']['metadata']['emote']['bodyShapeMale'] = 'BaseMale' in bodyShapes
-                row['nft']['metadata']['emote']['bodyShapeFemale'] = 'BaseFemale' in bodyShapes
-                del row['nft']['metadata']['emote']['bodyShapes']
-        else:
-            row['nft']['metadata']['emote'] = {}
-        return row
+    transforms = [
+        BodyShapes("nft.metadata.wearable", optional=True, fill_missing=True),
+        BodyShapes("nft.metadata.emote", optional=True, fill_missing=True),
+    ]
 
     
     schema = th.PropertiesList(
@@ -177,20 +159,8 @@ class WearablesPrimarySalesPolygonStream(DecentralandTheGraphPolygonStream):
         }
     """
 
-    def post_process(self, row: dict, context: Optional[dict] = None) -> dict:
-        """As needed, append or transform raw data to match expected structure."""
-        row['searchIssuedId'] = int(row['searchIssuedId'])
-        return row
-
-    
-    def get_url_params(self, partition, next_page_token: Optional[th.IntegerType] = None) -> dict:
-        next_page_token = next_page_token or self.get_starting_timestamp(partition)
-        self.logger.info(f'(stream: {self.name}) Next page:{next_page_token}')
+    transforms = [Apply(int, "searchIssuedId")]
 
-        return {
-            "timestamp": int(next_page_token),
-        }
-    
     schema = th.PropertiesList(
         th.Property("id", th.StringType, required=True),
         th.Property("beneficiary", th.StringType),
@@ -0,0 +1,79 @@
+"""Adaptive page size (`first`) for GraphQL streams.
+
+Wide entities can time out graph-node at 1000 rows a page, while narrow ones
+could fetch more per round trip on nodes that allow it. A `PageSizeController`
+tunes one stream's page size between `minimum` and `maximum` by hill climbing
+on records per second, and backs off on slow, oversized or timed out pages.
+"""
+
+import threading
+from typing import Optional
+
+# Relative change of the page size per adjustment
+STEP = 1.25
+# Throughput changes smaller than this are treated as noise
+TOLERANCE = 0.05
+# Pages fetched at the best known size before probing a neighbour again
+HOLD_PAGES = 10
+
+
+class PageSizeController:
+    """Pick the page size of one stream from the pages it has already fetched."""
+
+    def __init__(
+        self,
+        minimum: int = 100,
+        maximum: int = 1000,
+        target_seconds: float = 10.0,
+        max_bytes: int = 16 * 2**20,
+    ):
+        self.minimum = minimum
+        self.maximum = maximum
+        self.target_seconds = target_seconds
+        self.max_bytes = max_bytes
+        self.size = maximum
+        self.direction = 1
+        self.last_throughput: Optional[float] = None
+        self.hold = 0
+        self._lock = threading.Lock()
+
+    def _resize(self, size: float) -> None:
+        self.size = max(self.minimum, min(self.maximum, int(round(size))))
+
+    def observe(self, size: int, rows: int, seconds: float, nbytes: int) -> None:
+        """Record a page of `rows` requested with `first: size`."""
+        if rows < size or seconds <= 0:
+            # The last page of a scan says nothing about the page size
+            return
+        with self._lock:
+            if seconds > self.target_seconds or nbytes > self.max_bytes:
+                self.direction = -1
+                self.last_throughput = None
+                self._resize(size / STEP)
+                return
+            throughput = rows / seconds
+            if self.hold:
+                self.hold -= 1
+                self.last_throughput = throughput
+                return
+            if (
+                self.last_throughput is not None
+                and throughput < self.last_throughput * (1 - TOLERANCE)
+            ):
+                # The last move made things worse, go back and stay there a while
+                self.direction = -self.direction
+                self.hold = HOLD_PAGES
+            self.last_throughput = throughput
+            self._resize(size * STEP ** self.direction)
+            if self.size == size:
+                # Pinned at a bound, probe the other side later
+                self.direction = -self.direction
+                self.hold = HOLD_PAGES
+
+    def timed_out(self, size: int) -> None:
+        """Halve the page size after a request for `first: size` timed out."""
+        with self._lock:
+            self.direction = -1
+            self.last_throughput = None
+            self.hold = 0
+            self._resize(min(self.size, size / 2))
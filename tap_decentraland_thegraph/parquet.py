@@ -0,0 +1,228 @@
+"""Parquet batch files, typed columns compiled from each stream's schema.
+
+With `batch_output_format` set to `parquet` the batch files of
+`batch_output_path` are Parquet instead of gzipped JSONL. Nested objects are
+flattened into columns named by their path joined with `__`, e.g.
+`nft__wearable__rarity`, arrays of strings are list columns, and the BigInt
+amounts graph-node returns as strings (prices, MANA, supplies, ...) are
+integer decimal columns of `batch_output_decimal_precision` digits, 38 by
+default and stored as decimal256 past that, so they load as exact numbers.
+
+No value is ever dropped: in a file with values that don't fit a column, the
+column is widened instead, decimals to 76 digits and anything else, or
+decimals still too long, to strings, with a warning. Requires pyarrow,
+install the `parquet` extra.
+"""
+
+import logging
+import os
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from tap_decentraland_thegraph import codec
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:  # Optional dependency, install the `parquet` extra
+    pyarrow = None
+
+# BigInt fields, at any depth, written as decimals whatever their schema type
+DECIMAL_FIELDS = frozenset([
+    "available",
+    "creationFee",
+    "earned",
+    "feesCollectorCut",
+    "mana",
+    "maxSupply",
+    "price",
+    "pricePerDay",
+    "royaltiesCut",
+    "searchPrimarySalePrice",
+    "spent",
+    "totalSupply",
+    "volume",
+])
+# Codec of the column chunks, well supported by warehouses and smaller than snappy
+COMPRESSION = "zstd"
+# Separator of the path of flattened columns
+SEPARATOR = "__"
+# Widest decimal Arrow has, the first fallback of narrower decimal columns
+MAX_DECIMAL_PRECISION = 76
+
+# Raised by pyarrow, and by `convert`, for values that don't fit a column
+CONVERSION_ERRORS = (TypeError, ValueError, OverflowError)
+
+Path = Tuple[str, ...]
+
+
+def schema_types(schema: dict) -> List[str]:
+    types = schema.get("type", [])
+    return [types] if isinstance(types, str) else list(types)
+
+
+class Column:
+    """A column of the batch files of a stream, and how values are converted to it."""
+
+    def __init__(
+        self,
+        path: Path,
+        arrow_type: Any,
+        convert: Optional[Callable[[Any], Any]] = None,
+        fallback: Optional["Column"] = None,
+    ):
+        self.path = path
+        self.name = SEPARATOR.join(path)
+        self.arrow_type = arrow_type
+        # Applied to the values when the column can't be built from them as they are
+        self.convert = convert
+        # Wider column used for files with values that don't fit this one,
+        # strings by default, which hold anything
+        if fallback is None and arrow_type != pyarrow.string():
+            fallback = Column(path, pyarrow.string(), json_string)
+        self.fallback = fallback
+
+    def array(self, values: List[Any]) -> Any:
+        """Return the array of `values`, of this column's type or of its fallback's."""
+        try:
+            return pyarrow.array(values, self.arrow_type)
+        except CONVERSION_ERRORS:
+            if self.convert is None and self.fallback is None:
+                raise
+        if self.convert is not None:
+            try:
+                return pyarrow.array(
+                    [
+                        None if value is None else self.convert(value)
+                        for value in values
+                    ],
+                    self.arrow_type,
+                )
+            except CONVERSION_ERRORS:
+                if self.fallback is None:
+                    raise
+        return self.fallback.array(values)
+
+
+def decimal_column(path: Path, precision: int) -> Column:
+    if precision > 38:
+        column = Column(path, pyarrow.decimal256(precision, 0), int)
+    else:
+        column = Column(path, pyarrow.decimal128(precision, 0), int)
+    if precision < MAX_DECIMAL_PRECISION:
+        column.fallback = decimal_column(path, MAX_DECIMAL_PRECISION)
+    return column
+
+
+def json_string(value: Any) -> str:
+    return value if isinstance(value, str) else codec.dumps(value)
+
+
+class Layout:
+    """The columns of a stream's batch files, compiled once from its schema."""
+
+    def __init__(self, schema: dict, decimal_precision: int = 38):
+        self.decimal_precision = decimal_precision
+        self.columns: List[Column] = []
+        self.add_columns(schema, ())
+        self.schema = pyarrow.schema(
+            [(column.name, column.arrow_type) for column in self.columns]
+        )
+
+    def add_columns(self, schema: dict, parent: Path) -> None:
+        for key, property_schema in schema.get("properties", {}).items():
+            path = parent + (key,)
+            types = schema_types(property_schema)
+            if "object" in types and property_schema.get("properties"):
+                self.add_columns(property_schema, path)
+            elif key in DECIMAL_FIELDS and ("string" in types or "integer" in types):
+                self.columns.append(decimal_column(path, self.decimal_precision))
+            elif "array" in types:
+                items = schema_types(property_schema.get("items", {}))
+                if items and set(items) <= {"string", "null"}:
+                    self.columns.append(Column(path, pyarrow.list_(pyarrow.string())))
+                else:
+                    self.columns.append(Column(path, pyarrow.string(), json_string))
+            elif "string" in types:
+                self.columns.append(Column(path, pyarrow.string(), json_string))
+            elif "integer" in types:
+                self.columns.append(Column(path, pyarrow.int64(), int))
+            elif "number" in types:
+                self.columns.append(Column(path, pyarrow.float64(), float))
+            elif "boolean" in types:
+                self.columns.append(Column(path, pyarrow.bool_()))
+            else:
+                # Objects without properties and anything else, as JSON
+                self.columns.append(Column(path, pyarrow.string(), json_string))
+
+    def table(self, records: List[dict]) -> Tuple[Any, Dict[str, Any]]:
+        """Return the table of `records`, and each column's type widened to fit them."""
+        # The values of each nested object, looked up once for all its columns
+        parents: Dict[Path, List[Optional[dict]]] = {(): records}
+        arrays, widened = [], {}
+        for column in self.columns:
+            values = self.lookup(parents, column.path[:-1])
+            key = column.path[-1]
+            array = column.array(
+                [None if parent is None else parent.get(key) for parent in values]
+            )
+            arrays.append(array)
+            if array.type != column.arrow_type:
+                widened[column.name] = column.arrow_type
+        if not widened:
+            return pyarrow.Table.from_arrays(arrays, schema=self.schema), widened
+        return (
+            pyarrow.Table.from_arrays(
+                arrays, names=[column.name for column in self.columns]
+            ),
+            widened,
+        )
+
+    def lookup(
+        self, parents: Dict[Path, List[Optional[dict]]], path: Path
+    ) -> List[Optional[dict]]:
+        if path not in parents:
+            key = path[-1]
+            parents[path] = [
+                value if isinstance(value, dict) else None
+                for value in (
+                    None if parent is None else parent.get(key)
+                    for parent in self.lookup(parents, path[:-1])
+                )
+            ]
+        return parents[path]
+
+
+class ParquetBatchFile:
+    """A Parquet batch file, whose records are kept until it is closed."""
+
+    encoding = {"format": "parquet", "compression": COMPRESSION}
+    extension = "parquet"
+
+    def __init__(self, path: str, stream: str, layout: Layout, logger: logging.Logger):
+        self.path = path
+        self.stream = stream
+        self.layout = layout
+        self.logger = logger
+        self.records = 0
+        self._records: List[dict] = []
+
+    def write(self, record: dict) -> None:
+        self._records.append(record)
+        self.records += 1
+
+    def close(self) -> None:
+        """Write the file under a temporary name, fsync it and move it into place."""
+        table, widened = self.layout.table(self._records)
+        self._records = []
+        for column, arrow_type in widened.items():
+            self.logger.warn(
+                f"(stream: {self.stream}) Values of {column} don't fit {arrow_type}, "
+                f"written as {table.schema.field(column).type} "
+                f"in {os.path.basename(self.path)}"
+            )
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "wb") as raw:
+            pyarrow.parquet.write_table(table, raw, compression=COMPRESSION)
+            raw.flush()
+            os.fsync(raw.fileno())
+        os.replace(tmp_path, self.path)
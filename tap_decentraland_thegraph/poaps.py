@@ -2,13 +2,18 @@
 
 import requests
 from datetime import datetime
-from pathlib import Path
-from typing import Any, Dict, Optional, Union, List, Iterable
+from typing import Any, Dict, Optional
 
 from singer_sdk.helpers.jsonpath import extract_jsonpath
 from singer_sdk import typing as th  # JSON Schema typing helpers
 
 from tap_decentraland_thegraph.client import DecentralandTheGraphPolygonStream, BaseAPIStream
+from tap_decentraland_thegraph.transforms import Apply
+
+
+def start_timestamp(start_date: str) -> int:
+    """Convert a POAP start date like `01-Jan-2022` to a Unix timestamp."""
+    return int(datetime.strptime(start_date, '%d-%b-%Y').timestamp())
 
 
 class PoapsXdai(DecentralandTheGraphPolygonStream):
@@ -69,7 +74,7 @@ class PoapsMetadata(BaseAPIStream):
     is_sorted = True
     records_jsonpath: str = "$.items[*]"
     next_page_token_jsonpath: str = "$.items[-1:].start_date"
-    
+
     def get_next_page_token(
         self, response: requests.Response, previous_token: Optional[Any]
     ) -> Any:
@@ -95,19 +100,20 @@ class PoapsMetadata(BaseAPIStream):
         self.logger.info(f"Time: {next_timestamp}")
         return {"limit": self.RESULTS_PER_PAGE, "from_date": next_timestamp.strftime("%Y-%m-%dT%H:%M:%Sz"), "sort_field": "start_date", "sort_dir":"asc"}
 
-    def post_process(self, row: dict, context: Optional[dict] = None) -> dict:
-        """Add hash"""
-        row['id'] = str(row['id'])
-        row['fancy_id'] = str(row['fancy_id'])
-        row['year'] = str(row['year'])
-        row['event_host_id'] = str(row['event_host_id'])
-        row['event_template_id'] = str(row['event_template_id'])
-        row['from_admin'] = str(row['from_admin'])
-        row['virtual_event'] = str(row['virtual_event'])
-        row['private_event'] = str(row['private_event'])
-
-        row['start_date'] = int(datetime.strptime(row['start_date'], '%d-%b-%Y').timestamp())
-        return row
+    transforms = [
+        Apply(
+            str,
+            "id",
+            "fancy_id",
+            "year",
+            "event_host_id",
+            "event_template_id",
+            "from_admin",
+            "virtual_event",
+            "private_event",
+        ),
+        Apply(start_timestamp, "start_date"),
+    ]
 
     schema = th.PropertiesList(
         th.Property("id", th.StringType, required=True),
@@ -127,4 +133,4 @@ class PoapsMetadata(BaseAPIStream):
         th.Property("event_template_id", th.StringType),
         th.Property("event_host_id", th.StringType),
         th.Property("private_event", th.StringType),
-    ).to_dict()
\ No newline at end of file
+    ).to_dict()
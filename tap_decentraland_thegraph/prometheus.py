@@ -0,0 +1,266 @@
+"""Prometheus textfile exporter for tap runs.
+
+The tap runs from cron or Meltano, so there is no process to scrape. When
+`prometheus_textfile_path` is set, the tap's metrics are written to that file
+in the Prometheus text format every `prometheus_textfile_interval` seconds
+and once more at the end of the run, for node_exporter's textfile collector
+to pick up. Each write replaces the file atomically.
+
+Counters are totals of the current run, so they restart from zero with it.
+"""
+
+import os
+import threading
+import time
+from typing import Iterable, List, Optional, Tuple
+
+from tap_decentraland_thegraph import metrics, sessions
+
+PREFIX = "tap_decentraland_thegraph"
+
+# Stream totals exported as counters: (metric name, total, help)
+STREAM_COUNTERS = [
+    ("requests_total", "request_count", "HTTP requests sent, retries included"),
+    (
+        "request_retries_total",
+        "request_retries",
+        "Request attempts that failed and were retried",
+    ),
+    (
+        "backoff_seconds_total",
+        "backoff_duration",
+        "Seconds slept before retrying requests",
+    ),
+    ("bytes_received_total", "bytes_received", "Response body bytes parsed"),
+    ("parse_seconds_total", "parse_duration", "Seconds spent parsing responses"),
+    (
+        "post_process_seconds_total",
+        "post_process_duration",
+        "Seconds spent in post_process",
+    ),
+    ("records_total", "records_emitted", "Records emitted"),
+    ("duplicates_total", "duplicates_skipped", "Duplicate rows skipped"),
+    (
+        "invalid_records_total",
+        "records_invalid",
+        "Records that did not match the stream schema",
+    ),
+]
+# Endpoint statistics of the shared sessions: (metric name, stat, type, help)
+ENDPOINT_METRICS = [
+    (
+        "endpoint_requests_total",
+        "requests",
+        "counter",
+        "HTTP requests sent to the endpoint",
+    ),
+    (
+        "endpoint_wire_bytes_total",
+        "wire_bytes",
+        "counter",
+        "Bytes received from the endpoint, before decompression",
+    ),
+    (
+        "endpoint_decoded_bytes_total",
+        "decoded_bytes",
+        "counter",
+        "Bytes received from the endpoint, decompressed",
+    ),
+    (
+        "endpoint_connections",
+        "connections",
+        "gauge",
+        "Connections opened to the endpoint",
+    ),
+]
+
+
+def escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def labels(**values) -> str:
+    return (
+        "{"
+        + ",".join(f'{name}="{escape(value)}"' for name, value in values.items())
+        + "}"
+    )
+
+
+def number(value: float) -> str:
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class TextfileExporter:
+    """Write a tap's metrics to a Prometheus textfile, periodically and at the end."""
+
+    def __init__(self, tap, path: str, interval: float = 30):
+        self.tap = tap
+        self.path = path
+        self.interval = interval
+        self.started_at = time.time()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        self.write()
+        if self.interval > 0:
+            self._thread = threading.Thread(
+                target=self._run, name="prometheus-textfile", daemon=True
+            )
+            self._thread.start()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            try:
+                self.write()
+            except Exception as err:
+                # A full disk must not fail the sync
+                self.tap.logger.warn(f"Could not write {self.path}: {err}")
+
+    def stop(self, success: bool) -> None:
+        """Stop the periodic writes and write the final state of the run."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.write(success=success)
+
+    def write(self, success: Optional[bool] = None) -> None:
+        """Replace the textfile with the current metrics."""
+        text = self.render(success)
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as textfile:
+            textfile.write(text)
+        os.replace(tmp_path, self.path)
+
+    def render(self, success: Optional[bool] = None) -> str:
+        """Return the metrics in the Prometheus text format.
+
+        `success` is None while the run is still going.
+        """
+        now = time.time()
+        lines: List[str] = []
+
+        def family(
+            name: str, kind: str, help: str, samples: Iterable[Tuple[str, str, float]]
+        ) -> None:
+            samples = list(samples)
+            if not samples:
+                return
+            lines.append(f"# HELP {PREFIX}_{name} {help}")
+            lines.append(f"# TYPE {PREFIX}_{name} {kind}")
+            for suffix, label_text, value in samples:
+                lines.append(f"{PREFIX}_{name}{suffix}{label_text} {number(value)}")
+
+        family(
+            "run_start_timestamp_seconds",
+            "gauge",
+            "Unix time the run started",
+            [("", "", self.started_at)],
+        )
+        family(
+            "run_duration_seconds",
+            "gauge",
+            "Seconds the run has been going",
+            [("", "", round(now - self.started_at, 3))],
+        )
+        if success is not None:
+            family(
+                "run_success",
+                "gauge",
+                "1 if the last run succeeded",
+                [("", "", int(success))],
+            )
+        family(
+            "last_export_timestamp_seconds",
+            "gauge",
+            "Unix time of this export",
+            [("", "", now)],
+        )
+
+        streams = self.stream_snapshots()
+        for name, total, help in STREAM_COUNTERS:
+            family(
+                name,
+                "counter",
+                help,
+                [
+                    (
+                        "",
+                        labels(stream=stream.name, endpoint=endpoint),
+                        snapshot["totals"][total],
+                    )
+                    for stream, endpoint, snapshot in streams
+                ],
+            )
+        family("pages_total", "counter", "Pages of results fetched", [
+            ("", labels(stream=stream.name, endpoint=endpoint), snapshot["pages"])
+            for stream, endpoint, snapshot in streams
+        ])
+        family("request_duration_seconds", "histogram", "Latency of request attempts", [
+            sample
+            for stream, endpoint, snapshot in streams
+            for sample in self.histogram(stream.name, endpoint, snapshot)
+        ])
+        family(
+            "cursor_lag_seconds",
+            "gauge",
+            "Seconds the stream's bookmark is behind now",
+            [
+                ("", labels(stream=stream.name), lag)
+                for stream, _, _ in streams
+                for lag in [stream.cursor_lag()]
+                if lag is not None
+            ],
+        )
+
+        endpoints = sessions.get_registry().stats()
+        for name, stat, kind, help in ENDPOINT_METRICS:
+            family(name, kind, help, [
+                ("", labels(endpoint=endpoint), stats[stat])
+                for endpoint, stats in endpoints.items()
+                if stats[stat] is not None
+            ])
+        return "\n".join(lines) + "\n"
+
+    def stream_snapshots(self) -> List[Tuple[object, str, dict]]:
+        """Return (stream, endpoint, metrics snapshot) of the streams that did work."""
+        snapshots = []
+        for stream in self.tap.streams.values():
+            if not hasattr(stream, "stream_metrics"):
+                continue
+            snapshot = stream.stream_metrics.snapshot()
+            if (
+                snapshot["totals"]["request_count"]
+                or snapshot["totals"]["records_emitted"]
+            ):
+                snapshots.append((stream, stream.url_base, snapshot))
+        return snapshots
+
+    @staticmethod
+    def histogram(
+        stream: str, endpoint: str, snapshot: dict
+    ) -> List[Tuple[str, str, float]]:
+        counts: List[int] = snapshot["latency_counts"]
+        samples = []
+        cumulative = 0
+        for bound, count in zip([*metrics.LATENCY_BUCKETS, "+Inf"], counts):
+            cumulative += count
+            samples.append(
+                (
+                    "_bucket",
+                    labels(stream=stream, endpoint=endpoint, le=bound),
+                    cumulative,
+                )
+            )
+        samples.append(
+            (
+                "_sum",
+                labels(stream=stream, endpoint=endpoint),
+                round(snapshot["latency_sum"], 6),
+            )
+        )
+        samples.append(("_count", labels(stream=stream, endpoint=endpoint), cumulative))
+        return samples
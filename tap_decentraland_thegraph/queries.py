@@ -0,0 +1,236 @@
+"""GraphQL query text helpers for tap-decentraland-thegraph.
+
+Stream queries are hand-written strings, so cursor filters and extra variables
+are spliced into them here instead of rewriting every stream definition.
+"""
+
+import re
+from functools import lru_cache
+from typing import List, Optional, Tuple
+
+VARIABLES_RE = re.compile(r"query\s*\(([^)]*)\)")
+WHERE_RE = re.compile(r"where\s*:\s*\{([^{}]*)\}")
+FILTER_RE = re.compile(r"(\w+)\s*:\s*(\[[^\]]*\]|[^,\s]+)")
+# Only queries paging at graph-node's maximum get a variable page size
+PAGE_SIZE_RE = re.compile(r"first\s*:\s*1000\b")
+BLOCK_PINNED_RE = re.compile(r"block\s*:\s*\{\s*number\s*:")
+
+
+def parse_filters(where_body: str) -> List[Tuple[str, str]]:
+    """Return the `field: value` pairs of a flat `where` block."""
+    return FILTER_RE.findall(where_body)
+
+
+def render_filters(filters: List[Tuple[str, str]]) -> str:
+    """Render `field: value` pairs back into a `where` object."""
+    return "{" + ", ".join(f"{field}: {value}" for field, value in filters) + "}"
+
+
+@lru_cache(maxsize=None)
+def cursor_variable(query: str, replication_key: Optional[str]) -> Optional[str]:
+    """Return the variable bound to `<replication_key>_gte`, if the query has one."""
+    if not replication_key:
+        return None
+    where = WHERE_RE.search(query)
+    if not where:
+        return None
+    for field, value in parse_filters(where.group(1)):
+        if field == f"{replication_key}_gte" and value.startswith("$"):
+            return value[1:]
+    return None
+
+
+@lru_cache(maxsize=None)
+def add_variables(query: str, variables: Tuple[Tuple[str, str], ...]) -> str:
+    """Declare extra `(name, type)` variables in the query header."""
+    declared = ", ".join(f"${name}: {type_}" for name, type_ in variables)
+    match = VARIABLES_RE.search(query)
+    if match is None:
+        return re.sub(r"^\s*query", f"query ({declared})", query, count=1)
+    existing = match.group(1).strip()
+    declared = f"{existing}, {declared}" if existing else declared
+    return query[: match.start()] + f"query ({declared})" + query[match.end():]
+
+
+@lru_cache(maxsize=None)
+def composite_cursor_query(
+    query: str, replication_key: str, bounded: bool = False
+) -> str:
+    """Replace `<rk>_gte: $var` with a (replication key, id) tiebreak filter.
+
+    The rest of the `where` block is repeated inside each `or` branch, so the
+    page only returns rows strictly after `($var, $lastId)`. With `bounded`,
+    both branches also get `<rk>_lt: $windowEnd`.
+    """
+    variable = cursor_variable(query, replication_key)
+    if variable is None:
+        return query
+    where = WHERE_RE.search(query)
+    filters = [
+        (field, value)
+        for field, value in parse_filters(where.group(1))
+        if field != f"{replication_key}_gte"
+    ]
+    if bounded:
+        filters.append((f"{replication_key}_lt", "$windowEnd"))
+    newer = filters + [(f"{replication_key}_gt", f"${variable}")]
+    same_second = filters + [(replication_key, f"${variable}"), ("id_gt", "$lastId")]
+    cursor_where = "where: {or: [%s, %s]}" % (
+        render_filters(newer),
+        render_filters(same_second),
+    )
+    query = query[: where.start()] + cursor_where + query[where.end():]
+    variables = (("lastId", "ID!"),)
+    if bounded:
+        variables += (("windowEnd", "Int!"),)
+    return add_variables(query, variables)
+
+
+@lru_cache(maxsize=None)
+def page_size_query(query: str) -> str:
+    """Replace the entity's `first: 1000` with a `$first` variable."""
+    query, count = PAGE_SIZE_RE.subn("first: $first", query, count=1)
+    if not count:
+        return query
+    return add_variables(query, (("first", "Int!"),))
+
+
+def is_block_pinned(query: str) -> bool:
+    """Return True if the query reads the entity at a fixed block."""
+    return BLOCK_PINNED_RE.search(query) is not None
+
+
+@lru_cache(maxsize=None)
+def block_pinned_query(query: str) -> str:
+    """Read the entity at block `$runBlock`, unless the query already pins one."""
+    if is_block_pinned(query):
+        return query
+    match = VARIABLES_RE.search(query)
+    body = query.index("{", match.end() if match else 0) + 1
+    arguments = query.index("(", body) + 1
+    query = query[:arguments] + "block: {number: $runBlock}, " + query[arguments:]
+    return add_variables(query, (("runBlock", "Int!"),))
+
+
+def variable_definitions(query: str) -> List[Tuple[str, str]]:
+    """Return the declared `($name, Type)` pairs of a query."""
+    match = VARIABLES_RE.search(query)
+    if match is None:
+        return []
+    return [
+        (name, type_.strip())
+        for name, type_ in re.findall(r"\$(\w+)\s*:\s*([^,]+)", match.group(1))
+    ]
+
+
+def selection(query: str) -> str:
+    """Return the text inside the outermost `{ }` of a query."""
+    match = VARIABLES_RE.search(query)
+    start = query.index("{", match.end() if match else 0)
+    end = query.rindex("}")
+    return query[start + 1:end].strip()
+
+
+def merge_queries(
+    items: List[Tuple[str, dict]],
+) -> Tuple[str, dict, List[Tuple[str, str]]]:
+    """Merge `(query, variables)` pairs into one aliased GraphQL document.
+
+    Query `i` is aliased `q<i>` and its variables are renamed `q<i>_<name>`.
+    Returns the merged query, its variables and the `(alias, field)` of each
+    item, where `field` is the entity the original query selected.
+    """
+    definitions = []
+    bodies = []
+    merged_variables = {}
+    fields = []
+    for i, (query, variables) in enumerate(items):
+        prefix = f"q{i}_"
+        body = selection(query)
+        field = re.match(r"\w+", body).group(0)
+        body = re.sub(r"\$(\w+)", lambda m: f"${prefix}{m.group(1)}", body)
+        bodies.append(f"q{i}: {body}")
+        definitions.extend(
+            f"${prefix}{name}: {type_}" for name, type_ in variable_definitions(query)
+        )
+        merged_variables.update({f"{prefix}{k}": v for k, v in variables.items()})
+        fields.append((f"q{i}", field))
+    header = f"query ({', '.join(definitions)}) " if definitions else "query "
+    return header + "{ " + " ".join(bodies) + " }", merged_variables, fields
+
+
+def selection_span(query: str) -> Tuple[int, int]:
+    """Return the `(start, end)` span inside the queried entity's `{ }`."""
+    match = VARIABLES_RE.search(query)
+    body = query.index("{", match.end() if match else 0) + 1
+    start = query.index("{", query.index(")", body)) + 1
+    depth = 1
+    end = start
+    while depth:
+        if query[end] == "{":
+            depth += 1
+        elif query[end] == "}":
+            depth -= 1
+        end += 1
+    return start, end - 1
+
+
+def parse_selection(text: str) -> dict:
+    """Parse a selection set into `{field: sub-selection or None}`.
+
+    Only plain fields are supported: field arguments, aliases and fragments
+    raise ValueError, as the tree can't render them back.
+    """
+    tree: dict = {}
+    stack = [tree]
+    last = None
+    for token in re.findall(r"\w+|\S", text):
+        if token not in "{}" and not re.fullmatch(r"\w+", token):
+            raise ValueError(f"Unsupported {token!r} in selection set: {text.strip()}")
+        if token == "{":
+            stack[-1][last] = {}
+            stack.append(stack[-1][last])
+        elif token == "}":
+            stack.pop()
+        else:
+            last = token
+            stack[-1].setdefault(token, None)
+    return tree
+
+
+def merge_selections(trees: List[dict]) -> dict:
+    """Return the union of several parsed selection sets."""
+    merged: dict = {}
+    for tree in trees:
+        for field, sub in tree.items():
+            if sub is None:
+                merged.setdefault(field, None)
+            else:
+                merged[field] = merge_selections([merged.get(field) or {}, sub])
+    return merged
+
+
+def render_selection(tree: dict) -> str:
+    return " ".join(
+        field if sub is None else f"{field} {{ {render_selection(sub)} }}"
+        for field, sub in tree.items()
+    )
+
+
+def entity_filters(query: str) -> List[Tuple[str, str]]:
+    """Return the `field: value` pairs of the query's `where` block."""
+    where = WHERE_RE.search(query)
+    return parse_filters(where.group(1)) if where else []
+
+
+def replace_entity(query: str, filters: List[Tuple[str, str]], tree: dict) -> str:
+    """Return `query` with its `where` block and selection set replaced."""
+    start, end = selection_span(query)
+    query = query[:start] + " " + render_selection(tree) + " " + query[end:]
+    where = WHERE_RE.search(query)
+    return (
+        query[: where.start()]
+        + "where: "
+        + render_filters(filters)
+        + query[where.end() :]
+    )
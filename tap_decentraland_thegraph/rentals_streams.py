@@ -1,12 +1,9 @@
 """Stream type classes for tap-decentraland-thegraph."""
 
-import requests, backoff
-from pathlib import Path
-from typing import Any, Dict, Optional, Union, List, Iterable, cast
-
 from singer_sdk import typing as th  # JSON Schema typing helpers
 
 from tap_decentraland_thegraph.client import DecentralandTheGraphStream
+from tap_decentraland_thegraph.transforms import Apply
 
 
 class RentalsStream(DecentralandTheGraphStream):
@@ -55,15 +52,7 @@ class RentalsStream(DecentralandTheGraphStream):
     """
 
 
-    def post_process(self, row: dict, context: Optional[dict] = None) -> dict:
-        """Convert parcels into psv and adds block number"""
-        if 'rentalDays' in row:
-            row['rentalDays'] = int(row['rentalDays'])
-        if 'startedAt' in row:
-            row['startedAt'] = int(row['startedAt'])
-        if 'endsAt' in row:
-            row['endsAt'] = int(row['endsAt'])
-        return row
+    transforms = [Apply(int, "rentalDays", "startedAt", "endsAt", optional=True)]
 
     schema = th.PropertiesList(
         # id: Rental ID (Each succesful rent has a unique identifier)
@@ -1,9 +1,5 @@
 """Stream type classes for tap-decentraland-thegraph."""
 
-import requests, backoff
-from pathlib import Path
-from typing import Any, Dict, Optional, Union, List, Iterable, cast
-
 from singer_sdk import typing as th  # JSON Schema typing helpers
 
 from tap_decentraland_thegraph.client import DecentralandTheGraphStream
@@ -65,14 +61,6 @@ class ETHSalesStream(DecentralandTheGraphStream):
     }
     """
 
-    def get_url_params(self, partition, next_page_token: Optional[th.IntegerType] = None) -> dict:
-        next_page_token = next_page_token or self.get_starting_timestamp(partition)
-        self.logger.info(f'(stream: {self.name}) Next page:{next_page_token}')
-
-        return {
-            "timestamp": int(next_page_token)
-        }
-
     schema = th.PropertiesList(
         th.Property("id", th.StringType, required=True),
         th.Property("type", th.StringType),
@@ -158,14 +146,6 @@ class PolygonSalesStream(DecentralandTheGraphStream):
     }
     """
 
-    def get_url_params(self, partition, next_page_token: Optional[th.IntegerType] = None) -> dict:
-        next_page_token = next_page_token or self.get_starting_timestamp(partition)
-        self.logger.info(f'(stream: {self.name}) Next page:{next_page_token}')
-
-        return {
-            "timestamp": int(next_page_token)
-        }
-
     schema = th.PropertiesList(
         th.Property("id", th.StringType, required=True),
         th.Property("type", th.StringType),
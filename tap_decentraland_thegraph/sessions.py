@@ -0,0 +1,255 @@
+"""HTTP sessions shared by every stream of an endpoint.
+
+The tap creates one stream object per table, and left alone each one opens its
+own connection pool, so the same few hosts see dozens of pools and TLS
+handshakes. The `SessionRegistry` owns one tuned `requests.Session` per
+`url_base`, pool size and protocol instead, optionally speaking HTTP/2 through
+httpx, and counts the requests, connections and bytes of each endpoint.
+"""
+
+import contextlib
+import logging
+import threading
+from typing import Dict, Iterator, Optional, Tuple
+
+import requests
+from requests.adapters import BaseAdapter, HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+from urllib3.exceptions import DecodeError, ProtocolError, ReadTimeoutError
+
+try:
+    import httpx
+except ImportError:  # Optional dependency, install the `http2` extra
+    httpx = None
+
+
+class HTTP2Adapter(BaseAdapter):
+    """Send `requests` requests over a multiplexed httpx HTTP/2 client."""
+
+    def __init__(self, pool_size: int):
+        super().__init__()
+        if httpx is None:
+            raise RuntimeError(
+                "http2 requires httpx and h2, install tap-decentraland-thegraph[http2]"
+            )
+        self.client = httpx.Client(
+            http2=True,
+            limits=httpx.Limits(
+                max_connections=pool_size, max_keepalive_connections=pool_size
+            ),
+        )
+
+    def send(
+        self, request, stream=False, timeout=None, verify=True, cert=None, proxies=None
+    ):
+        if isinstance(timeout, tuple):
+            connect, read = timeout
+            timeout = httpx.Timeout(read, connect=connect)
+        try:
+            resp = self.client.request(
+                request.method,
+                request.url,
+                headers=dict(request.headers),
+                content=request.body,
+                timeout=timeout,
+            )
+        # Surface the same exception types as urllib3, so the backoff
+        # decorators retry exactly what they retry today
+        except httpx.TimeoutException as err:
+            raise requests.exceptions.ReadTimeout(str(err), request=request) from err
+        except httpx.TransportError as err:
+            raise requests.exceptions.ConnectionError(
+                str(err), request=request
+            ) from err
+
+        response = requests.Response()
+        response.status_code = resp.status_code
+        response.reason = resp.reason_phrase
+        response.headers = CaseInsensitiveDict(resp.headers)
+        response.encoding = get_encoding_from_headers(response.headers)
+        response.url = str(resp.url)
+        response.request = request
+        response.connection = self
+        # httpx already decoded the body, so it is never streamed
+        response._content = resp.content
+        response._content_consumed = True
+        response.wire_bytes = resp.num_bytes_downloaded
+        return response
+
+    def close(self) -> None:
+        self.client.close()
+
+
+@contextlib.contextmanager
+def body_errors() -> Iterator[None]:
+    """Raise errors reading a raw body as `response.content` would raise them."""
+    try:
+        yield
+    except ProtocolError as err:
+        raise requests.exceptions.ChunkedEncodingError(err) from err
+    except DecodeError as err:
+        raise requests.exceptions.ContentDecodingError(err) from err
+    except ReadTimeoutError as err:
+        raise requests.exceptions.ConnectionError(err) from err
+
+
+def read_body(response: requests.Response) -> bytes:
+    """Read the whole body with `raw.read`, whose bytes `raw.tell()` counts.
+
+    `response.content` reads chunked bodies through `raw.stream`, which leaves
+    that count at 0.
+    """
+    with body_errors():
+        content = response.raw.read(decode_content=True) or b""
+    response._content = content
+    response._content_consumed = True
+    return content
+
+
+class EndpointStats:
+    """Request, connection and byte counters of one endpoint."""
+
+    def __init__(self):
+        self.requests = 0
+        self.wire_bytes = 0
+        self.decoded_bytes = 0
+        self._lock = threading.Lock()
+
+    def count(self, response: requests.Response, *args, **kwargs) -> None:
+        """Response hook, runs before the session reads the body."""
+        if kwargs.get("stream") and not response._content_consumed:
+            # Streamed bodies are still on the wire, `streaming.PageRows`
+            # calls `count_body` once it has read them
+            response.endpoint_stats = self
+            self.add(1, 0, 0)
+            return
+        if response._content_consumed:
+            # Read by the adapter, e.g. HTTP/2
+            content = response.content
+        else:
+            # The session would read it right after the hooks anyway
+            content = read_body(response)
+        wire = getattr(response, "wire_bytes", None)
+        self.add(1, response.raw.tell() if wire is None else wire, len(content))
+
+    def count_body(self, response: requests.Response, decoded: int) -> None:
+        """Count the body of a streamed response, once it has been read."""
+        self.add(0, response.raw.tell(), decoded)
+
+    def add(self, responses: int, wire: int, decoded: int) -> None:
+        with self._lock:
+            self.requests += responses
+            self.wire_bytes += wire
+            self.decoded_bytes += decoded
+
+
+def copy_request(
+    prepared_request: requests.PreparedRequest,
+) -> requests.PreparedRequest:
+    """Copy a prepared request, along with whether `SharedSession` streams it."""
+    copied = prepared_request.copy()
+    copied.stream = getattr(prepared_request, "stream", False)
+    return copied
+
+
+class SharedSession(requests.Session):
+    """A session shared by several streams, each choosing whether to stream per request.
+
+    Requests are streamed when the prepared request has `stream` set, rather
+    than when the session does, as that would hold for every stream using it.
+    """
+
+    def send(self, request: requests.PreparedRequest, **kwargs) -> requests.Response:
+        kwargs.setdefault("stream", getattr(request, "stream", False))
+        return super().send(request, **kwargs)
+
+
+class SessionRegistry:
+    """Own one session per endpoint URL, shared by all the streams using it.
+
+    Sessions are keyed on the pool size and protocol too, so streams asking
+    for different ones never get a session built for another stream's.
+    """
+
+    def __init__(self):
+        self._sessions: Dict[Tuple[str, int, bool], SharedSession] = {}
+        self._stats: Dict[str, EndpointStats] = {}
+        self._lock = threading.Lock()
+
+    def get(
+        self, url_base: str, pool_size: int = 20, http2: bool = False
+    ) -> SharedSession:
+        """Return the session for `url_base`, creating it on first use."""
+        key = (url_base, pool_size, http2)
+        with self._lock:
+            session = self._sessions.get(key)
+            if session is None:
+                session = self._sessions[key] = self._create(*key)
+            return session
+
+    def _create(self, url_base: str, pool_size: int, http2: bool) -> SharedSession:
+        session = SharedSession()
+        session.headers["Accept-Encoding"] = "gzip, deflate"
+        session.headers["Connection"] = "keep-alive"
+        if http2:
+            adapter = HTTP2Adapter(pool_size)
+        else:
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        stats = self._stats.setdefault(url_base, EndpointStats())
+        session.hooks["response"].append(stats.count)
+        return session
+
+    def connections(self, url_base: str) -> Optional[int]:
+        """Return how many connections the endpoint's pools have opened."""
+        total = 0
+        for (endpoint, _, _), session in self._sessions.items():
+            if endpoint != url_base:
+                continue
+            adapter = session.get_adapter(url_base)
+            if not isinstance(adapter, HTTPAdapter):
+                # httpx does not expose its connection count
+                return None
+            pools = adapter.poolmanager.pools
+            total += sum(pools[key].num_connections for key in pools.keys())
+        return total
+
+    def stats(self) -> Dict[str, dict]:
+        with self._lock:
+            return {
+                url_base: {
+                    "requests": stats.requests,
+                    "connections": self.connections(url_base),
+                    "wire_bytes": stats.wire_bytes,
+                    "decoded_bytes": stats.decoded_bytes,
+                }
+                for url_base, stats in self._stats.items()
+            }
+
+    def log_stats(self, logger: logging.Logger) -> None:
+        for url_base, stats in self.stats().items():
+            connections = (
+                ""
+                if stats["connections"] is None
+                else f" over {stats['connections']} connections"
+            )
+            logger.info(
+                f"Endpoint {url_base}: {stats['requests']} requests{connections}, "
+                f"{stats['wire_bytes']} bytes received "
+                f"for {stats['decoded_bytes']} decoded"
+            )
+
+
+_registry: Optional[SessionRegistry] = None
+_registry_lock = threading.Lock()
+
+
+def get_registry() -> SessionRegistry:
+    """Return the process-wide registry, creating it on first use."""
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = SessionRegistry()
+        return _registry
@@ -0,0 +1,180 @@
+"""Shared-source fan-out: page one entity once for several streams.
+
+`WearablesStream`, `NamesStream`, `ParcelsStream` and `EstatesStream` scan the
+same marketplace `nfts` and only differ in their `category` filter, and the
+items streams fetch the same `items` twice. A `SharedSource` pages the entity
+once with the union of their fields and feeds every row to the streams that
+would have selected it. Each stream still runs its own `sync()`, so records,
+dedupe and state are exactly what a separate scan would produce.
+"""
+
+import queue
+import threading
+from typing import List, Optional, Tuple
+
+from tap_decentraland_thegraph import queries
+from tap_decentraland_thegraph.client import MAX_TIMESTAMP, RESULTS_PER_PAGE
+
+# Pages buffered per stream before the scan waits for it to catch up
+QUEUE_PAGES = 4
+
+
+def project(value, tree: Optional[dict]):
+    """Keep only the fields of `tree` in a row, recursing into objects and lists."""
+    if tree is None or value is None:
+        return value
+    if isinstance(value, list):
+        return [project(item, tree) for item in value]
+    return {
+        field: project(value[field], sub)
+        for field, sub in tree.items()
+        if field in value
+    }
+
+
+def literal_matches(value, literal: str) -> bool:
+    """Compare a row value with a GraphQL filter literal: enum, string, bool or list."""
+    if literal.startswith("["):
+        return any(literal_matches(value, item) for item in literal[1:-1].split(","))
+    literal = literal.strip().strip('"')
+    if isinstance(value, bool):
+        return str(value).lower() == literal
+    return str(value) == literal
+
+
+class SharedSource:
+    """Scan an entity once and dispatch its rows to several subscribed streams."""
+
+    def __init__(self, streams: list):
+        self.streams = streams
+        self.leader = streams[0]
+        self.name = "+".join(stream.name for stream in streams)
+        self.url_base = self.leader.url_base
+        self.logger = self.leader.logger
+
+        rk_filter = f"{self.leader.replication_key}_gte"
+        stream_filters = [
+            {
+                field: value
+                for field, value in queries.entity_filters(stream.query)
+                if field != rk_filter
+            }
+            for stream in streams
+        ]
+        self.trees = []
+        for stream in streams:
+            start, end = queries.selection_span(stream.query)
+            self.trees.append(queries.parse_selection(stream.query[start:end]))
+
+        # Filters every stream shares stay as they are, the rest are applied
+        # per stream when dispatching and widened to `_in` for the scan
+        shared_filters: List[Tuple[str, str]] = []
+        self.dispatch_filters = [{} for _ in streams]
+        fields = sorted(set().union(*stream_filters))
+        union_tree = queries.merge_selections(self.trees)
+        for field in fields:
+            values = [filters.get(field) for filters in stream_filters]
+            if len(set(values)) == 1:
+                shared_filters.append((field, values[0]))
+                continue
+            for filters, dispatch in zip(stream_filters, self.dispatch_filters):
+                if field in filters:
+                    dispatch[field] = filters[field]
+            if None not in values:
+                shared_filters.append(
+                    (f"{field}_in", "[" + ", ".join(sorted(set(values))) + "]")
+                )
+            union_tree.setdefault(field, None)
+        shared_filters.append((rk_filter, f"${self.leader.cursor_variable}"))
+        self.query = queries.replace_entity(
+            self.leader.query, shared_filters, union_tree
+        )
+
+        self.errors: List[BaseException] = []
+
+    def sync_stream(self, stream, rows: queue.Queue) -> None:
+        try:
+            stream.shared_rows = rows
+            stream.sync()
+            stream.finalize_state_progress_markers()
+        except BaseException as err:
+            self.errors.append(err)
+        finally:
+            stream.shared_rows = None
+
+    def put(self, rows: queue.Queue, item) -> None:
+        while not self.errors:
+            try:
+                rows.put(item, timeout=1)
+                return
+            except queue.Full:
+                continue
+
+    def finish(self, rows: queue.Queue, thread: threading.Thread) -> None:
+        """Tell a stream its feed is over, unless it already stopped."""
+        while thread.is_alive():
+            try:
+                rows.put(None, timeout=1)
+                return
+            except queue.Full:
+                continue
+
+    def sync(self) -> None:
+        """Scan the entity once, feeding each subscribed stream's `sync()`."""
+        rk = self.leader.replication_key
+        starts = [int(stream.get_starting_timestamp(None)) for stream in self.streams]
+        feeds = [
+            queue.Queue(maxsize=QUEUE_PAGES * RESULTS_PER_PAGE) for _ in self.streams
+        ]
+        threads = [
+            threading.Thread(
+                target=self.sync_stream, args=(stream, rows), name=stream.name
+            )
+            for stream, rows in zip(self.streams, feeds)
+        ]
+        for thread in threads:
+            thread.start()
+
+        self.logger.info(
+            f"(stream: {self.name}) Scanning {self.leader.object_returned} once "
+            f"for {len(self.streams)} streams"
+        )
+        cursor = (min(starts), "")
+        total = 0
+        try:
+            while not self.errors:
+                page, more = self.leader.request_window_page(
+                    None, cursor, MAX_TIMESTAMP, query=self.query
+                )
+                total += len(page)
+                for row in page:
+                    timestamp = int(row[rk])
+                    for start, tree, filters, rows in zip(
+                        starts, self.trees, self.dispatch_filters, feeds
+                    ):
+                        if timestamp >= start and all(
+                            literal_matches(row.get(field), value)
+                            for field, value in filters.items()
+                        ):
+                            self.put(rows, project(row, tree))
+                if not more:
+                    break
+                if total >= self.leader.config["incremental_limit"]:
+                    self.logger.warn(
+                        'Incremental limit for this run reached, please run again '
+                        'to continue loading data, and/or increase your limit'
+                    )
+                    break
+                cursor = (page[-1][rk], page[-1]["id"])
+        finally:
+            for rows, thread in zip(feeds, threads):
+                self.finish(rows, thread)
+            for thread in threads:
+                thread.join()
+
+        if self.errors:
+            raise self.errors[0]
+
+    def finalize_state_progress_markers(self) -> None:
+        # Every stream finalizes its own state in `sync_stream`
+        pass
@@ -0,0 +1,132 @@
+"""Incremental parsing of GraphQL result pages.
+
+With `ijson` installed and `stream_responses` set, page bodies are parsed
+while they download: each row of `data.<object_returned>` is built as soon as
+its bytes arrive, instead of decoding the whole page (and every nested `nft`,
+`item` or `metadata` object in it) once the last byte is in. Pages are read
+inside the stream's retried request, so a body cut short is requested again
+before any of its rows is emitted.
+"""
+
+from typing import Any, Iterator, List, Optional
+
+import requests
+
+from tap_decentraland_thegraph import codec, sessions
+
+try:
+    import ijson
+    from ijson.common import ObjectBuilder
+except ImportError:  # Optional dependency, install the `streaming` extra
+    ijson = None
+
+# Bytes handed to the parser per read
+CHUNK_SIZE = 64 * 1024
+
+
+def is_streamable(response) -> bool:
+    """Return True if the body of `response` is still on the wire."""
+    return (
+        ijson is not None
+        and isinstance(response, requests.Response)
+        and not response._content_consumed
+    )
+
+
+class CountingReader:
+    """File-like wrapper over a raw response that counts decoded bytes read."""
+
+    def __init__(self, raw):
+        self.raw = raw
+        self.nbytes = 0
+
+    def read(self, size: int = -1) -> bytes:
+        if size == 0:
+            # ijson probes the type of the stream with an empty read
+            return b""
+        with sessions.body_errors():
+            data = self.raw.read(size if size > 0 else CHUNK_SIZE, decode_content=True)
+        self.nbytes += len(data)
+        return data
+
+
+class PageRows:
+    """The rows of `data.<object_returned>` in a GraphQL response.
+
+    Streamed responses are parsed by `read`, responses already in memory
+    (batched, HTTP/2 or when streaming is off) are decoded as a whole when
+    iterated. `nbytes` is the body size once read, and `body` what to log if
+    the page turns out to be unusable.
+    """
+
+    def __init__(self, response, object_returned: str):
+        self.response = response
+        self.object_returned = object_returned
+        self.nbytes = 0
+        self.body: Any = None
+        self.rows: Optional[List[dict]] = None
+
+    def __iter__(self) -> Iterator[dict]:
+        if self.body is None:
+            if is_streamable(self.response):
+                self.read()
+            else:
+                self.body = codec.loads(self.response.content)
+                self.nbytes = len(self.response.content)
+                self.rows = self.body["data"][self.object_returned]
+        if self.rows is None:
+            raise KeyError(self.object_returned)
+        yield from self.rows
+
+    def read(self) -> None:
+        """Parse the rows of a streamed body as it downloads.
+
+        Read errors are raised as `response.content` would raise them. A body
+        without the rows keeps its `errors` in `body`, for `__iter__` to raise.
+        """
+        item_prefix = f"data.{self.object_returned}.item"
+        array_prefix = f"data.{self.object_returned}"
+        reader = CountingReader(self.response.raw)
+        rows: List[dict] = []
+        errors: Optional[List[Any]] = None
+        found = False
+        try:
+            events = ijson.parse(reader, buf_size=CHUNK_SIZE, use_float=True)
+            for prefix, event, value in events:
+                if prefix == array_prefix and event == "start_array":
+                    found = True
+                elif prefix == item_prefix and event == "start_map":
+                    rows.append(self._build(events, event, value))
+                elif prefix == "errors" and event == "start_array":
+                    errors = self._build(events, event, value)
+        finally:
+            self.nbytes = reader.nbytes
+            # Set by the shared session's `EndpointStats`, which counts the read body
+            stats = getattr(self.response, "endpoint_stats", None)
+            if stats is not None:
+                stats.count_body(self.response, reader.nbytes)
+            self.response.close()
+        self.body = {"errors": errors}
+        if found:
+            self.rows = rows
+
+    @staticmethod
+    def _build(events, event: str, value) -> Any:
+        """Assemble the object or array starting at the current event."""
+        builder = ObjectBuilder()
+        depth = 1
+        builder.event(event, value)
+        while depth:
+            _, event, value = next(events)
+            if event in ("start_map", "start_array"):
+                depth += 1
+            elif event in ("end_map", "end_array"):
+                depth -= 1
+            builder.event(event, value)
+        return builder.value
+
+
+def page_rows(response, object_returned: str) -> PageRows:
+    """Return the rows of a page response, as read by its request if streamed."""
+    page = getattr(response, "page_rows", None)
+    return page if page is not None else PageRows(response, object_returned)
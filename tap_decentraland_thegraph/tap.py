@@ -73,6 +73,9 @@ from tap_decentraland_thegraph.sales_streams import (
 from tap_decentraland_thegraph.rentals_streams import (
     RentalsStream
 )
+from tap_decentraland_thegraph import batches, prometheus, sessions
+from tap_decentraland_thegraph.scheduler import StreamScheduler
+from tap_decentraland_thegraph.shared_sources import SharedSource
 
 STREAM_TYPES = [
     WearablesBidsStream,
@@ -118,24 +121,200 @@ class TapDecentralandTheGraph(Tap):
 
     config_jsonschema = th.PropertiesList(
         th.Property("start_updated_at", th.IntegerType, default=1),
-        th.Property("api_url", th.StringType,
-                    default='https://subgraph.decentraland.org/marketplace'),
-        th.Property("polygon_collections_url", th.StringType,
-                    default='https://subgraph.decentraland.org/collections-matic-mainnet'),
+        th.Property(
+            "api_url",
+            th.StringType,
+            default='https://subgraph.decentraland.org/marketplace',
+        ),
+        th.Property(
+            "polygon_collections_url",
+            th.StringType,
+            default='https://subgraph.decentraland.org/collections-matic-mainnet',
+        ),
         th.Property("incremental_limit", th.IntegerType, default=50000),
-        th.Property("eth_mana_holder_url", th.StringType,
-                    default='https://subgraph.decentraland.org/mana-ethereum-mainnet'),
-        th.Property("polygon_mana_holder_url", th.StringType,
-                    default='https://subgraph.decentraland.org/mana-matic-mainnet'),
-        th.Property("poaps_xdai_url", th.StringType,
-                    default='https://api.thegraph.com/subgraphs/name/poap-xyz/poap-xdai'),
+        th.Property(
+            "eth_mana_holder_url",
+            th.StringType,
+            default='https://subgraph.decentraland.org/mana-ethereum-mainnet',
+        ),
+        th.Property(
+            "polygon_mana_holder_url",
+            th.StringType,
+            default='https://subgraph.decentraland.org/mana-matic-mainnet',
+        ),
+        th.Property(
+            "poaps_xdai_url",
+            th.StringType,
+            default='https://api.thegraph.com/subgraphs/name/poap-xyz/poap-xdai',
+        ),
         th.Property("poaps_details_url", th.StringType, default='http://api.poap.xyz'),
-        th.Property("eth_collections_url", th.StringType,
-                    default='https://subgraph.decentraland.org/collections-ethereum-mainnet'),
-        th.Property("rentals_url", th.StringType,
-                    default='https://subgraph.decentraland.org/rentals-ethereum-mainnet'),
+        th.Property(
+            "eth_collections_url",
+            th.StringType,
+            default='https://subgraph.decentraland.org/collections-ethereum-mainnet',
+        ),
+        th.Property(
+            "rentals_url",
+            th.StringType,
+            default='https://subgraph.decentraland.org/rentals-ethereum-mainnet',
+        ),
+        # Initial syncs of streams without a bookmark: fetch [start, now] as time
+        # windows on this many workers
+        th.Property("backfill_workers", th.IntegerType, default=1),
+        th.Property("backfill_window_seconds", th.IntegerType, default=2592000),
+        # Sync up to this many streams at once, and per subgraph endpoint
+        th.Property("max_parallel_streams", th.IntegerType, default=1),
+        th.Property("max_streams_per_endpoint", th.IntegerType, default=2),
+        # Merge concurrent page queries to the same endpoint into one aliased document
+        th.Property("batch_queries", th.BooleanType, default=False),
+        th.Property("batch_max_queries", th.IntegerType, default=8),
+        th.Property("batch_wait_ms", th.IntegerType, default=50),
+        # Scan entities shared by several streams (nfts, items) once per endpoint
+        th.Property("shared_sources", th.BooleanType, default=False),
+        # Historical snapshot lookups resolved per aliased request, 1 disables batching
+        th.Property("lookup_batch_size", th.IntegerType, default=100),
+        # On-disk cache of block-pinned lookups (estate snapshots), disabled when unset
+        th.Property("snapshot_cache_path", th.StringType),
+        th.Property("snapshot_cache_max_mb", th.IntegerType, default=512),
+        # Tune each stream's page size (`first`) from latency, payload size and timeouts
+        th.Property("adaptive_page_size", th.BooleanType, default=False),
+        th.Property("min_page_size", th.IntegerType, default=100),
+        # graph-node rejects `first` above its GRAPH_GRAPHQL_MAX_FIRST (1000 by default)
+        th.Property("max_page_size", th.IntegerType, default=1000),
+        th.Property("page_target_seconds", th.NumberType, default=10),
+        # Parse pages row by row while they download, requires the `streaming` extra
+        th.Property("stream_responses", th.BooleanType, default=False),
+        # Connections kept per endpoint by the session all its streams share
+        th.Property("http_pool_size", th.IntegerType, default=20),
+        # Multiplex requests over HTTP/2, requires the `http2` extra
+        th.Property("http2", th.BooleanType, default=False),
+        # Digests of the rows emitted at each bookmark kept in state, to skip them
+        # on resume
+        th.Property("max_boundary_keys", th.IntegerType, default=1000),
+        # Read every endpoint at its head block from the start of the run
+        th.Property("pin_block", th.BooleanType, default=False),
+        # Prometheus textfile rewritten during and at the end of each run, disabled
+        # when unset
+        th.Property("prometheus_textfile_path", th.StringType),
+        th.Property("prometheus_textfile_interval", th.IntegerType, default=30),
+        # Validate emitted records against the stream schema: `all`, `sample` or `none`
+        th.Property("record_validation", th.StringType, default="none"),
+        th.Property("record_validation_sample_every", th.IntegerType, default=1000),
+        # Write records to gzipped JSONL files in this directory, announced by BATCH
+        # messages
+        th.Property("batch_output_path", th.StringType),
+        th.Property("batch_output_records", th.IntegerType, default=100000),
+        # Batch file format, `jsonl` or `parquet` with typed, flattened columns
+        # (requires the `parquet` extra)
+        th.Property("batch_output_format", th.StringType, default="jsonl"),
+        # Digits of the decimal columns of BigInt amounts in Parquet batch files,
+        # up to 76
+        th.Property("batch_output_decimal_precision", th.IntegerType, default=38),
     ).to_dict()
 
     def discover_streams(self) -> List[Stream]:
         """Return a list of discovered streams."""
         return [stream_class(tap=self) for stream_class in STREAM_TYPES]
+
+    def sync_all(self) -> None:
+        """Sync all streams, then close any open batch files, write each stream's
+        metric totals and log what each endpoint's shared session did."""
+        exporter = None
+        if self.config.get("prometheus_textfile_path"):
+            exporter = prometheus.TextfileExporter(
+                self,
+                self.config["prometheus_textfile_path"],
+                interval=self.config.get("prometheus_textfile_interval", 30),
+            )
+            exporter.start()
+        success = False
+        try:
+            if self.config.get("pin_block"):
+                self.pin_blocks()
+            self.sync_streams()
+            success = True
+        finally:
+            if self.config.get("batch_output_path"):
+                # Records synced so far are durable, so their state can go out
+                batches.get_writer(self.config["batch_output_path"]).flush()
+            for stream in self.streams.values():
+                if hasattr(stream, "write_total_metrics"):
+                    stream.write_total_metrics()
+            sessions.get_registry().log_stats(self.logger)
+            if exporter is not None:
+                exporter.stop(success)
+
+    def pin_blocks(self) -> None:
+        """Resolve the block of every endpoint before any stream starts."""
+        for stream in self.streams.values():
+            if (stream.selected or stream.has_selected_descendents) and hasattr(
+                stream, "run_block"
+            ):
+                stream.run_block
+
+    def sync_streams(self) -> None:
+        """Sync all streams, concurrently when `max_parallel_streams` > 1."""
+        if self.config.get("max_parallel_streams", 1) <= 1 and not self.config.get(
+            "shared_sources"
+        ):
+            super().sync_all()
+            return
+
+        self._reset_state_progress_markers()
+        self._set_compatible_replication_methods()
+        streams = []
+        for stream in self.streams.values():
+            # Create every bookmark up front, so worker threads only update
+            # existing entries of the shared state
+            stream.stream_state
+            if not stream.selected and not stream.has_selected_descendents:
+                self.logger.info(f"Skipping deselected stream '{stream.name}'.")
+                continue
+            if stream.parent_stream_type:
+                # Synced by the parent stream
+                continue
+            streams.append(stream)
+
+        if self.config.get("shared_sources"):
+            streams = self.group_shared_sources(streams)
+
+        StreamScheduler(
+            logger=self.logger,
+            max_workers=self.config.get("max_parallel_streams", 1),
+            max_per_endpoint=self.config.get("max_streams_per_endpoint", 2),
+        ).run(streams)
+
+    def group_shared_sources(self, streams: List[Stream]) -> list:
+        """Replace streams scanning the same entity with one SharedSource each."""
+        groups = {}
+        jobs = []
+        for stream in streams:
+            if (
+                getattr(stream, "shared_source", None)
+                and stream.selected
+                and not stream.child_streams
+            ):
+                key = (stream.url_base, stream.shared_source, stream.replication_key)
+                if key not in groups:
+                    groups[key] = []
+                    jobs.append(groups[key])
+                groups[key].append(stream)
+            else:
+                jobs.append(stream)
+        sources = []
+        for job in jobs:
+            if not isinstance(job, list):
+                sources.append(job)
+            elif len(job) == 1:
+                sources.append(job[0])
+            else:
+                try:
+                    sources.append(SharedSource(job))
+                except ValueError as err:
+                    # Queries the union selection can't express are scanned separately
+                    self.logger.warning(
+                        "Not sharing a scan between "
+                        f"{', '.join(stream.name for stream in job)}: {err}"
+                    )
+                    sources.extend(job)
+        return sources
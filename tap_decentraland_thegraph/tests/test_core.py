@@ -1,10 +1,45 @@
 """Tests standard tap features using the built-in SDK tests library."""
 
 import datetime
+import decimal
+import gzip
+import itertools
+import json
+import threading
+import time
+from types import SimpleNamespace
+from typing import List, Optional
 
+import pytest
 from singer_sdk.testing import get_standard_tap_tests
 
+from singer_sdk.helpers._catalog import pop_deselected_record_properties
+from singer_sdk.helpers._typing import conform_record_data_types
+
+from tap_decentraland_thegraph import (
+    bench,
+    cache,
+    client,
+    parquet,
+    queries,
+    sessions,
+    validation,
+)
 from tap_decentraland_thegraph.tap import TapDecentralandTheGraph
+from tap_decentraland_thegraph.transforms import (
+    Apply,
+    BodyShapes,
+    FromContext,
+    IntOrNone,
+    JoinParcels,
+    RowId,
+    compile_transforms,
+)
+from tap_decentraland_thegraph.mock_graph_node import (
+    MockGraphNode,
+    entity_id,
+    timestamp_of,
+)
 
 SAMPLE_CONFIG = {
     "start_date": datetime.datetime.now(datetime.timezone.utc).strftime("%Y-%m-%d")
@@ -12,6 +47,24 @@ SAMPLE_CONFIG = {
 }
 
 
+def sync_stream(
+    capsys, config: dict, name: str, state: Optional[dict] = None
+) -> List[dict]:
+    """Sync one stream of a new tap, returning the messages it wrote."""
+    tap = TapDecentralandTheGraph(config=config, state=state)
+    capsys.readouterr()
+    tap.streams[name].sync()
+    return [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+
+
+def record_ids(messages: List[dict], name: str) -> List[str]:
+    return [
+        message["record"]["id"]
+        for message in messages
+        if message["type"] == "RECORD" and message["stream"] == name
+    ]
+
+
 # Run standard built-in tap tests from the SDK:
 def test_standard_tap_tests():
     """Run standard tap tests from the SDK."""
@@ -23,4 +76,680 @@ def test_standard_tap_tests():
         test()
 
 
-# TODO: Create additional tests as appropriate for your tap.
+def test_standard_tap_tests_offline():
+    """Run standard tap tests from the SDK against a mock graph-node."""
+    with MockGraphNode(rows=100) as node:
+        for test in get_standard_tap_tests(
+            TapDecentralandTheGraph, config=node.config()
+        ):
+            test()
+
+
+def test_sync_pages_through_mock_graph_node(capsys):
+    """Small pinned pages return every row exactly once."""
+    with MockGraphNode(rows=300) as node:
+        tap = TapDecentralandTheGraph(config=node.config(
+            pin_block=True,
+            adaptive_page_size=True,
+            min_page_size=100,
+            max_page_size=100,
+        ))
+        tap.sync_all()
+
+    messages = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+    ids = [
+        message["record"]["id"]
+        for message in messages
+        if message["type"] == "RECORD" and message["stream"] == "nfts_wearables"
+    ]
+    # Every fourth row is a wearable
+    assert sorted(ids) == [entity_id(i) for i in range(0, 300, 4)]
+
+
+def test_keyset_pagination(capsys, caplog):
+    """Snapshots page on `id_gt`, past the 5000 rows `skip` can reach."""
+    with MockGraphNode(rows=6500) as node:
+        messages = sync_stream(capsys, node.config(), "mana_holders_eth")
+        requests = node.requests
+    assert record_ids(messages, "mana_holders_eth") == [
+        entity_id(i) for i in range(6500)
+    ]
+    # Six full pages and a short one
+    assert requests == 7
+
+    # The incremental limit still caps the run, after the page reaching it
+    with MockGraphNode(rows=6500) as node:
+        messages = sync_stream(
+            capsys, node.config(incremental_limit=2500), "mana_holders_eth"
+        )
+    assert record_ids(messages, "mana_holders_eth") == [
+        entity_id(i) for i in range(3000)
+    ]
+    assert "Limit for this run reached" in caplog.text
+
+
+def test_composite_cursor(capsys):
+    """Pages smaller than a timestamp's rows resume after the last (updatedAt, id)."""
+    query = (
+        "query ($updatedAt: Int!) { nfts(first: 1000, "
+        "where: {category: wearable, updatedAt_gte: $updatedAt}) { id } }"
+    )
+    assert queries.composite_cursor_query(query, "updatedAt") == (
+        "query ($updatedAt: Int!, $lastId: ID!) { nfts(first: 1000, where: {or: ["
+        "{category: wearable, updatedAt_gt: $updatedAt}, "
+        "{category: wearable, updatedAt: $updatedAt, id_gt: $lastId}]}) { id } }"
+    )
+
+    # Rows share timestamps in threes, so pages of two split them
+    with MockGraphNode(rows=31) as node:
+        config = node.config(adaptive_page_size=True, min_page_size=2, max_page_size=2)
+        messages = sync_stream(capsys, config, "collections_ethereum")
+    assert record_ids(messages, "collections_ethereum") == [
+        entity_id(i) for i in range(31)
+    ]
+    state = [message for message in messages if message["type"] == "STATE"][-1]["value"]
+    assert state["bookmarks"]["collections_ethereum"]["replication_key_value"] == str(
+        timestamp_of(30)
+    )
+
+
+def test_dedupe(capsys, caplog, monkeypatch):
+    """Rows refetched by plain `_gte` paging are emitted once, with keys per stream."""
+    monkeypatch.setattr(client.DecentralandTheGraphStream, "composite_cursor", False)
+    names = ["collections_ethereum", "sales_ethereum"]
+    with MockGraphNode(rows=30) as node:
+        tap = TapDecentralandTheGraph(
+            config=node.config(
+                adaptive_page_size=True, min_page_size=4, max_page_size=4
+            )
+        )
+        capsys.readouterr()
+        for name in names:
+            tap.streams[name].sync()
+    messages = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+    # Both streams have the mock's ids, neither skips the other's
+    for name in names:
+        assert record_ids(messages, name) == [entity_id(i) for i in range(30)]
+    assert "skipping duplicate" in caplog.text
+    # Only the keys of the latest timestamp are kept
+    stream = tap.streams["collections_ethereum"]
+    assert (
+        stream.boundary_value == str(timestamp_of(29))
+        and len(stream.boundary_keys) == 3
+    )
+
+
+def test_resume_boundary(capsys, monkeypatch):
+    """Resuming from any STATE message emits exactly the rows written after it."""
+    # A STATE message is written before every fifth record, mid-page and mid-timestamp
+    monkeypatch.setattr(client.DecentralandTheGraphStream, "STATE_MSG_FREQUENCY", 5)
+    with MockGraphNode(rows=30) as node:
+        messages = sync_stream(capsys, node.config(), "collections_ethereum")
+        checked = 0
+        for i, message in enumerate(messages[:-1]):
+            if (
+                message["type"] != "STATE"
+                or "boundary_keys"
+                not in message["value"]["bookmarks"]["collections_ethereum"]
+            ):
+                continue
+            written = record_ids(messages[:i], "collections_ethereum")
+            resumed = sync_stream(
+                capsys, node.config(), "collections_ethereum", state=message["value"]
+            )
+            assert record_ids(resumed, "collections_ethereum") == [
+                entity_id(i) for i in range(len(written), 30)
+            ]
+            checked += 1
+    assert checked >= 5
+
+
+def test_backfill_windows(capsys, caplog, monkeypatch):
+    """Initial syncs fetch windows in parallel, yielded in order within the limit."""
+    # Windows end after the mock's last timestamp instead of now
+    monkeypatch.setattr(
+        client,
+        "time",
+        SimpleNamespace(time=lambda: timestamp_of(300), perf_counter=time.perf_counter),
+    )
+    with MockGraphNode(rows=300) as node:
+        config = node.config(
+            backfill_workers=3,
+            backfill_window_seconds=1200,
+            adaptive_page_size=True,
+            min_page_size=10,
+            max_page_size=10,
+        )
+        messages = sync_stream(capsys, config, "collections_ethereum")
+        assert record_ids(messages, "collections_ethereum") == [
+            entity_id(i) for i in range(300)
+        ]
+        assert "Backfilling" in caplog.text
+
+        # The limit is checked after every page, so it is overshot by less than one
+        limited = sync_stream(
+            capsys, {**config, "incremental_limit": 25}, "collections_ethereum"
+        )
+        ids = record_ids(limited, "collections_ethereum")
+        assert ids == [entity_id(i) for i in range(len(ids))] and 25 <= len(ids) < 35
+
+        # Runs resuming from a bookmark page through the rest sequentially
+        caplog.clear()
+        state = [message for message in limited if message["type"] == "STATE"][-1][
+            "value"
+        ]
+        resumed = sync_stream(capsys, config, "collections_ethereum", state=state)
+        assert "Backfilling" not in caplog.text
+        assert record_ids(resumed, "collections_ethereum")[-1] == entity_id(299)
+
+
+def test_shared_sources(capsys, caplog):
+    """A shared scan gives each stream the records and bookmark of its own scan."""
+    streams = [
+        "nfts_wearables",
+        "nfts_names",
+        "nfts_parcels",
+        "nfts_estates",
+        "items_ethereum",
+        "items_ethereum_unique",
+    ]
+    runs = []
+    for shared in (False, True):
+        with MockGraphNode(rows=300) as node:
+            tap = TapDecentralandTheGraph(config=node.config(shared_sources=shared))
+            capsys.readouterr()
+            tap.sync_all()
+            served = node.rows_served
+        messages = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+        state = [message for message in messages if message["type"] == "STATE"][-1][
+            "value"
+        ]
+        runs.append((
+            {name: record_ids(messages, name) for name in streams},
+            {name: state["bookmarks"][name] for name in streams},
+            served,
+        ))
+    (records, bookmarks, served), (shared_records, shared_bookmarks, shared_served) = (
+        runs
+    )
+    assert shared_records == records
+    assert records["nfts_wearables"] == [entity_id(i) for i in range(0, 300, 4)]
+    assert shared_bookmarks == bookmarks
+    assert "Scanning nfts once for 4 streams" in caplog.text
+    assert shared_served < served
+
+    # Selections with arguments or aliases can't be merged, their streams scan alone
+    with pytest.raises(ValueError):
+        queries.parse_selection("id owner: nft(first: 1) { id }")
+    tap = TapDecentralandTheGraph(config=SAMPLE_CONFIG)
+    wearables, names = tap.streams["nfts_wearables"], tap.streams["nfts_names"]
+    names.query = names.query.replace("tokenId", "token: tokenId")
+    assert tap.group_shared_sources([wearables, names]) == [wearables, names]
+
+
+def test_batched_lookups(capsys):
+    """Child lookups resolved in aliased batches give the same records and state."""
+    runs = []
+    for batch_size in (1, 10):
+        with MockGraphNode(rows=200) as node:
+            messages = sync_stream(
+                capsys, node.config(lookup_batch_size=batch_size), "orders_estates"
+            )
+            requests = node.requests
+        records = [
+            message["record"]
+            for message in messages
+            if message["type"] == "RECORD"
+            and message["stream"] == "historical_snapshot_estates"
+        ]
+        orders = [
+            message["record"]
+            for message in messages
+            if message["type"] == "RECORD" and message["stream"] == "orders_estates"
+        ]
+        state = [message for message in messages if message["type"] == "STATE"][-1][
+            "value"
+        ]
+        runs.append((records, state, requests))
+    (records, state, requests), (batched_records, batched_state, batched_requests) = (
+        runs
+    )
+    # One snapshot per sold estate order
+    assert [record["id"] for record in records] == [
+        order["nft"]["id"] for order in orders
+    ] and records
+    assert batched_records == records
+    assert batched_state == state
+    # One request per order page and per batch of ten lookups, instead of one per
+    # lookup, plus the batch flushed by the first STATE message
+    assert requests == 1 + len(records)
+    assert batched_requests <= 1 + -(-len(records) // 10) + 1
+
+
+def test_snapshot_cache(capsys, caplog, tmp_path):
+    """Reruns answer block-pinned lookups from disk, with the same records and state."""
+    config = {
+        "snapshot_cache_path": str(tmp_path / "snapshots.sqlite"),
+        "lookup_batch_size": 10,
+    }
+    runs = []
+    # Entries are keyed on the endpoint too, so both runs query the same server
+    with MockGraphNode(rows=200) as node:
+        for _ in range(2):
+            caplog.clear()
+            requests = node.requests
+            messages = sync_stream(capsys, node.config(**config), "orders_estates")
+            records = [
+                message["record"]
+                for message in messages
+                if message["type"] == "RECORD"
+                and message["stream"] == "historical_snapshot_estates"
+            ]
+            state = [message for message in messages if message["type"] == "STATE"][-1][
+                "value"
+            ]
+            runs.append((records, state, node.requests - requests))
+    (records, state, _), (cached_records, cached_state, cached_requests) = runs
+    assert records and cached_records == records
+    assert cached_state == state
+    # Only the orders page is fetched
+    assert cached_requests == 1
+    lookups = [message for message in caplog.messages if "Snapshot cache" in message]
+    assert lookups and all(message.endswith(" 0 misses") for message in lookups)
+
+    # Past its bound, the cache evicts the least recently used entries
+    snapshots = cache.SnapshotCache(str(tmp_path / "bounded.sqlite"), max_bytes=1000)
+    for i in range(20):
+        snapshots.put(str(i), {"id": entity_id(i)})
+        snapshots.get("0")
+    assert snapshots.get("0") == {"id": entity_id(0)}
+    assert snapshots.get("1") is None
+    assert snapshots.get("19") == {"id": entity_id(19)}
+
+
+def test_batch_queries(capsys, caplog, monkeypatch):
+    """Page requests of concurrent streams on an endpoint go as one aliased document."""
+    names = ["collections_ethereum", "sales_ethereum"]
+    # Both streams are syncing before either sends its first request
+    barrier = threading.Barrier(len(names))
+    write_starting_replication_value = (
+        client.DecentralandTheGraphStream._write_starting_replication_value
+    )
+
+    def started(stream, context):
+        write_starting_replication_value(stream, context)
+        barrier.wait()
+
+    monkeypatch.setattr(
+        client.DecentralandTheGraphStream, "_write_starting_replication_value", started
+    )
+    with MockGraphNode(rows=30) as node:
+        config = node.config(
+            batch_queries=True, batch_max_queries=2, batch_wait_ms=5000
+        )
+        tap = TapDecentralandTheGraph(config=config)
+        capsys.readouterr()
+        threads = [threading.Thread(target=tap.streams[name].sync) for name in names]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        requests = node.requests
+        messages = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+        for name in names:
+            assert record_ids(messages, name) == [entity_id(i) for i in range(30)]
+        # The second stream fills the batch, so neither waits out `batch_wait_ms`
+        assert requests == 1
+        # Each stream logs the request that answered it
+        assert caplog.text.count("http_request_duration") == len(names)
+
+        # A stream syncing alone doesn't wait for others either
+        monkeypatch.undo()
+        start = time.perf_counter()
+        messages = sync_stream(capsys, config, "collections_ethereum")
+        assert time.perf_counter() - start < 5
+        assert record_ids(messages, "collections_ethereum") == [
+            entity_id(i) for i in range(30)
+        ]
+
+    # Batchers are per setting
+    assert client.batching.get_batcher(2, 5) is client.batching.get_batcher(2, 5)
+    assert client.batching.get_batcher(2, 5) is not client.batching.get_batcher(8, 5)
+
+
+def test_shared_sessions(capsys):
+    """Streams share a session per endpoint and settings, counting every response."""
+    pytest.importorskip("ijson")
+    with MockGraphNode(rows=300) as node:
+        config = node.config(stream_responses=True, pin_block=True)
+        tap = TapDecentralandTheGraph(config=config)
+        stream = tap.streams["collections_ethereum"]
+        registry = sessions.get_registry()
+        assert stream.requests_session is tap.streams["sales_ethereum"].requests_session
+        assert registry.get(stream.url_base, pool_size=1) is not stream.requests_session
+
+        # Pages are streamed, other requests such as `_meta` are read as a whole
+        assert stream.prepare_request(None, None).stream
+        assert sessions.copy_request(stream.prepare_request(None, None)).stream
+        assert stream.send_graphql(
+            None, "{ _meta { block { number } } }", {}
+        )._content_consumed
+        messages = sync_stream(capsys, config, "collections_ethereum")
+        assert record_ids(messages, "collections_ethereum") == [
+            entity_id(i) for i in range(300)
+        ]
+        stats = registry.stats()[stream.url_base]
+
+    # Both `_meta` requests and the page, whose body is counted once streamed
+    assert stats["requests"] == 3
+    # Gzipped on the wire
+    assert 0 < stats["wire_bytes"] < stats["decoded_bytes"]
+
+
+def test_streamed_pages_retry_cut_bodies(capsys, monkeypatch):
+    """A page body cut short is requested again before any of its rows is emitted."""
+    pytest.importorskip("ijson")
+    monkeypatch.setattr(client.backoff, "expo", lambda **kwargs: itertools.repeat(0))
+    with MockGraphNode(rows=1000, truncate_rate=0.3) as node:
+        config = node.config(
+            stream_responses=True,
+            adaptive_page_size=True,
+            min_page_size=100,
+            max_page_size=100,
+        )
+        messages = sync_stream(capsys, config, "collections_ethereum")
+        pages = node.requests
+
+    assert record_ids(messages, "collections_ethereum") == [
+        entity_id(i) for i in range(1000)
+    ]
+    # 11 pages, the last one empty, and the retries of the ones cut short
+    assert pages > 11
+
+
+def test_state_mutations_hold_message_lock():
+    """Streams only change the shared tap state while holding `MESSAGE_LOCK`."""
+    tap = TapDecentralandTheGraph(config=SAMPLE_CONFIG)
+    stream = tap.streams["collections_ethereum"]
+    mutations = [
+        lambda: stream.get_context_state(None),
+        lambda: stream._write_replication_key_signpost(None, 1),
+        stream.finalize_state_progress_markers,
+        # Ahead of the SDK's own call at the end of `_sync_records`
+        lambda: stream.finalize_synced_state(None),
+    ]
+    for mutation in mutations:
+        with client.MESSAGE_LOCK:
+            thread = threading.Thread(target=mutation)
+            thread.start()
+            thread.join(0.1)
+            assert thread.is_alive()
+        thread.join(1)
+        assert not thread.is_alive()
+
+
+def test_bench_streams():
+    """The benchmark runs the hot paths of the streams it covers by default."""
+    tap = TapDecentralandTheGraph(config={})
+    for name in bench.DEFAULT_STREAMS:
+        result = bench.bench_stream(tap.streams[name], count=50, repeat=1)
+        assert result["records"] == 50
+        assert result["get_records"]["records_per_sec"] > 0
+
+
+def test_stream_metrics(capsys, tmp_path):
+    """Metrics add up the pages each stream requested and the records it emitted."""
+    textfile = tmp_path / "tap.prom"
+    with MockGraphNode(rows=1000) as node:
+        tap = TapDecentralandTheGraph(config=node.config(
+            adaptive_page_size=True,
+            min_page_size=100,
+            max_page_size=100,
+            prometheus_textfile_path=str(textfile),
+        ))
+        tap.sync_all()
+    capsys.readouterr()
+
+    totals = tap.streams["nfts_wearables"].stream_metrics.totals
+    # 250 wearables in pages of 100, the last one short
+    assert tap.streams["nfts_wearables"].stream_metrics.pages == 3
+    assert totals["request_count"] == 3
+    assert totals["records_emitted"] == 250
+    assert totals["bytes_received"] > 0
+    assert totals["post_process_duration"] > 0
+
+    exported = textfile.read_text()
+    assert "tap_decentraland_thegraph_run_success 1\n" in exported
+    assert (
+        'tap_decentraland_thegraph_records_total{stream="nfts_wearables",' in exported
+    )
+    assert (
+        'tap_decentraland_thegraph_request_duration_seconds_count'
+        '{stream="nfts_wearables",' in exported
+    )
+
+
+def test_post_process_batches_follow_pages(capsys):
+    """Batches never span pages, even pages shorter than `page_size`."""
+    with MockGraphNode(rows=10, entity_rows={"poaps": 250}) as node:
+        tap = TapDecentralandTheGraph(config=node.config())
+        stream = tap.streams["poaps_metadata"]
+        pages, batches = [], []
+        parse_response = stream.parse_response
+        post_process_batch = stream.post_process_batch or (lambda rows, context: rows)
+
+        def count_page(response):
+            pages.append(0)
+            for row in parse_response(response):
+                pages[-1] += 1
+                yield row
+
+        def count_batch(rows, context):
+            batches.append(len(rows))
+            return post_process_batch(rows, context)
+
+        stream.parse_response = count_page
+        stream.post_process_batch = count_batch
+        stream.sync()
+    # Pages of 100 events, each batched on its own rather than 1000 rows at a time
+    assert pages[0] == 100 and len(pages) > 2
+    assert batches == pages
+
+
+def test_compiled_transforms():
+    """Declared transforms compile into one function applying them to every row."""
+    transform = compile_transforms([
+        Apply(int, "parcel.x", "parcel.y"),
+        IntOrNone("price"),
+        BodyShapes("wearable"),
+        BodyShapes("metadata.emote", optional=True, fill_missing=True),
+        JoinParcels("parcels"),
+        FromContext("blockNumber"),
+        RowId("id", "blockNumber"),
+    ])
+    row = {
+        "id": "0x1",
+        "parcel": {"x": "-3", "y": "7"},
+        "price": "1" * 33,
+        "wearable": {"bodyShapes": ["BaseMale"]},
+        "metadata": {},
+        "parcels": [{"x": "1", "y": "2"}, {"x": "1", "y": "3"}],
+    }
+    assert transform([row], {"blockNumber": "100"}) == [{
+        "id": "0x1",
+        "parcel": {"x": -3, "y": 7},
+        "price": None,
+        "wearable": {"bodyShapeMale": True, "bodyShapeFemale": False},
+        "metadata": {"emote": {}},
+        "parcels": "1,2|1,3",
+        "blockNumber": "100",
+        "rowId": "0x1|100",
+    }]
+    exact = compile_transforms([IntOrNone("price")], exact_integers=True)
+    assert exact([{"price": "1" * 33}]) == [{"price": int("1" * 33)}]
+    optional = compile_transforms([Apply(int, "startedAt", "endsAt", optional=True)])
+    assert optional([{"startedAt": "1"}]) == [{"startedAt": 1}]
+    # Field paths end up in the generated source, so they must be field names
+    for path in ["parcel.x']", "parcel..x", "parcel.x y"]:
+        with pytest.raises(ValueError):
+            compile_transforms([Apply(int, path)])
+
+    # Streams compile theirs at init, and post-process single rows with them too
+    stream = TapDecentralandTheGraph(config={}).streams["nfts_wearables"]
+    row = {"id": "0x2", "updatedAt": "5", "wearable": {"bodyShapes": ["BaseFemale"]}}
+    assert stream.post_process(row) == {
+        "id": "0x2",
+        "updatedAt": "5",
+        "wearable": {"bodyShapeMale": False, "bodyShapeFemale": True},
+        "rowId": "0x2|5",
+    }
+
+
+def test_record_conformance_and_validation(caplog):
+    """Compiled conformers match the SDK's, and sampled validation reports errors."""
+    tap = TapDecentralandTheGraph(
+        config={"record_validation": "sample", "record_validation_sample_every": 2}
+    )
+    stream = tap.streams["items_polygon_unique"]
+    stream.mask[("properties", "description")] = False
+    rows = [
+        stream.post_process(row)
+        for row in stream.parse_response(
+            bench.page_response(bench.sample_page(stream, 4))
+        )
+    ]
+
+    conform = validation.compile_conformer(
+        stream.name, stream.schema, stream.mask, stream.logger
+    )
+    for row in rows:
+        expected = json.loads(json.dumps(row))
+        pop_deselected_record_properties(
+            expected, stream.schema, stream.mask, stream.logger
+        )
+        expected = conform_record_data_types(
+            stream.name, expected, stream.schema, stream.logger
+        )
+        assert conform(row) == expected
+        assert "description" not in row and "metadata" not in expected
+
+    # One record in two is validated, so of the invalid 2nd and 3rd only the 3rd is
+    # reported
+    for index, row in enumerate(rows[:3]):
+        row["available"] = "many" if index else row["available"]
+        list(stream._generate_record_messages(row))
+    assert stream.stream_metrics.page["records_invalid"] == 1
+    assert "does not match the schema" in caplog.text
+
+
+def test_batch_output(capsys, tmp_path):
+    """Records go to gzipped JSONL files, and STATE never gets ahead of the files."""
+    with MockGraphNode(rows=300) as node:
+        tap = TapDecentralandTheGraph(
+            config=node.config(batch_output_path=str(tmp_path), batch_output_records=20)
+        )
+        tap.sync_all()
+
+    messages = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+    assert not any(message["type"] == "RECORD" for message in messages)
+    ids, updated = [], [0]
+    for message in messages:
+        if message["type"] == "BATCH" and message["stream"] == "nfts_wearables":
+            assert message["encoding"] == {"format": "jsonl", "compression": "gzip"}
+            with gzip.open(message["manifest"][0][len("file://"):], "rt") as batch:
+                records = [json.loads(line) for line in batch]
+            assert len(records) <= 20
+            ids += [record["id"] for record in records]
+            updated += [int(record["updatedAt"]) for record in records]
+        elif message["type"] == "STATE":
+            bookmark = message["value"].get("bookmarks", {}).get("nfts_wearables", {})
+            value = bookmark.get("progress_markers", bookmark).get(
+                "replication_key_value"
+            )
+            assert value is None or int(value) <= max(updated)
+    assert sorted(ids) == [entity_id(i) for i in range(0, 300, 4)]
+    assert messages[-1]["type"] == "STATE"
+    assert not list(tmp_path.glob("*.tmp"))
+
+
+def test_parquet_batch_output(capsys, tmp_path):
+    """Parquet batches have flattened typed columns and exact decimals for BigInts."""
+    pyarrow_parquet = pytest.importorskip("pyarrow.parquet")
+    with MockGraphNode(rows=300) as node:
+        tap = TapDecentralandTheGraph(
+            config=node.config(
+                batch_output_path=str(tmp_path), batch_output_format="parquet"
+            )
+        )
+        tap.sync_all()
+
+    messages = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+    batch = next(
+        message
+        for message in messages
+        if message["type"] == "BATCH" and message["stream"] == "sales_polygon"
+    )
+    assert batch["encoding"] == {"format": "parquet", "compression": "zstd"}
+    table = pyarrow_parquet.read_table(batch["manifest"][0][len("file://"):])
+    assert str(table.schema.field("price").type) == "decimal128(38, 0)"
+    assert str(table.schema.field("item__collection__id").type) == "string"
+    assert table.column("price")[1].as_py() == decimal.Decimal(1000000007)
+    assert messages[-1]["type"] == "STATE"
+
+    schema = {
+        "properties": {
+            "price": {"type": ["string", "null"]},
+            "minters": {"type": ["array", "null"], "items": {"type": ["string"]}},
+            "nft": {
+                "type": ["object", "null"],
+                "properties": {"x": {"type": ["integer", "null"]}},
+            },
+        }
+    }
+    layout = parquet.Layout(schema)
+    table, widened = layout.table(
+        [
+            {
+                "price": "12345678901234567890123456789012345678",
+                "minters": ["0x1"],
+                "nft": {"x": 1},
+            },
+            {"price": None},
+        ]
+    )
+    assert table.to_pylist() == [
+        {
+            "price": decimal.Decimal("12345678901234567890123456789012345678"),
+            "minters": ["0x1"],
+            "nft__x": 1,
+        },
+        {"price": None, "minters": None, "nft__x": None},
+    ]
+    assert table.schema == layout.schema and not widened
+
+    # Values that don't fit are never dropped, their column is widened for the file
+    table, widened = layout.table(
+        [{"price": "1" * 39, "nft": {"x": 2**70}}, {"price": 5}]
+    )
+    assert str(table.schema.field("price").type) == "decimal256(76, 0)"
+    assert table.column("price").to_pylist() == [
+        decimal.Decimal("1" * 39),
+        decimal.Decimal(5),
+    ]
+    assert table.column("nft__x").to_pylist() == [str(2**70), None]
+    assert set(widened) == {"price", "nft__x"}
+    table, _ = layout.table([{"price": str(2**256), "minters": [1]}])
+    assert table.to_pylist() == [
+        {"price": str(2**256), "minters": "[1]", "nft__x": None}
+    ]
+
+    # Streams writing Parquet keep the prices IntOrNone would null
+    config = {"batch_output_path": str(tmp_path), "batch_output_format": "parquet"}
+    stream = TapDecentralandTheGraph(config=config).streams["items_polygon_unique"]
+    assert "len(" not in stream.post_process_batch.source
+    assert (
+        "len("
+        in TapDecentralandTheGraph(config={})
+        .streams["items_polygon_unique"]
+        .post_process_batch.source
+    )
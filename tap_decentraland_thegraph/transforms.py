@@ -0,0 +1,295 @@
+"""Declarative row transforms, compiled into one function per stream.
+
+Streams list their `transforms` next to their `schema`, for instance
+
+    transforms = [
+        RowId("id", "updatedAt"),
+        Apply(int, "parcel.x", "parcel.y"),
+    ]
+
+and at stream init the list is compiled into the source of a single
+`post_process_batch(rows, context)` function that applies each step to every
+row of a page. Field paths are dotted and written out as subscripts, and the
+callables the steps use are bound as locals, so the compiled loop does no
+lookups or checks beyond what the data itself calls for.
+"""
+
+import linecache
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+BatchTransform = Callable[[List[dict], Optional[dict]], List[dict]]
+
+
+def split_path(path: str) -> List[str]:
+    """Return the keys of a dotted field path, which must be GraphQL names."""
+    keys = path.split(".")
+    for key in keys:
+        if not key.isidentifier() or not key.isascii():
+            raise ValueError(
+                f"Invalid field path {path!r}: {key!r} is not a field name"
+            )
+    return keys
+
+
+def subscript(var: str, keys: Sequence[str]) -> str:
+    return var + "".join(f"[{key!r}]" for key in keys)
+
+
+class Compiler:
+    """Source of a transform function being compiled."""
+
+    def __init__(self, exact_integers: bool = False):
+        # Set when the output holds integers of any length, e.g. Parquet decimal columns
+        self.exact_integers = exact_integers
+        self.bound: Dict[str, Any] = {}
+        self.prelude: List[str] = []
+        self.body: List[str] = []
+        self.locals = 0
+        # Parents looked up by the current transform, by path
+        self.parents: Dict[str, str] = {}
+
+    def bind(self, value: Any) -> str:
+        """Return the name of the local holding `value`."""
+        for name, bound in self.bound.items():
+            if bound is value:
+                return name
+        name = f"_f{len(self.bound)}"
+        self.bound[name] = value
+        return name
+
+    def local(self) -> str:
+        """Return the name of a new local variable."""
+        self.locals += 1
+        return f"_v{self.locals}"
+
+    def target(self, path: str) -> Tuple[str, str]:
+        """Return the expression of a field's parent and the field's key.
+
+        Nested parents are looked up once per transform, into a local.
+        """
+        *parents, key = split_path(path)
+        if not parents:
+            return "row", key
+        parent_path = ".".join(parents)
+        if parent_path not in self.parents:
+            self.parents[parent_path] = self.local()
+            self.body.append(
+                f"{self.parents[parent_path]} = {subscript('row', parents)}"
+            )
+        return self.parents[parent_path], key
+
+
+class Transform:
+    """A step of a stream's post-processing."""
+
+    def compile(self, compiler: Compiler) -> None:
+        """Add the step's source to the body of the loop over rows."""
+        raise NotImplementedError
+
+
+class Apply(Transform):
+    """Replace fields with `func(value)`, e.g. `Apply(int, "price")`.
+
+    With `optional`, fields missing from their parent are left out.
+    """
+
+    def __init__(
+        self, func: Callable[[Any], Any], *fields: str, optional: bool = False
+    ):
+        self.func = func
+        self.fields = fields
+        self.optional = optional
+
+    def compile(self, compiler: Compiler) -> None:
+        func = compiler.bind(self.func)
+        for field in self.fields:
+            parent, key = compiler.target(field)
+            field = f"{parent}[{key!r}]"
+            if self.optional:
+                compiler.body.append(f"if {key!r} in {parent}:")
+                compiler.body.append(f"    {field} = {func}({field})")
+            else:
+                compiler.body.append(f"{field} = {func}({field})")
+
+
+class IntOrNone(Transform):
+    """Convert fields to int, or to None past `max_length` digits.
+
+    The limit keeps values within the target's integer columns. Outputs with
+    exact integers of any length keep every value.
+    """
+
+    def __init__(self, *fields: str, max_length: int = 32):
+        self.fields = fields
+        self.max_length = max_length
+
+    def compile(self, compiler: Compiler) -> None:
+        to_int = compiler.bind(int)
+        for field in self.fields:
+            parent, key = compiler.target(field)
+            value = compiler.local()
+            compiler.body.append(f"{value} = {parent}[{key!r}]")
+            if compiler.exact_integers:
+                compiler.body.append(f"{parent}[{key!r}] = {to_int}({value})")
+            else:
+                compiler.body.append(
+                    f"{parent}[{key!r}] = None if len({value}) > {self.max_length} "
+                    f"else {to_int}({value})"
+                )
+
+
+class BodyShapes(Transform):
+    """Replace the `bodyShapes` list of an asset with two flags.
+
+    The flags are `bodyShapeMale` and `bodyShapeFemale`. With `optional`, assets
+    or parents that are missing or None and assets without body shapes are left
+    alone, and with `fill_missing` a missing asset is set to an empty object.
+    """
+
+    def __init__(self, path: str, optional: bool = False, fill_missing: bool = False):
+        self.path = path
+        self.optional = optional
+        self.fill_missing = fill_missing
+
+    def compile(self, compiler: Compiler) -> None:
+        body = compiler.body
+        if not self.optional:
+            parent, key = compiler.target(self.path)
+            asset = compiler.local()
+            body.append(f"{asset} = {parent}[{key!r}]")
+            self.convert(compiler, asset, "")
+            return
+
+        *parents, key = split_path(self.path)
+        indent = ""
+        parent = "row"
+        if parents:
+            parent = compiler.local()
+            lookup = "row"
+            for name in parents[:-1]:
+                lookup = f"({lookup}.get({name!r}) or {{}})"
+            body.append(f"{parent} = {lookup}.get({parents[-1]!r})")
+            body.append(f"if {parent} is not None:")
+            indent = "    "
+        asset = compiler.local()
+        body.append(f"{indent}{asset} = {parent}.get({key!r})")
+        if self.fill_missing:
+            body.append(f"{indent}if {asset} is None:")
+            body.append(f"{indent}    {parent}[{key!r}] = {{}}")
+            body.append(f"{indent}elif {asset}.get('bodyShapes') is not None:")
+        else:
+            body.append(
+                f"{indent}if {asset} is not None "
+                f"and {asset}.get('bodyShapes') is not None:"
+            )
+        self.convert(compiler, asset, indent + "    ")
+
+    @staticmethod
+    def convert(compiler: Compiler, asset: str, indent: str) -> None:
+        shapes = compiler.local()
+        compiler.body.extend([
+            f"{indent}{shapes} = {asset}.pop('bodyShapes')",
+            f"{indent}{asset}['bodyShapeMale'] = 'BaseMale' in {shapes}",
+            f"{indent}{asset}['bodyShapeFemale'] = 'BaseFemale' in {shapes}",
+        ])
+
+
+class RowId(Transform):
+    """Set `rowId` to the given string fields joined by `|`."""
+
+    def __init__(self, *fields: str):
+        self.fields = fields
+
+    def compile(self, compiler: Compiler) -> None:
+        parts = " + '|' + ".join(
+            subscript("row", split_path(field)) for field in self.fields
+        )
+        compiler.body.append(f"row['rowId'] = {parts}")
+
+
+class FromContext(Transform):
+    """Copy keys of the stream's context into every row."""
+
+    def __init__(self, *keys: str):
+        self.keys = keys
+
+    def compile(self, compiler: Compiler) -> None:
+        for key in self.keys:
+            value = compiler.local()
+            compiler.prelude.append(f"{value} = context[{key!r}]")
+            compiler.body.append(f"row[{key!r}] = {value}")
+
+
+class JoinParcels(Transform):
+    """Replace a list of parcels with their `x,y` coordinates joined by `|`."""
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def compile(self, compiler: Compiler) -> None:
+        parent, key = compiler.target(self.path)
+        parcels = compiler.local()
+        compiler.body.append(f"{parcels} = {parent}[{key!r}]")
+        compiler.body.append(
+            f"""{parent}[{key!r}] = '|'.join([f"{{p['x']}},{{p['y']}}" """
+            f"""for p in {parcels}]) if {parcels} else ''"""
+        )
+
+
+class EscapeBackslashes(Transform):
+    """Double the backslashes of string fields, leaving other values alone."""
+
+    def __init__(self, *fields: str):
+        self.fields = fields
+
+    def compile(self, compiler: Compiler) -> None:
+        is_instance, str_type = compiler.bind(isinstance), compiler.bind(str)
+        backslash = "\\"
+        for field in self.fields:
+            parent, key = compiler.target(field)
+            value = compiler.local()
+            compiler.body.append(f"{value} = {parent}.get({key!r})")
+            compiler.body.append(f"if {is_instance}({value}, {str_type}):")
+            compiler.body.append(
+                f"    {parent}[{key!r}] = "
+                f"{value}.replace({backslash!r}, {backslash * 2!r})"
+            )
+
+
+class Call(Transform):
+    """Call `func(row)`, which changes the row in place, for undeclared steps."""
+
+    def __init__(self, func: Callable[[dict], None]):
+        self.func = func
+
+    def compile(self, compiler: Compiler) -> None:
+        compiler.body.append(f"{compiler.bind(self.func)}(row)")
+
+
+def compile_transforms(
+    transforms: Sequence[Transform], name: str = "stream", exact_integers: bool = False
+) -> BatchTransform:
+    """Return a `post_process_batch(rows, context)` applying `transforms` to rows."""
+    compiler = Compiler(exact_integers)
+    for transform in transforms:
+        # Earlier steps may have replaced the parents
+        compiler.parents.clear()
+        transform.compile(compiler)
+
+    defaults = "".join(f", {bound}={bound}" for bound in compiler.bound)
+    lines = [
+        f"def post_process_batch(rows, context=None{defaults}):",
+        *(f"    {line}" for line in compiler.prelude),
+        "    for row in rows:",
+        *(f"        {line}" for line in compiler.body or ["pass"]),
+        "    return rows",
+    ]
+    source = "\n".join(lines) + "\n"
+    # Registered with linecache so tracebacks show the generated lines
+    filename = f"<transforms {name}>"
+    linecache.cache[filename] = (len(source), None, source.splitlines(True), filename)
+    namespace = dict(compiler.bound)
+    exec(compile(source, filename, "exec"), namespace)
+    function = namespace["post_process_batch"]
+    function.source = source
+    return function
@@ -0,0 +1,121 @@
+"""Record conformance and validation, compiled once per stream.
+
+Before writing a record the SDK drops its deselected properties, walking the
+catalog's selection mask through every nested object, and conforms its
+values, reading the schema of each property again. `compile_conformer` does
+those lookups once per stream, so properties that are selected all the way
+down pass through with a dict lookup and a type check, and anything else
+goes through the SDK's own functions.
+
+`RecordValidator` checks records against the stream schema with a validator
+compiled once, every record or one in `sample_every`. It uses
+`fastjsonschema`, which generates Python code for the schema, when it is
+installed (the `fast-validation` extra) and `jsonschema` otherwise.
+"""
+
+import logging
+from typing import Callable, Dict, FrozenSet, List, Optional
+
+import jsonschema
+from singer_sdk.helpers._catalog import pop_deselected_record_properties
+from singer_sdk.helpers._singer import SelectionMask
+from singer_sdk.helpers._typing import conform_record_data_types, is_boolean_type
+
+try:
+    import fastjsonschema
+except ImportError:  # Optional dependency, install the `fast-validation` extra
+    fastjsonschema = None
+
+# Types decoded from JSON, which conforming leaves as they are
+JSON_TYPES = frozenset([str, int, float, bool, type(None), dict, list])
+# Values of boolean properties left as they are
+BOOLEAN_TYPES = frozenset([bool, type(None)])
+
+
+def compile_conformer(
+    name: str, schema: dict, mask: SelectionMask, logger: logging.Logger
+) -> Callable[[dict], dict]:
+    """Return a function conforming records like `_generate_record_messages` does.
+
+    Like the SDK it removes deselected properties from the record in place and
+    returns a new record with the rest, in the same order.
+    """
+    # Types that pass through, for properties selected with all their children
+    passthrough: Dict[str, FrozenSet[type]] = {}
+    for key, property_schema in schema["properties"].items():
+        breadcrumb = ("properties", key)
+        if not mask[breadcrumb] or any(
+            not selected
+            for crumb, selected in mask.items()
+            if len(crumb) > 2 and crumb[:2] == breadcrumb
+        ):
+            continue
+        passthrough[key] = (
+            BOOLEAN_TYPES if is_boolean_type(property_schema) else JSON_TYPES
+        )
+    # Keys missing from the schema, left out once the SDK has warned about them
+    unmapped = set()
+
+    def conform_value(conformed: dict, key: str, value) -> bool:
+        """Conform one value with the SDK, returning True if its key is deselected."""
+        if key in unmapped:
+            return False
+        breadcrumb = ("properties", key)
+        if not mask[breadcrumb]:
+            return True
+        if key not in schema["properties"]:
+            unmapped.add(key)
+        if isinstance(value, dict):
+            pop_deselected_record_properties(value, schema, mask, logger, breadcrumb)
+        conformed.update(conform_record_data_types(name, {key: value}, schema, logger))
+        return False
+
+    passthrough_types = passthrough.get
+
+    def conform(record: dict) -> dict:
+        conformed = {}
+        deselected: Optional[List[str]] = None
+        for key, value in record.items():
+            types = passthrough_types(key)
+            if types is not None and value.__class__ in types:
+                conformed[key] = value
+            elif conform_value(conformed, key, value):
+                deselected = (deselected or []) + [key]
+        if deselected:
+            for key in deselected:
+                del record[key]
+        return conformed
+
+    return conform
+
+
+class RecordValidator:
+    """Validate records against a schema, every one or one in `sample_every`."""
+
+    def __init__(self, schema: dict, sample_every: int = 1):
+        self.sample_every = max(sample_every, 1)
+        self.seen = 0
+        if fastjsonschema is not None:
+            # Defaults are not filled in, records are emitted as they are
+            self._validate = fastjsonschema.compile(schema, use_default=False)
+            self._validator = None
+        else:
+            self._validate = None
+            self._validator = jsonschema.validators.validator_for(schema)(schema)
+
+    def __call__(self, record: dict) -> Optional[str]:
+        """Return why `record` is invalid, or None if it is valid or not sampled."""
+        self.seen += 1
+        if (self.seen - 1) % self.sample_every:
+            return None
+        if self._validate is not None:
+            try:
+                self._validate(record)
+            except fastjsonschema.JsonSchemaValueException as err:
+                return err.message
+            return None
+        error = jsonschema.exceptions.best_match(self._validator.iter_errors(record))
+        if error is None:
+            return None
+        path = ".".join(str(part) for part in error.absolute_path)
+        return f"{path}: {error.message}" if path else error.message